@@ -0,0 +1,245 @@
+"""
+Benchmark for the deduction rules: grounds and solves an encoding for every
+DeductionRule (on fixed masks and seeds, for a few instance types), records
+grounding time, ground program size and solving time, and compares these
+against a JSON baseline.
+
+Usage:
+    python benchmark_sudokugen.py --save          # record a new baseline
+    python benchmark_sudokugen.py                 # compare to the baseline
+    python benchmark_sudokugen.py -f wing -i 9x9  # only some benchmarks
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+
+from sudokugen import instances, encodings, masks
+from sudokugen.encodings.deduction import basic, chains, fish, other, \
+    snyder, wings
+from sudokugen.generator import measure_generation
+
+RULE_MODULES = [basic, fish, wings, chains, snyder, other]
+
+INSTANCE_TYPES = {
+    "9x9": lambda: instances.RegularSudoku(9),
+    "rokudoku": instances.RokuDoku,
+    "dozendoku": instances.DozenDoku,
+}
+
+# Fraction of the cells that the mask requires to be filled
+MASK_FILLED_FRACTION = 0.4
+
+# Suffixes of the names of chained rules that the presets of
+# examples.interactive use before the chain point, rather than at it
+PRE_CHAIN_POINT_SUFFIXES = (
+    "_not_applicable_chained",
+    "_protection_chained",
+    "_requirement_chained",
+)
+
+
+def deduction_rules():
+    """
+    Returns the deduction rules of the rule modules, by a name of the form
+    module.rule.
+    """
+    rules = {}
+    for module in RULE_MODULES:
+        module_name = module.__name__.rsplit(".", 1)[-1]
+        for rule in vars(module).values():
+            if isinstance(rule, basic.DeductionRule):
+                rules[f"{module_name}.{rule.name}"] = rule
+    return dict(sorted(rules.items()))
+
+
+def deduction_benchmark_constraint(instance, rule):
+    """
+    Returns the deduction constraint for benchmarking a rule, which requires
+    the puzzle to be solved with the rule and singles. Chained rules (which
+    rely on the strikes of an earlier solving strategy) are benchmarked in
+    a chain like in the presets of examples.interactive, where singles do
+    not solve the puzzle before the chain point, and do solve it after:
+    before the chain point if they restrict when other techniques apply
+    (with pairs and locked candidates at the chain point), and otherwise at
+    the chain point.
+    """
+    if not rule.name.endswith("_chained"):
+        rules = [
+            encodings.basic_deduction,
+            encodings.naked_singles,
+            encodings.hidden_singles,
+        ]
+        if rule not in rules:
+            rules.append(rule)
+        if rule is not encodings.stable_state_solved:
+            rules.append(encodings.stable_state_solved)
+        return encodings.deduction_constraint(
+            instance,
+            [encodings.SolvingStrategy(rules=rules)]
+        )
+
+    pre_rules = [
+        encodings.basic_deduction,
+        encodings.naked_singles,
+        encodings.hidden_singles,
+        encodings.stable_state_unsolved,
+    ]
+    if rule.name.endswith(PRE_CHAIN_POINT_SUFFIXES):
+        pre_rules.append(rule)
+        chain_point_rules = [
+            encodings.naked_pairs,
+            encodings.hidden_pairs,
+            encodings.locked_candidates,
+        ]
+    else:
+        chain_point_rules = [rule]
+    return encodings.chained_deduction_constraint(
+        instance,
+        [
+            encodings.SolvingStrategy(rules=pre_rules),
+            encodings.SolvingStrategy(rules=chain_point_rules),
+            encodings.SolvingStrategy(rules=[
+                encodings.naked_singles,
+                encodings.hidden_singles,
+                encodings.stable_state_solved,
+            ]),
+        ]
+    )
+
+
+def benchmark_constraints(instance, rule, seed):
+    """
+    Returns the constraints for benchmarking a rule: a fixed random mask
+    (depending on the seed), and a deduction constraint with the rule (see
+    deduction_benchmark_constraint).
+    """
+    random.seed(seed)
+    mask = masks.generate_randomly(
+        instance,
+        '?',
+        [(int(instance.num_cells * MASK_FILLED_FRACTION), '*')]
+    )
+    return [
+        encodings.use_mask(instance, mask),
+        deduction_benchmark_constraint(instance, rule),
+    ]
+
+
+def run_benchmark(instance_factory, rule, seed, timeout):
+    """
+    Grounds and solves the benchmark for a rule, and returns its
+    measurements.
+    """
+    instance = instance_factory()
+    found, statistics = measure_generation(
+        instance,
+        benchmark_constraints(instance, rule, seed),
+        timeout=timeout,
+        cl_arguments=[f"--seed={seed}"]
+    )
+
+    return {
+        "ground_time": round(statistics.ground_time, 4),
+        "rules": statistics.rules,
+        "atoms": statistics.atoms,
+        "solve_time": round(statistics.solve_time, 4),
+        "found": found is not None,
+    }
+
+
+def regressions(results, baseline, tolerance, min_time):
+    """
+    Returns descriptions of the measurements that got worse than in the
+    baseline by more than the tolerance (a fraction); times are only
+    compared if they are above min_time (in seconds).
+    """
+    found = []
+    for name, measurement in results.items():
+        if name not in baseline:
+            continue
+        reference = baseline[name]
+        for key in ["ground_time", "solve_time", "rules", "atoms"]:
+            old, new = reference[key], measurement[key]
+            if key.endswith("_time") and new < min_time:
+                continue
+            if new > old * (1 + tolerance):
+                found.append(f"{name}: {key} {old} -> {new}")
+    return found
+
+
+def main():
+    """
+    Runs the benchmarks given by the command line arguments.
+    """
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument("-b", "--baseline",
+                        help="file with the baseline measurements",
+                        default="benchmark_baseline.json")
+    parser.add_argument("--save",
+                        help="save the measurements as the new baseline",
+                        action="store_true")
+    parser.add_argument("-f", "--filter",
+                        help="only run rules whose name contains this",
+                        default="")
+    parser.add_argument("-i", "--instances",
+                        help="instance types to run on",
+                        nargs="+", choices=list(INSTANCE_TYPES),
+                        default=list(INSTANCE_TYPES))
+    parser.add_argument("-s", "--seed",
+                        help="seed for the masks and for clingo",
+                        type=int, default=1)
+    parser.add_argument("-t", "--timeout",
+                        help="timeout for solving (in seconds)",
+                        type=int, default=20)
+    parser.add_argument("--tolerance",
+                        help="fraction by which a measurement may get worse",
+                        type=float, default=0.25)
+    parser.add_argument("--min-time",
+                        help="times below this (in seconds) are not compared",
+                        type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = {}
+    for instance_name in args.instances:
+        for rule_name, rule in deduction_rules().items():
+            if args.filter not in rule_name:
+                continue
+            name = f"{instance_name}/{rule_name}"
+            results[name] = run_benchmark(
+                INSTANCE_TYPES[instance_name],
+                rule,
+                args.seed,
+                args.timeout
+            )
+            measurement = results[name]
+            print(
+                f"{name}: ground {measurement['ground_time']:.2f}s "
+                f"({measurement['rules']} rules, {measurement['atoms']} "
+                f"atoms), solve {measurement['solve_time']:.2f}s"
+            )
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, "r", encoding="utf-8") as baseline_file:
+            baseline = json.load(baseline_file)
+
+    if args.save:
+        baseline.update(results)
+        with open(args.baseline, "w", encoding="utf-8") as baseline_file:
+            json.dump(baseline, baseline_file, indent=4, sort_keys=True)
+        print(f"Saved {len(results)} measurements to {args.baseline}")
+        return
+
+    found = regressions(results, baseline, args.tolerance, args.min_time)
+    for regression in found:
+        print(f"REGRESSION {regression}")
+    if found:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,20 @@
 """Functionality for creating two-player sudoku's."""
 
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import json
 import os
+import re
+import shutil
 import sys
 import subprocess
+import tempfile
+try:
+    import fcntl
+except ImportError: # pragma: no cover
+    # Windows
+    fcntl = None
+    import msvcrt
 sys.path.append(
     os.path.dirname(
         os.path.dirname(
@@ -18,6 +29,84 @@ from sudokugen import instances, generate_puzzle, encodings, \
     masks # pylint: disable=E0401,C0413,unused-import
 
 
+def _db_filenames(db_filename):
+    """
+    Returns the filenames of the append-only log, the index of highest ids
+    per category, and the lock file that belong to a database.
+    """
+    root, _ = os.path.splitext(db_filename)
+    return f"{root}.log.jsonl", f"{root}.ids.json", f"{root}.lock"
+
+
+@contextmanager
+def _locked_db(db_filename):
+    """
+    Holds an exclusive lock on a database (across processes).
+    """
+    _, _, lock_filename = _db_filenames(db_filename)
+    with open(lock_filename, "a", encoding="utf-8") as lock_file:
+        _lock_file(lock_file)
+        try:
+            yield
+        finally:
+            _unlock_file(lock_file)
+
+
+def _lock_file(lock_file):
+    """
+    Waits for an exclusive lock on an open file.
+    """
+    if fcntl:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return
+    # msvcrt only retries for a few seconds before giving up
+    lock_file.seek(0)
+    while True:
+        try:
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            continue
+
+
+def _unlock_file(lock_file):
+    """
+    Releases a lock taken with _lock_file.
+    """
+    if fcntl:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        return
+    lock_file.seek(0)
+    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _write_atomically(filename, content):
+    """
+    Replaces the content of a file, such that readers see either the old or
+    the new content.
+    """
+    temp_filename = f"{filename}.tmp"
+    with open(temp_filename, "w", encoding="utf-8") as temp_file:
+        temp_file.write(content)
+    os.replace(temp_filename, filename)
+
+
+def _instance_to_dict(instance):
+    instance_dict = {}
+    instance_dict["puzzle"] = instance.repr_short()
+    instance_dict["input_cell"] = instance.input_cell
+    instance_dict["input_cell_solution"] = \
+        instance.solution[instance.input_cell]
+    instance_dict["input_decoy_value"] = \
+        instance.input_decoy_value
+    instance_dict["output_cell"] = instance.output_cell
+    instance_dict["output_cell_solution"] = \
+        instance.solution[instance.output_cell]
+    instance_dict["output_decoy_value"] = \
+        instance.output_decoy_value
+    return instance_dict
+
+
 def store_instance_in_db(
         instance,
         category,
@@ -25,76 +114,108 @@ def store_instance_in_db(
         additional_data=None,
     ):
     """
-    TODO
+    Adds an instance to a category of a database, with the next free id in
+    that category.
+
+    The database consists of a JSON file (as read by load_db) and an
+    append-only log of the instances stored since the JSON file was last
+    compacted (see compact_db), so that storing an instance takes constant
+    time. The highest id per category is kept in a small index file. This
+    can safely be called from parallel processes.
     """
-    try:
-        with open(db_filename, "r", encoding="utf-8") as db_file:
-            database = json.load(db_file)
-    except FileNotFoundError:
-        database = {}
+    log_filename, ids_filename, _ = _db_filenames(db_filename)
 
-    def highest_category_id(database, category):
-        highest_id = 0
-        if category in database:
-            highest_id = max([
-                instance_dict["id"]
-                for instance_dict in database[category]
-            ])
-        return highest_id
-
-    def instance_to_dict(instance):
-        instance_dict = {}
-        instance_dict["puzzle"] = instance.repr_short()
-        instance_dict["input_cell"] = instance.input_cell
-        instance_dict["input_cell_solution"] = \
-            instance.solution[instance.input_cell]
-        instance_dict["input_decoy_value"] = \
-            instance.input_decoy_value
-        instance_dict["output_cell"] = instance.output_cell
-        instance_dict["output_cell_solution"] = \
-            instance.solution[instance.output_cell]
-        instance_dict["output_decoy_value"] = \
-            instance.output_decoy_value
-        return instance_dict
-
-    def add_to_db(database, category, instance_dict):
-        if category not in database:
-            database[category] = []
-        database[category].append(instance_dict)
-
-    highest_id = highest_category_id(database, category)
-    instance_dict = instance_to_dict(instance)
-    instance_dict["id"] = highest_id + 1
+    instance_dict = _instance_to_dict(instance)
     if additional_data:
         for key in additional_data:
             instance_dict[key] = additional_data[key]
-    add_to_db(database, category, instance_dict)
 
-    with open(db_filename, "w", encoding="utf-8") as db_file:
-        json.dump(database, db_file, indent=4)
+    with _locked_db(db_filename):
+        try:
+            with open(ids_filename, "r", encoding="utf-8") as ids_file:
+                highest_ids = json.load(ids_file)
+        except FileNotFoundError:
+            highest_ids = {
+                db_category: max(
+                    db_instance_dict["id"]
+                    for db_instance_dict in instance_dicts
+                )
+                for db_category, instance_dicts in load_db(db_filename).items()
+                if instance_dicts
+            }
+
+        instance_dict["id"] = highest_ids.get(category, 0) + 1
+        with open(log_filename, "a", encoding="utf-8") as log_file:
+            log_file.write(json.dumps({
+                "category": category,
+                "instance": instance_dict,
+            }) + "\n")
+        highest_ids[category] = instance_dict["id"]
+        _write_atomically(ids_filename, json.dumps(highest_ids))
 
 
 def load_db(
         db_filename,
     ):
     """
-    TODO
+    Loads a database (see store_instance_in_db), as a dictionary from
+    categories to lists of instance dictionaries.
     """
+    log_filename, _, _ = _db_filenames(db_filename)
     try:
         with open(db_filename, "r", encoding="utf-8") as db_file:
             database = json.load(db_file)
     except FileNotFoundError:
         database = {}
+    known_ids = {}
+    try:
+        with open(log_filename, "r", encoding="utf-8") as log_file:
+            for line in log_file:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line that was not completely written
+                    continue
+                category = entry["category"]
+                if category not in known_ids:
+                    known_ids[category] = {
+                        instance_dict["id"]
+                        for instance_dict in database.get(category, [])
+                    }
+                # Skip instances that are already in the JSON file (if
+                # compacting was interrupted before the log was emptied)
+                if entry["instance"]["id"] in known_ids[category]:
+                    continue
+                known_ids[category].add(entry["instance"]["id"])
+                database.setdefault(category, []).append(entry["instance"])
+    except FileNotFoundError:
+        pass
     return database
 
 
+def compact_db(
+        db_filename,
+    ):
+    """
+    Writes the instances in the log of a database into its JSON file, and
+    empties the log.
+    """
+    log_filename, _, _ = _db_filenames(db_filename)
+    with _locked_db(db_filename):
+        database = load_db(db_filename)
+        _write_atomically(db_filename, json.dumps(database, indent=4))
+        if os.path.exists(log_filename):
+            os.remove(log_filename)
+
+
 def select_instance_dict_from_db(
         database,
         category,
         puzzle_id,
     ):
     """
-    TODO
+    Returns the instance dictionary with the given id in a category of a
+    (loaded) database.
     """
     return [
         instance_dict
@@ -247,50 +368,46 @@ def log(
     with open(os.path.join(cwd, logfile), 'a+', encoding="utf-8") as file:
         file.write(logstr)
 
-def make_pdf(
-        filename,
+PLACEHOLDER = re.compile(r"%%%\[(.*?)\]%%%")
+
+
+def load_templates(
+        template_directory=".",
+    ):
+    """
+    Reads the LaTeX templates for puzzle sets (the main template and the
+    backside with instructions).
+    """
+    templates = {}
+    for name, template_filename in [
+            ("main", "template.tex"),
+            ("backside", "template-backside.tex"),
+        ]:
+        with open(
+                os.path.join(template_directory, template_filename),
+                'r',
+                encoding="utf-8"
+            ) as file:
+            templates[name] = file.read()
+    return templates
+
+
+def render_latex(
+        templates,
         instance_dict,
         meta_info,
         puzzle_set_id,
         two_page=True,
-        directory="output",
-        executable="pdflatex",
     ):
     """
-    Creates a PDF of the puzzle (using LaTeX).
+    Constructs the LaTeX source for a puzzle set from the templates (see
+    load_templates), filling in all placeholders in a single pass.
     """
-    # pylint disable=too-many-arguments,too-many-locals
-
-    #
-    if directory:
-        cwd = os.path.abspath(directory)
-    else:
-        cwd = os.path.abspath('.')
-
-    # Remove all aux files
-    for ext in ["aux", "fdb_latexmk", "fls", "log"]:
-        try:
-            os.remove(os.path.join(cwd, f"{filename}.{ext}"))
-        except FileNotFoundError:
-            pass
-
-    # Construct LaTeX source
-    if two_page:
-        backside_source = ""
-        with open("template-backside.tex", 'r', encoding="utf-8") as file:
-            backside_source = "".join(file.readlines())
-
-    latex_source = ""
-    with open("template.tex", 'r', encoding="utf-8") as file:
-        latex_source = "".join(file.readlines())
 
+    replacements = {}
     for player in ["A", "B"]:
-        latex_source = latex_source.replace(
-            f"%%%[PUZZLE SET ID HERE: PLAYER {player}]%%%",
+        replacements[f"PUZZLE SET ID HERE: PLAYER {player}"] = \
             f"{puzzle_set_id}-{player}%"
-        )
-
-    for player in ["A", "B"]:
         for puzzle_no in [1, 2, 3]:
             instance_str = instance_to_latex(
                 instance_dict[(player, puzzle_no)],
@@ -299,50 +416,154 @@ def make_pdf(
                 output_color=meta_info["deco"][player]["output color"],
                 output_pattern=meta_info["deco"][player]["output pattern"],
             )
-            latex_source = latex_source.replace(
-                f"%%%[PUZZLE HERE: PLAYER {player}, NUMBER {puzzle_no}]%%%",
-                f"{instance_str}%"
-            )
+            replacements[
+                f"PUZZLE HERE: PLAYER {player}, NUMBER {puzzle_no}"
+            ] = f"{instance_str}%"
             level = meta_info["level"][(player, puzzle_no)]
             level_str = f"\\textbf{{Level {level}}} "
             level_substr = "\\ ".join(["\\faGear"]*level)
             level_str += f"\\hfill {{{level_substr}}}"
-            latex_source = latex_source.replace(
-                f"%%%[LEVEL DESCRIPTION HERE: PLAYER {player}" + \
-                f", NUMBER {puzzle_no}]%%%",
-                f"{level_str}%"
-            )
+            replacements[
+                f"LEVEL DESCRIPTION HERE: PLAYER {player}" + \
+                f", NUMBER {puzzle_no}"
+            ] = f"{level_str}%"
 
     if "subtitle" in meta_info:
-        latex_source = latex_source.replace(
-            "%%%[SUBTITLE HERE]%%%",
-            meta_info["subtitle"]
-        )
+        replacements["SUBTITLE HERE"] = meta_info["subtitle"]
 
     if two_page:
-        latex_source = latex_source.replace(
-            "%%%[BACKSIDE HERE]%%%",
-            backside_source
-        )
+        replacements["BACKSIDE HERE"] = templates["backside"]
+
+    return PLACEHOLDER.sub(
+        lambda match: replacements.get(match.group(1), match.group(0)),
+        templates["main"]
+    )
+
+
+def compile_latex(
+        filename,
+        latex_source,
+        directory="output",
+        executable="pdflatex",
+    ):
+    """
+    Saves LaTeX source to [filename].tex in the directory, and compiles it
+    to [filename].pdf there. Compiling happens in a temporary directory of
+    its own, so that the aux files of different calls never get mixed up;
+    files that the source refers to are still looked up in the directory,
+    and [filename].log is copied back to it.
+    Returns the path of the PDF, or None if no PDF was produced.
+    """
+
+    if directory:
+        cwd = os.path.abspath(directory)
+    else:
+        cwd = os.path.abspath('.')
+    os.makedirs(cwd, exist_ok=True)
 
     # Save LaTeX representation to [filename].tex
     filepath = os.path.join(cwd, f"{filename}.tex")
     with open(filepath, 'w', encoding="utf-8") as file:
         file.write(latex_source)
-    # Call pdflatex
-    with subprocess.Popen(
+
+    # Call pdflatex (an empty entry at the end of TEXINPUTS stands for the
+    # default search path)
+    env = dict(os.environ)
+    env["TEXINPUTS"] = cwd + os.pathsep + env.get("TEXINPUTS", "")
+    with tempfile.TemporaryDirectory() as temp_directory:
+        shutil.copy(filepath, temp_directory)
+        subprocess.run(
             [executable, f"{filename}.tex"],
-            cwd=directory,
+            cwd=temp_directory,
+            env=env,
+            stdin=subprocess.DEVNULL,
             stdout=subprocess.PIPE,
-            universal_newlines=True
-        ) as proc:
-        proc.communicate()
-    # Remove all aux files
-    for ext in ["aux", "fdb_latexmk", "fls", "log"]:
-        try:
-            os.remove(os.path.join(cwd, f"{filename}.{ext}"))
-        except FileNotFoundError:
-            pass
+            universal_newlines=True,
+            check=False,
+        )
+        log_filename = os.path.join(temp_directory, f"{filename}.log")
+        if os.path.exists(log_filename):
+            shutil.copy(log_filename, cwd)
+        pdf_filename = os.path.join(temp_directory, f"{filename}.pdf")
+        if not os.path.exists(pdf_filename):
+            return None
+        pdf_filepath = os.path.join(cwd, f"{filename}.pdf")
+        shutil.move(pdf_filename, pdf_filepath)
+    return pdf_filepath
+
+
+def make_pdf(
+        filename,
+        instance_dict,
+        meta_info,
+        puzzle_set_id,
+        two_page=True,
+        directory="output",
+        executable="pdflatex",
+    ):
+    """
+    Creates a PDF of the puzzle (using LaTeX).
+    """
+    # pylint: disable=too-many-arguments
+
+    latex_source = render_latex(
+        load_templates(),
+        instance_dict,
+        meta_info,
+        puzzle_set_id,
+        two_page=two_page,
+    )
+    return compile_latex(
+        filename,
+        latex_source,
+        directory=directory,
+        executable=executable,
+    )
+
+
+def make_pdfs(
+        jobs,
+        directory="output",
+        executable="pdflatex",
+        workers=None,
+        template_directory=".",
+    ):
+    """
+    Creates the PDFs of a whole series of puzzle sets (using LaTeX). Every
+    job is a dictionary with the arguments filename, instance_dict,
+    meta_info, puzzle_set_id and (optionally) two_page of make_pdf. The
+    templates are read once, all LaTeX sources are rendered up front, and at
+    most workers (by default, the number of CPUs) of them are compiled at
+    the same time. Returns the paths of the PDFs, in the order of the jobs
+    (None for a job whose compilation failed).
+    """
+
+    templates = load_templates(template_directory)
+    sources = [
+        (
+            job["filename"],
+            render_latex(
+                templates,
+                job["instance_dict"],
+                job["meta_info"],
+                job["puzzle_set_id"],
+                two_page=job.get("two_page", True),
+            ),
+        )
+        for job in jobs
+    ]
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) \
+            as executor:
+        return list(executor.map(
+            lambda source: compile_latex(
+                source[0],
+                source[1],
+                directory=directory,
+                executable=executable,
+            ),
+            sources
+        ))
 
 
 def load_puzzle(puzzle):
@@ -2,3 +2,4 @@ from .instances import *
 from .generator import *
 from .printing import *
 from .masks import *
+from .solver import *
@@ -0,0 +1,145 @@
+"""
+Module with functionality to turn a generated puzzle into many isomorphic
+puzzles at once (by the symmetries that RectangleBlockSudoku.shuffle uses),
+using NumPy arrays
+"""
+
+from typing import Optional, Tuple, Union
+
+try:
+    import numpy as np
+except ImportError: # pragma: no cover
+    np = None
+
+from .instances import Board, RectangleBlockSudoku
+
+
+def _permutations(rng, shape: Tuple[int, ...]):
+    """
+    Returns an array of the given shape, whose last axis holds random
+    permutations of range(shape[-1]).
+    """
+    return rng.permuted(np.broadcast_to(np.arange(shape[-1]), shape), axis=-1)
+
+
+def _line_permutations(
+        rng,
+        count: int,
+        num_bands: int,
+        band_size: int
+    ):
+    """
+    Returns count random permutations of the lines (rows or columns), that
+    permute the lines within each band and permute the bands, as an array of
+    shape (count, num_bands * band_size) of (0-based) source lines.
+    """
+    within = _permutations(rng, (count, num_bands, band_size))
+    within += (np.arange(num_bands) * band_size)[None, :, None]
+    bands = _permutations(rng, (count, num_bands))
+    within = within[np.arange(count)[:, None], bands]
+    return within.reshape(count, num_bands * band_size)
+
+
+def _random_transformations(
+        instance: RectangleBlockSudoku,
+        count: int,
+        rng
+    ):
+    """
+    Returns count random symmetries of the instance, as an array of shape
+    (count, size * size) of source positions for a gather (in the row-major
+    order of Board), and an array of shape (count, size + 1) with value
+    permutations (that keep 0 fixed).
+    """
+
+    size = instance.size
+    col_sources = _line_permutations(
+        rng, count, instance.block_height, instance.block_width
+    )
+    row_sources = _line_permutations(
+        rng, count, instance.block_width, instance.block_height
+    )
+    if instance.block_width == instance.block_height:
+        transpose = rng.random(count) < 0.5
+    else:
+        transpose = np.zeros(count, dtype=bool)
+
+    straight = row_sources[:, :, None] * size + col_sources[:, None, :]
+    flipped = col_sources[:, None, :] * size + row_sources[:, :, None]
+    indices = np.where(transpose[:, None, None], flipped, straight)
+    indices = indices.reshape(count, size * size)
+
+    tables = np.zeros((count, size + 1), dtype=np.uint8)
+    tables[:, 1:] = _permutations(rng, (count, size)) + 1
+
+    return indices, tables
+
+
+def _as_array(instance: RectangleBlockSudoku, values):
+    if not isinstance(values, Board):
+        values = Board(instance.size, values)
+    return np.frombuffer(bytes(values.data), dtype=np.uint8)
+
+
+def generate_isomorphs(
+        instance: RectangleBlockSudoku,
+        count: int,
+        unique: bool = False,
+        with_solutions: bool = False,
+        seed: Optional[int] = None,
+        max_num_rounds: int = 10
+    ) -> Union["np.ndarray", Tuple["np.ndarray", "np.ndarray"]]:
+    """
+    Applies count random symmetries (permutations of rows within bands and of
+    bands, of columns within stacks and of stacks, of values, and transposing
+    if the blocks are squares) to the puzzle of the instance, and returns
+    the results as a uint8 array of shape (count, size * size), where each
+    row lists the cells in row-major order (as repr_short and Board do).
+
+    If unique is set, only distinct puzzles are returned: duplicates are
+    replaced by drawing new symmetries, for at most max_num_rounds rounds (so
+    fewer than count puzzles are returned if the puzzle has fewer isomorphs).
+    If with_solutions is set, the correspondingly transformed solutions are
+    returned as well.
+
+    Requires NumPy.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+
+    if np is None:
+        raise ImportError("generate_isomorphs requires numpy")
+    if not instance.puzzle:
+        raise ValueError("instance has no puzzle")
+
+    rng = np.random.default_rng(seed)
+    puzzle = _as_array(instance, instance.puzzle)
+    solution = None
+    if with_solutions:
+        solution = _as_array(instance, instance.solution)
+
+    puzzles = np.empty((0, puzzle.size), dtype=np.uint8)
+    solutions = np.empty((0, puzzle.size), dtype=np.uint8)
+    for _ in range(max_num_rounds if unique else 1):
+        missing = count - len(puzzles)
+        if missing <= 0:
+            break
+        indices, tables = _random_transformations(instance, missing, rng)
+        rows = np.arange(missing)[:, None]
+        puzzles = np.concatenate([puzzles, tables[rows, puzzle[indices]]])
+        if with_solutions:
+            solutions = np.concatenate(
+                [solutions, tables[rows, solution[indices]]]
+            )
+        if unique:
+            keys = np.ascontiguousarray(puzzles).view(
+                np.dtype((np.void, puzzles.shape[1]))
+            )
+            _, first = np.unique(keys, return_index=True)
+            first.sort()
+            puzzles = puzzles[first]
+            if with_solutions:
+                solutions = solutions[first]
+
+    if with_solutions:
+        return puzzles, solutions
+    return puzzles
@@ -0,0 +1,202 @@
+"""
+Module with functionality to keep generated puzzles in a persistent cache
+(an SQLite database), keyed by a fingerprint of the encoding that they were
+generated with
+"""
+
+import hashlib
+import pickle
+import random
+import re
+import sqlite3
+import time
+from typing import List, Optional
+
+from .instances import Instance
+
+
+# Names of solving strategies and of some deduction rules contain a random
+# identifier (see encodings.chained_deduction_constraint and
+# encodings.forbid_strings_derivable)
+RANDOM_UUID = re.compile(r"\b[rs][0-9a-f]{32}\b")
+
+# Clingo arguments whose values do not influence the result of solving
+IRRELEVANT_ARGUMENTS = ("--stats", "--verbose", "--outf", "--warn")
+
+
+def _normalize(asp_code: str) -> str:
+    """
+    Replaces the random identifiers of solving strategies and deduction
+    rules in an encoding by consecutive numbers, in order of first
+    occurrence.
+    """
+    names = {}
+    def rename(match):
+        identifier = match.group(0)
+        return names.setdefault(identifier, f"{identifier[0]}{len(names)}")
+    return RANDOM_UUID.sub(rename, asp_code)
+
+
+def is_deterministic(cl_arguments: List[str]) -> bool:
+    """
+    Whether solving with the given clingo arguments always leads to the same
+    result (i.e., no parallel solving is used); timeouts aside.
+    """
+    for argument in cl_arguments:
+        if argument.startswith("--parallel-mode"):
+            num_threads = argument.split("=", 1)[-1].split(",")[0]
+            if num_threads.strip() not in ("", "1"):
+                return False
+        if argument.startswith("-t") and argument[2:].lstrip("=") not in \
+                ("", "1"):
+            return False
+    return True
+
+
+class PuzzleCache:
+    """
+    Class to represent a persistent cache of generated instances (including
+    their statistics), stored in an SQLite database.
+
+    For every fingerprint (see fingerprint), a pool of at most pool_size
+    instances is kept. If max_entries or max_size (the total size in bytes
+    of the stored instances) is given, the least recently used instances are
+    evicted once the cache grows beyond it.
+    """
+
+    def __init__(
+            self,
+            filename: str,
+            pool_size: int = 10,
+            max_entries: Optional[int] = None,
+            max_size: Optional[int] = None
+        ):
+
+        self.filename = filename
+        self.pool_size = pool_size
+        self.max_entries = max_entries
+        self.max_size = max_size
+        self._connection = sqlite3.connect(filename)
+        with self._connection:
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS puzzles (
+                    id INTEGER PRIMARY KEY,
+                    fingerprint TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            self._connection.execute("""
+                CREATE INDEX IF NOT EXISTS puzzles_fingerprint
+                ON puzzles (fingerprint)
+            """)
+
+    @staticmethod
+    def fingerprint(
+            instance: Instance,
+            asp_code: str,
+            cl_arguments: List[str],
+            *options
+        ) -> str:
+        """
+        Returns the key for instances generated from an encoding: a hash of
+        the type of the instance, the encoding (see _normalize), the clingo
+        arguments that influence solving, and any further options (e.g., the
+        timeout).
+        """
+        arguments = [
+            argument for argument in cl_arguments
+            if not argument.startswith(IRRELEVANT_ARGUMENTS)
+        ]
+        parts = [
+            f"{type(instance).__module__}.{type(instance).__qualname__}",
+            _normalize(asp_code),
+            " ".join(arguments),
+            repr(options),
+        ]
+        return hashlib.blake2b(
+            "\0".join(parts).encode("utf-8"),
+            digest_size=16
+        ).hexdigest()
+
+    def pool(self, fingerprint: str) -> int:
+        """
+        Returns the number of instances stored for a fingerprint.
+        """
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM puzzles WHERE fingerprint = ?",
+            (fingerprint,)
+        ).fetchone()
+        return count
+
+    def get(
+            self,
+            fingerprint: str,
+            rng: Optional[random.Random] = None
+        ) -> Optional[Instance]:
+        """
+        Returns an instance stored for a fingerprint (the first one stored,
+        or a random one if rng is given), or None if there is none.
+        """
+        rows = self._connection.execute(
+            "SELECT id, data FROM puzzles WHERE fingerprint = ? ORDER BY id",
+            (fingerprint,)
+        ).fetchall()
+        if not rows:
+            return None
+        row_id, data = rng.choice(rows) if rng else rows[0]
+        with self._connection:
+            self._connection.execute(
+                "UPDATE puzzles SET last_used = ? WHERE id = ?",
+                (time.time(), row_id)
+            )
+        return pickle.loads(data)
+
+    def put(self, fingerprint: str, instance: Instance):
+        """
+        Stores an instance for a fingerprint (unless the pool for it is full),
+        and evicts instances if the cache has grown too large.
+        """
+        if self.pool(fingerprint) >= self.pool_size:
+            return
+        data = pickle.dumps(instance)
+        with self._connection:
+            self._connection.execute(
+                "INSERT INTO puzzles (fingerprint, data, size, last_used) "
+                "VALUES (?, ?, ?, ?)",
+                (fingerprint, data, len(data), time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        """
+        Removes the least recently used instances until the cache is within
+        max_entries and max_size.
+        """
+        rows = self._connection.execute(
+            "SELECT id, size FROM puzzles ORDER BY last_used DESC, id DESC"
+        ).fetchall()
+        total_size = 0
+        evicted = []
+        for num, (row_id, size) in enumerate(rows):
+            total_size += size
+            if (self.max_entries is not None and num >= self.max_entries) or \
+                    (self.max_size is not None and total_size > self.max_size):
+                evicted.append((row_id,))
+        self._connection.executemany(
+            "DELETE FROM puzzles WHERE id = ?",
+            evicted
+        )
+
+    def __len__(self) -> int:
+        (count,) = self._connection.execute(
+            "SELECT COUNT(*) FROM puzzles"
+        ).fetchone()
+        return count
+
+    def close(self):
+        """
+        Closes the database connection.
+        """
+        self._connection.close()
@@ -0,0 +1,852 @@
+"""
+Module with functionality to apply deduction rules directly to concrete
+puzzles, using bitmasks of candidate values for each cell (rather than ASP
+encodings)
+"""
+
+from dataclasses import dataclass, field
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import weakref
+
+from .instances import Instance, StructureIndex
+
+
+@dataclass(frozen=True)
+class Derivation:
+    """
+    Data class to represent a single derivation made by a deduction rule:
+    either the solution of a cell ("solution") or the removal of a candidate
+    value from a cell ("strike").
+    """
+    technique: str
+    conclusion: str
+    cell: Tuple
+    value: int
+
+
+@dataclass
+class DeductionResult:
+    """
+    Data class to represent the result of applying deduction rules to a
+    puzzle: the derived values of the cells (0 for cells that are not
+    solved), the remaining candidate values of the cells, and the trace of
+    derivations (in the order in which they were made).
+    """
+    solution: Dict[Tuple, int]
+    candidates: Dict[Tuple, List[int]]
+    trace: List[Derivation] = field(default_factory=list)
+    steps: List[str] = field(default_factory=list)
+    contradiction: bool = False
+
+    @property
+    def solved(self) -> bool:
+        """
+        Whether all cells have been solved.
+        """
+        return not self.contradiction and all(self.solution.values())
+
+    def techniques_used(self) -> List[str]:
+        """
+        Returns the techniques that made at least one derivation, in the order
+        in which they were first used.
+        """
+        return list(dict.fromkeys(self.steps))
+
+
+class _Structure:
+    """
+    Class to represent the lookup tables for deduction on an instance that do
+    not depend on the puzzle: the bits of the values, the (active) groups,
+    the groups that every cell is in, and the peers of every cell. They are
+    built once for every instance and selection of group types, and shared
+    by the CandidateGrids for it (so they must not be changed).
+    """
+    # pylint: disable=too-few-public-methods,too-many-instance-attributes
+
+    def __init__(
+            self,
+            instance: Instance,
+            group_types: Optional[List[str]]
+        ):
+
+        self.cells = list(instance.cells)
+        self.values = list(instance.values)
+        self.cell_index = instance.index.cell_ids
+        self.value_bit = {
+            value: 1 << num for num, value in enumerate(self.values)
+        }
+        self.bit_value = {bit: value for value, bit in self.value_bit.items()}
+        self.all_values = (1 << len(self.values)) - 1
+
+        # Determine the (active) groups, and which cells share a group
+        self.groups = []
+        for group_type, group in instance.groups:
+            if group_types and group_type not in group_types:
+                continue
+            indices = tuple(dict.fromkeys(
+                self.cell_index[cell] for cell in group
+            ))
+            self.groups.append((group_type, indices))
+        self.full_groups = [
+            (group_type, group) for group_type, group in self.groups
+            if len(group) == len(self.values)
+        ]
+        self.cell_groups = [[] for _ in self.cells]
+        for group_num, (_, group) in enumerate(self.groups):
+            for index in group:
+                self.cell_groups[index].append(group_num)
+        self.peers = [set() for _ in self.cells]
+        for _, group in self.groups:
+            for index in group:
+                self.peers[index].update(group)
+        for index, peers in enumerate(self.peers):
+            peers.discard(index)
+
+        self.group_pairs: Dict[str, List[Tuple]] = {}
+
+    def overlapping_groups(
+            self,
+            technique: str,
+            accept: Callable[[str, str], bool]
+        ) -> List[Tuple]:
+        """
+        Returns, for every full group G1 and group G2 that overlap (for the
+        pairs of group types accepted by accept), the cells of G1 outside G2
+        and the cells of G2 outside G1. Computed once for every technique.
+        """
+        if technique not in self.group_pairs:
+            pairs = []
+            for type1, group1 in self.full_groups:
+                for type2, group2 in self.groups:
+                    if group2 is group1 or not accept(type1, type2):
+                        continue
+                    if not set(group1).intersection(group2):
+                        continue
+                    pairs.append((
+                        tuple(index for index in group1
+                              if index not in group2),
+                        tuple(index for index in group2
+                              if index not in group1),
+                    ))
+            self.group_pairs[technique] = pairs
+        return self.group_pairs[technique]
+
+
+# Lookup tables for deduction, by the structure index of the instance (so
+# that they are built again if the cells or groups of the instance change)
+_structures: "weakref.WeakKeyDictionary[StructureIndex, Dict]" = \
+    weakref.WeakKeyDictionary()
+
+
+def _structure(
+        instance: Instance,
+        group_types: Optional[List[str]]
+    ) -> _Structure:
+    """
+    Returns the (shared) lookup tables for deduction on an instance.
+    """
+    key = (tuple(instance.values), tuple(group_types or ()))
+    structures = _structures.setdefault(instance.index, {})
+    if key not in structures:
+        structures[key] = _Structure(instance, group_types)
+    return structures[key]
+
+
+class CandidateGrid:
+    """
+    Class to represent the state of deduction for a puzzle: for each cell a
+    bitmask of the values that are still possible (bit i for the i-th value
+    of the instance), and whether it has been solved.
+
+    Deduction rules are applied only on the groups of the instance whose type
+    is in group_types (or on all groups, if group_types is not given).
+    """
+    # pylint: disable=too-many-instance-attributes
+
+    def __init__(
+            self,
+            instance: Instance,
+            puzzle: Union[Dict[Tuple, int], str],
+            group_types: Optional[List[str]] = None
+        ):
+
+        self.instance = instance
+        self.structure = _structure(instance, group_types)
+        self.cells = self.structure.cells
+        self.values = self.structure.values
+        self.cell_index = self.structure.cell_index
+        self.value_bit = self.structure.value_bit
+        self.bit_value = self.structure.bit_value
+        self.all_values = self.structure.all_values
+        self.groups = self.structure.groups
+        self.full_groups = self.structure.full_groups
+        self.cell_groups = self.structure.cell_groups
+        self.peers = self.structure.peers
+
+        self.candidates = [self.all_values] * len(self.cells)
+        self.solved = [False] * len(self.cells)
+        self.trace = []
+        self.contradiction = False
+
+        # Fill in the clues of the puzzle
+        if isinstance(puzzle, str):
+            puzzle = instance.parse_short(puzzle)
+        for cell, value in puzzle.items():
+            if value:
+                self.set_solution(self.cell_index[cell], value, "clue")
+
+    def set_solution(self, index: int, value: int, technique: str):
+        """
+        Marks a cell as solved with the given value, and removes this value
+        from the candidates of the cells that share a group with it.
+        """
+        if self.solved[index]:
+            return
+        bit = self.value_bit[value]
+        if not self.candidates[index] & bit:
+            self.contradiction = True
+            return
+        self.solved[index] = True
+        self.candidates[index] = bit
+        self.trace.append(
+            Derivation(technique, "solution", self.cells[index], value)
+        )
+
+        # Same as strike, inlined as this is where most strikes are made
+        candidates = self.candidates
+        for peer in self.peers[index]:
+            mask = candidates[peer]
+            if mask & bit:
+                candidates[peer] = mask & ~bit
+                self.trace.append(Derivation(
+                    "basic_deduction", "strike", self.cells[peer], value
+                ))
+                if mask == bit:
+                    self.contradiction = True
+
+    def strike(self, index: int, bit: int, technique: str) -> bool:
+        """
+        Removes a candidate value (given as a bit) from a cell, if it is still
+        a candidate, and returns whether this was the case.
+        """
+        if not self.candidates[index] & bit:
+            return False
+        self.candidates[index] &= ~bit
+        self.trace.append(
+            Derivation(technique, "strike", self.cells[index],
+                       self.bit_value[bit])
+        )
+        if not self.candidates[index]:
+            self.contradiction = True
+        return True
+
+    def is_solved(self) -> bool:
+        """
+        Whether all cells have been solved.
+        """
+        return all(self.solved)
+
+    def values_of(self, mask: int) -> List[int]:
+        """
+        Returns the values whose bits are set in mask.
+        """
+        return [
+            value for value, bit in self.value_bit.items() if mask & bit
+        ]
+
+    def positions(self, group: Tuple[int, ...], bit: int) -> List[int]:
+        """
+        Returns the cells in a group that still have the value (given as a
+        bit) as a candidate.
+        """
+        return [index for index in group if self.candidates[index] & bit]
+
+    def result(self, steps: List[str]) -> DeductionResult:
+        """
+        Summarizes the current state as a DeductionResult.
+        """
+        solution = {}
+        candidates = {}
+        for index, cell in enumerate(self.cells):
+            values = self.values_of(self.candidates[index])
+            solution[cell] = values[0] if self.solved[index] else 0
+            candidates[cell] = values
+        return DeductionResult(
+            solution=solution,
+            candidates=candidates,
+            trace=list(self.trace),
+            steps=steps,
+            contradiction=self.contradiction,
+        )
+
+
+def _popcount(mask: int) -> int:
+    return bin(mask).count("1")
+
+
+def basic_deduction(grid: CandidateGrid) -> bool:
+    """
+    Fills in the last remaining cell of a full group, when all other cells of
+    the group are solved.
+    """
+    progress = False
+    for _, group in grid.full_groups:
+        unsolved = [index for index in group if not grid.solved[index]]
+        if len(unsolved) == 1:
+            index = unsolved[0]
+            remaining = grid.all_values
+            for other in group:
+                if other != index:
+                    remaining &= ~grid.candidates[other]
+            if _popcount(remaining) == 1:
+                grid.set_solution(index, grid.bit_value[remaining],
+                                  "basic_deduction")
+                progress = True
+    return progress
+
+
+def naked_singles(grid: CandidateGrid) -> bool:
+    """
+    Solves cells for which only one candidate value remains.
+    """
+    progress = False
+    for index, mask in enumerate(grid.candidates):
+        if not grid.solved[index] and mask and mask & (mask - 1) == 0:
+            grid.set_solution(index, grid.bit_value[mask], "naked_singles")
+            progress = True
+    return progress
+
+
+def hidden_singles(grid: CandidateGrid) -> bool:
+    """
+    Solves cells that are the only place in a full group where a value can
+    go.
+    """
+    progress = False
+    candidates = grid.candidates
+    for _, group in grid.full_groups:
+        # Go through the values in order, determining the values that fit in
+        # exactly one (unsolved) cell again after every derivation
+        lowest = 1
+        while True:
+            once = twice = solved = 0
+            for index in group:
+                mask = candidates[index]
+                if grid.solved[index]:
+                    solved |= mask
+                twice |= once & mask
+                once |= mask
+            singles = once & ~twice & ~solved & -lowest
+            if not singles:
+                break
+            bit = singles & -singles
+            for index in group:
+                if candidates[index] & bit:
+                    grid.set_solution(index, grid.bit_value[bit],
+                                      "hidden_singles")
+                    progress = True
+                    break
+            lowest = bit << 1
+    return progress
+
+
+def _locked_candidates(
+        grid: CandidateGrid,
+        technique: str,
+        accept: Callable[[str, str], bool]
+    ) -> bool:
+    """
+    Removes a value from the cells of a group G2 outside a full group G1,
+    when within G1 the value can only go in cells that are also in G2 (for the
+    pairs of group types accepted by accept).
+    """
+    progress = False
+    candidates = grid.candidates
+    for outside1, outside2 in grid.structure.overlapping_groups(
+            technique, accept):
+        locked = grid.all_values
+        for index in outside1:
+            locked &= ~candidates[index]
+        striking = 0
+        for index in outside2:
+            striking |= candidates[index]
+        striking &= locked
+        while striking:
+            bit = striking & -striking
+            striking ^= bit
+            for index in outside2:
+                progress |= grid.strike(index, bit, technique)
+    return progress
+
+
+def locked_candidates(grid: CandidateGrid) -> bool:
+    """
+    Locked candidates, between any two groups.
+    """
+    return _locked_candidates(
+        grid, "locked_candidates",
+        lambda type1, type2: True
+    )
+
+
+def locked_candidates_pointing(grid: CandidateGrid) -> bool:
+    """
+    Locked candidates, from a block to a group of another type.
+    """
+    return _locked_candidates(
+        grid, "locked_candidates_pointing",
+        lambda type1, type2: type1 == "block" and type2 != "block"
+    )
+
+
+def locked_candidates_claiming(grid: CandidateGrid) -> bool:
+    """
+    Locked candidates, from a group of another type to a block.
+    """
+    return _locked_candidates(
+        grid, "locked_candidates_claiming",
+        lambda type1, type2: type1 != "block" and type2 == "block"
+    )
+
+
+def _naked_subsets(grid: CandidateGrid, size: int, technique: str) -> bool:
+    """
+    Removes the values of a set of cells in a group, whose candidates together
+    consist of exactly as many values as there are cells, from the other
+    cells in the group.
+    """
+    progress = False
+    for _, group in grid.groups:
+        unsolved = [
+            index for index in group
+            if not grid.solved[index]
+            and 2 <= _popcount(grid.candidates[index]) <= size
+        ]
+        for subset in itertools.combinations(unsolved, size):
+            union = 0
+            for index in subset:
+                union |= grid.candidates[index]
+            if _popcount(union) != size:
+                continue
+            for index in group:
+                if index in subset:
+                    continue
+                for bit in grid.bit_value:
+                    if union & bit:
+                        progress |= grid.strike(index, bit, technique)
+    return progress
+
+
+def naked_pairs(grid: CandidateGrid) -> bool:
+    """
+    Naked pairs.
+    """
+    return _naked_subsets(grid, 2, "naked_pairs")
+
+
+def naked_triples(grid: CandidateGrid) -> bool:
+    """
+    Naked triples.
+    """
+    return _naked_subsets(grid, 3, "naked_triples")
+
+
+def _hidden_subsets(grid: CandidateGrid, size: int, technique: str) -> bool:
+    """
+    Removes all other values from a set of cells in a full group, when there
+    are as many values as cells that can (within the group) only go in these
+    cells.
+    """
+    progress = False
+    for _, group in grid.full_groups:
+        value_positions = {}
+        for bit in grid.bit_value:
+            positions = grid.positions(group, bit)
+            if 2 <= len(positions) <= size and not any(
+                    grid.solved[index] for index in positions):
+                value_positions[bit] = positions
+        for bits in itertools.combinations(value_positions, size):
+            cells = set()
+            for bit in bits:
+                cells.update(value_positions[bit])
+            if len(cells) != size:
+                continue
+            keep = sum(bits)
+            for index in cells:
+                for bit in grid.bit_value:
+                    if not keep & bit:
+                        progress |= grid.strike(index, bit, technique)
+    return progress
+
+
+def hidden_pairs(grid: CandidateGrid) -> bool:
+    """
+    Hidden pairs.
+    """
+    return _hidden_subsets(grid, 2, "hidden_pairs")
+
+
+def hidden_triples(grid: CandidateGrid) -> bool:
+    """
+    Hidden triples.
+    """
+    return _hidden_subsets(grid, 3, "hidden_triples")
+
+
+def x_wing(grid: CandidateGrid) -> bool:
+    """
+    Removes a value from two (non-block) groups of one type, when the value
+    can only go in two cells in each of two (non-block) groups of another type,
+    and these cells lie pairwise in the first two groups.
+    """
+    # pylint: disable=too-many-nested-blocks
+    progress = False
+    for bit in grid.bit_value:
+        base_groups = [
+            (group_type, grid.positions(group, bit))
+            for group_type, group in grid.full_groups
+            if group_type != "block"
+        ]
+        base_groups = [
+            (group_type, positions) for group_type, positions in base_groups
+            if len(positions) == 2
+            and not any(grid.solved[index] for index in positions)
+        ]
+        for (type1, (cell1, cell2)), (type2, (cell3, cell4)) in \
+                itertools.combinations(base_groups, 2):
+            if type1 != type2 or {cell1, cell2} & {cell3, cell4}:
+                continue
+            for pair1, pair2 in [((cell1, cell3), (cell2, cell4)),
+                                 ((cell1, cell4), (cell2, cell3))]:
+                cover_groups = [
+                    _shared_group(grid, pair, type1) for pair in
+                    [pair1, pair2]
+                ]
+                if None in cover_groups:
+                    continue
+                for group_num in cover_groups:
+                    for index in grid.groups[group_num][1]:
+                        if index not in (cell1, cell2, cell3, cell4):
+                            progress |= grid.strike(index, bit, "x_wing")
+    return progress
+
+
+def _shared_group(
+        grid: CandidateGrid,
+        pair: Tuple[int, int],
+        exclude_type: str
+    ) -> Optional[int]:
+    """
+    Returns a (non-block) group containing both cells of the pair, whose
+    type is not exclude_type, if there is one.
+    """
+    for group_num in grid.cell_groups[pair[0]]:
+        group_type, group = grid.groups[group_num]
+        if group_type in ("block", exclude_type):
+            continue
+        if pair[1] in group:
+            return group_num
+    return None
+
+
+def xy_wing(grid: CandidateGrid) -> bool:
+    """
+    With a pivot cell with candidates XY, that shares groups with cells with
+    candidates XZ and YZ, removes Z from the cells that share groups with
+    both of the latter cells.
+    """
+    progress = False
+    bivalue = [
+        index for index, mask in enumerate(grid.candidates)
+        if not grid.solved[index] and _popcount(mask) == 2
+    ]
+    for pivot in bivalue:
+        pivot_mask = grid.candidates[pivot]
+        wings = [index for index in bivalue if index in grid.peers[pivot]]
+        for wing1, wing2 in itertools.combinations(wings, 2):
+            mask1 = grid.candidates[wing1]
+            mask2 = grid.candidates[wing2]
+            shared = mask1 & mask2
+            if (_popcount(shared) != 1 or shared & pivot_mask
+                    or (mask1 | mask2) & ~shared != pivot_mask):
+                continue
+            for index in grid.peers[wing1] & grid.peers[wing2]:
+                if index != pivot:
+                    progress |= grid.strike(index, shared, "xy_wing")
+    return progress
+
+
+def xyz_wing(grid: CandidateGrid) -> bool:
+    """
+    With a pivot cell with candidates XYZ, that shares groups with cells with
+    candidates XZ and YZ, removes Z from the cells that share groups with all
+    three of these cells.
+    """
+    progress = False
+    for pivot, pivot_mask in enumerate(grid.candidates):
+        if grid.solved[pivot] or _popcount(pivot_mask) != 3:
+            continue
+        wings = [
+            index for index in grid.peers[pivot]
+            if not grid.solved[index]
+            and _popcount(grid.candidates[index]) == 2
+            and grid.candidates[index] & ~pivot_mask == 0
+        ]
+        for wing1, wing2 in itertools.combinations(wings, 2):
+            shared = grid.candidates[wing1] & grid.candidates[wing2]
+            if _popcount(shared) != 1:
+                continue
+            targets = grid.peers[pivot] & grid.peers[wing1] & grid.peers[wing2]
+            for index in targets:
+                progress |= grid.strike(index, shared, "xyz_wing")
+    return progress
+
+
+def _color_components(grid: CandidateGrid, bit: int) -> List[List[set]]:
+    """
+    Returns the components of the graph of conjugate pairs for a value (the
+    pairs of cells that are the only two places for the value in a full
+    group), each as its two color classes.
+    """
+    links = {}
+    for _, group in grid.full_groups:
+        positions = grid.positions(group, bit)
+        if len(positions) == 2 and not any(
+                grid.solved[index] for index in positions):
+            cell1, cell2 = positions
+            links.setdefault(cell1, set()).add(cell2)
+            links.setdefault(cell2, set()).add(cell1)
+
+    components = []
+    colors = {}
+    for start in links:
+        if start in colors:
+            continue
+        classes = [set(), set()]
+        colors[start] = 0
+        stack = [start]
+        while stack:
+            index = stack.pop()
+            classes[colors[index]].add(index)
+            for other in links[index]:
+                if other not in colors:
+                    colors[other] = 1 - colors[index]
+                    stack.append(other)
+        components.append(classes)
+    return components
+
+
+def color_wrap(grid: CandidateGrid) -> bool:
+    """
+    Simple coloring: when two cells of the same color (in a chain of
+    conjugate pairs for a value) share a group, the value is removed from
+    all cells of that color.
+    """
+    progress = False
+    for bit in grid.bit_value:
+        for classes in _color_components(grid, bit):
+            for color in classes:
+                if any(grid.peers[index] & color for index in color):
+                    for index in color:
+                        progress |= grid.strike(index, bit, "color_wrap")
+    return progress
+
+
+def color_trap(grid: CandidateGrid) -> bool:
+    """
+    Simple coloring: a cell that shares groups with cells of both colors (in
+    a chain of conjugate pairs for a value) cannot have the value.
+    """
+    progress = False
+    for bit in grid.bit_value:
+        for color1, color2 in _color_components(grid, bit):
+            for index, mask in enumerate(grid.candidates):
+                if grid.solved[index] or not mask & bit or \
+                        index in color1 or index in color2:
+                    continue
+                if grid.peers[index] & color1 and grid.peers[index] & color2:
+                    progress |= grid.strike(index, bit, "color_trap")
+    return progress
+
+
+# Deduction techniques, by the name of the corresponding DeductionRule
+techniques: Dict[str, Callable[[CandidateGrid], bool]] = {
+    "basic_deduction": basic_deduction,
+    "naked_singles": naked_singles,
+    "hidden_singles": hidden_singles,
+    "locked_candidates": locked_candidates,
+    "locked_candidates_pointing": locked_candidates_pointing,
+    "locked_candidates_claiming": locked_candidates_claiming,
+    "naked_pairs": naked_pairs,
+    "naked_triples": naked_triples,
+    "hidden_pairs": hidden_pairs,
+    "hidden_triples": hidden_triples,
+    "x_wing": x_wing,
+    "xy_wing": xy_wing,
+    "xyz_wing": xyz_wing,
+    "color_trap": color_trap,
+    "color_wrap": color_wrap,
+}
+
+# Difficulty ratings of the techniques (roughly following the Sudoku
+# Explainer scale), by which grade orders and scores them
+ratings: Dict[str, float] = {
+    "basic_deduction": 1.0,
+    "hidden_singles": 1.5,
+    "naked_singles": 2.3,
+    "locked_candidates_pointing": 2.6,
+    "locked_candidates_claiming": 2.8,
+    "naked_pairs": 3.0,
+    "x_wing": 3.2,
+    "hidden_pairs": 3.4,
+    "naked_triples": 3.6,
+    "hidden_triples": 4.0,
+    "xy_wing": 4.2,
+    "xyz_wing": 4.4,
+    "color_trap": 4.5,
+    "color_wrap": 4.5,
+}
+
+
+def supports(rule) -> bool:
+    """
+    Whether a deduction rule (given as a DeductionRule or by its name) can
+    be used by deduce, grade and requires_technique: the techniques above,
+    and rules that constrain the result of deduction (which are ignored).
+    Other rules (such as the chained ones) only exist as ASP encodings.
+    """
+    name = getattr(rule, "name", rule)
+    return name in techniques or name.startswith(("ss_", "closed_under_"))
+
+
+def _rule_names(rules: List) -> List[str]:
+    """
+    Returns the names of deduction rules, and raises a ValueError listing
+    the rules that are not supported (see supports), if there are any.
+    """
+    names = [getattr(rule, "name", rule) for rule in rules]
+    unsupported = [name for name in names if not supports(name)]
+    if unsupported:
+        raise ValueError(
+            "Deduction rules not supported (only available as ASP "
+            f"encodings): {', '.join(unsupported)}"
+        )
+    return names
+
+
+def deduce(
+        instance: Instance,
+        puzzle: Union[Dict[Tuple, int], str],
+        rules: List,
+        group_types: Optional[List[str]] = None
+    ) -> DeductionResult:
+    """
+    Exhaustively applies the given deduction rules (given as DeductionRules
+    or by their names) to a puzzle, given as a dictionary from cells to
+    values (0 for empty cells) or as a short representation (see
+    SquareSudoku.repr_short).
+
+    After every step that derives something, deduction starts over with the
+    first rule in the list, so rules should be given in increasing order of
+    difficulty. Basic deduction is always used; rules that constrain the
+    result of deduction (stable states, closures) are ignored. Raises a
+    ValueError if any other rule is not supported (see supports).
+    """
+
+    selected = [("basic_deduction", basic_deduction)]
+    for name in _rule_names(rules):
+        if name not in techniques:
+            continue
+        if name != "basic_deduction":
+            selected.append((name, techniques[name]))
+
+    grid = CandidateGrid(instance, puzzle, group_types)
+    steps = []
+    while not grid.contradiction and not grid.is_solved():
+        for name, technique in selected:
+            if technique(grid):
+                steps.append(name)
+                break
+        else:
+            break
+
+    return grid.result(steps)
+
+
+@dataclass
+class Grade:
+    """
+    Data class to represent the difficulty of a puzzle: the hardest
+    technique needed to solve it (None if it was not solved), its rating,
+    the number of deduction steps, and a score (the sum of the ratings of
+    the steps).
+    """
+    technique: Optional[str]
+    rating: float
+    num_steps: int
+    score: float
+    solved: bool
+    result: DeductionResult
+
+
+def grade(
+        instance: Instance,
+        puzzle: Union[Dict[Tuple, int], str],
+        rules: Optional[List] = None,
+        group_types: Optional[List[str]] = None
+    ) -> Grade:
+    """
+    Grades a puzzle, by applying deduction rules (by default, all techniques
+    that have a rating) in increasing order of their rating (see deduce).
+    Raises a ValueError if any of the rules is not supported (see
+    supports), rather than grading the puzzle without it.
+    """
+
+    if rules is None:
+        rules = list(ratings)
+    names = sorted(
+        _rule_names(rules),
+        key=lambda name: ratings.get(name, float("inf"))
+    )
+    result = deduce(instance, puzzle, names, group_types)
+
+    technique = None
+    for step in result.steps:
+        if technique is None or \
+                ratings.get(step, 0) > ratings.get(technique, 0):
+            technique = step
+    return Grade(
+        technique=technique if result.solved else None,
+        rating=ratings.get(technique, 0.0) if result.solved else 0.0,
+        num_steps=len(result.steps),
+        score=sum(ratings.get(step, 0.0) for step in result.steps),
+        solved=result.solved,
+        result=result,
+    )
+
+
+def requires_technique(
+        instance: Instance,
+        puzzle: Union[Dict[Tuple, int], str],
+        technique: str,
+        rules: Optional[List] = None,
+        group_types: Optional[List[str]] = None
+    ) -> bool:
+    """
+    Whether a puzzle can be solved with the deduction rules (by default, all
+    techniques that have a rating), but not without the given technique.
+    Raises a ValueError if the technique or any of the rules is not
+    supported (see supports).
+    """
+
+    technique = getattr(technique, "name", technique)
+    if technique not in techniques:
+        raise ValueError(f"Technique not supported: {technique}")
+    if rules is None:
+        rules = list(ratings)
+    names = _rule_names(rules)
+    if not grade(instance, puzzle, names, group_types).solved:
+        return False
+    names = [name for name in names if name != technique]
+    return not grade(instance, puzzle, names, group_types).solved
@@ -0,0 +1,60 @@
+"""
+Module with functionality to recognize puzzles that are equivalent (under
+the symmetries of RectangleBlockSudoku.shuffle) to puzzles seen before
+"""
+
+import hashlib
+import os
+from typing import Optional
+
+from .instances import RectangleBlockSudoku
+
+
+class CanonicalIndex:
+    """
+    Class to represent a set of puzzles up to equivalence, by the hashes of
+    their canonical forms (see RectangleBlockSudoku.canonical_form).
+
+    If a filename is given, the hashes are read from this file (one per
+    line), and every newly added hash is appended to it.
+    """
+
+    def __init__(self, filename: Optional[str] = None):
+        self.filename = filename
+        self._hashes = set()
+        if filename and os.path.exists(filename):
+            with open(filename, "r", encoding="utf-8") as index_file:
+                self._hashes.update(
+                    line.strip() for line in index_file if line.strip()
+                )
+
+    @staticmethod
+    def key(instance: RectangleBlockSudoku) -> str:
+        """
+        Returns the hash of the canonical form of the puzzle of an instance.
+        """
+        canonical_form = instance.canonical_form()
+        return hashlib.blake2b(
+            canonical_form.encode("ascii"),
+            digest_size=16
+        ).hexdigest()
+
+    def __contains__(self, instance: RectangleBlockSudoku) -> bool:
+        return self.key(instance) in self._hashes
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, instance: RectangleBlockSudoku) -> bool:
+        """
+        Adds the puzzle of an instance to the index, and returns whether it
+        was new (i.e., not equivalent to a puzzle already in the index).
+        """
+        key = self.key(instance)
+        if key in self._hashes:
+            return False
+        self._hashes.add(key)
+        if self.filename:
+            with open(self.filename, "a", encoding="utf-8") as index_file:
+                index_file.write(key + "\n")
+        return True
@@ -1,4 +1,5 @@
 from .basic import *
+from .dependencies import *
 from .chains import *
 from .fish import *
 from .masks import *
@@ -3,9 +3,11 @@ Module with ASP encodings for different basic deduction rules
 """
 # pylint: disable=too-many-lines
 
-from typing import List, Optional
+from typing import FrozenSet, List, Optional
 from dataclasses import dataclass
 
+from .dependencies import parse_statements
+
 @dataclass(eq=True, frozen=True)
 class DeductionRule:
     """
@@ -14,6 +16,26 @@ class DeductionRule:
     name: str
     encoding: str
 
+    @property
+    def provides(self) -> FrozenSet[str]:
+        """
+        The predicates that the encoding defines (see dependencies).
+        """
+        return frozenset().union(*(
+            statement.provides
+            for statement in parse_statements(self.encoding)
+        ))
+
+    @property
+    def requires(self) -> FrozenSet[str]:
+        """
+        The predicates that the encoding uses (see dependencies).
+        """
+        return frozenset().union(*(
+            statement.requires
+            for statement in parse_statements(self.encoding)
+        ))
+
 
 @dataclass
 class SolvingStrategy:
@@ -59,13 +81,6 @@ stable_state_unsolved_naked_pairs = DeductionRule(
     """
     :- use_technique(Mode,ss_unsolved_naked_pairs),
         not counterexample(Mode,ss_unsolved_naked_pairs).
-    different_cells_in_group_ordered(C1,C2,G) :-
-        group(G), cell(C1), cell(C2),
-        in_group(C1,G), in_group(C2,G), C1 < C2.
-    value_in_pair(V1,V1,V2) :-
-        value(V1), value(V2), V1 < V2.
-    value_in_pair(V2,V1,V2) :-
-        value(V1), value(V2), V1 < V2.
     counterexample(Mode,ss_unsolved_naked_pairs) :-
         use_technique(Mode,ss_unsolved_naked_pairs),
         cell(C), cell(C1), cell(C2), C != C1, C != C2,
@@ -0,0 +1,291 @@
+"""
+Module with functionality to analyze which predicates the ASP encodings of
+deduction rules provide and require, so that duplicated definitions and
+parts of these encodings that cannot contribute to a deduction constraint
+are left out before grounding, and to specialize these encodings to the
+solving strategies that use them
+"""
+
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import FrozenSet, List, Set, Tuple
+
+from clingo import ast, parse_term, SymbolType
+
+# Predicates whose second argument determines what they are about (e.g.,
+# derivable(Mode,strike(C,V)) and use_technique(Mode,naked_pairs)); these
+# are keyed by the name of their second argument, e.g., derivable(strike)
+KEYED_PREDICATES = ("derivable", "use_technique")
+
+# Predicates that are (also) defined by the base encoding (see
+# generate_basic), or that are read by encodings outside of the deduction
+# rules; these are never considered to be unavailable or unused
+PUBLIC_PREDICATES = frozenset([
+    "solution/2",
+    "erase/1",
+    "certainly_not_erased/1",
+    "different_cells/2",
+    "different_values/2",
+    "different_cells_in_group_ordered/3",
+    "value_in_pair/3",
+    "highlight_strike/2",
+    "derivable(solution)",
+    "derivable(strike)",
+])
+
+# Variable that the encodings of the deduction rules use for the solving
+# strategy (see deduction_mode/1)
+MODE_VARIABLE = "Mode"
+
+
+@dataclass(frozen=True)
+class Statement:
+    """
+    Data class to represent a single statement of an ASP encoding, together
+    with the predicates that it provides (in its head), that it requires
+    (anywhere else), and that must be derivable for it to ever apply (the
+    positive literals in its body). Statements without a head (e.g.,
+    constraints, #show statements) are roots of the dependencies.
+    """
+    text: str
+    provides: FrozenSet[str]
+    requires: FrozenSet[str]
+    prerequisites: FrozenSet[str]
+    root: bool
+
+
+def _term_keys(term: ast.AST) -> Set[str]:
+    """
+    Returns the keys of the predicates of an atom (more than one if the atom
+    uses pooling).
+    """
+    if term.ast_type == ast.ASTType.Pool:
+        return set().union(*(_term_keys(arg) for arg in term.arguments))
+    if term.ast_type == ast.ASTType.UnaryOperation:
+        return {f"-{key}" for key in _term_keys(term.argument)}
+    if term.ast_type == ast.ASTType.SymbolicTerm:
+        return {f"{term.symbol.name}/0"}
+    if term.name in KEYED_PREDICATES and len(term.arguments) == 2:
+        return {
+            f"{term.name}({name})"
+            for name in _argument_names(term.arguments[1])
+        }
+    return {f"{term.name}/{len(term.arguments)}"}
+
+
+def _argument_names(term: ast.AST) -> Set[str]:
+    """
+    Returns the names of the functions that a term can be, or * if it can be
+    anything (e.g., if it is a variable).
+    """
+    if term.ast_type == ast.ASTType.Pool:
+        return set().union(*(_argument_names(arg) for arg in term.arguments))
+    if term.ast_type == ast.ASTType.Function and not term.external:
+        return {term.name}
+    if term.ast_type == ast.ASTType.SymbolicTerm and \
+            term.symbol.type == SymbolType.Function:
+        return {term.symbol.name}
+    return {"*"}
+
+
+class _AtomCollector(ast.Transformer):
+    """
+    Transformer that collects the keys of all atoms that it visits.
+    """
+
+    def __init__(self):
+        self.keys: Set[str] = set()
+
+    def visit_SymbolicAtom(self, atom): # pylint: disable=invalid-name
+        """
+        Records the keys of the atom.
+        """
+        self.keys.update(_term_keys(atom.symbol))
+        return atom
+
+
+def _collect(*nodes: ast.AST) -> FrozenSet[str]:
+    """
+    Returns the keys of all atoms occurring in the given nodes.
+    """
+    collector = _AtomCollector()
+    for node in nodes:
+        collector.visit(node)
+    return frozenset(collector.keys)
+
+
+def _analyze(statement: ast.AST) -> Statement:
+    """
+    Returns the analysis of a single parsed statement.
+    """
+    text = str(statement)
+    if statement.ast_type != ast.ASTType.Rule:
+        keys = _collect(statement)
+        return Statement(text, keys, keys, frozenset(), True)
+
+    head = statement.head
+    prerequisites = frozenset().union(*(
+        _term_keys(literal.atom.symbol)
+        for literal in statement.body
+        if literal.ast_type == ast.ASTType.Literal and
+        literal.sign == ast.Sign.NoSign and
+        literal.atom.ast_type == ast.ASTType.SymbolicAtom
+    ))
+    body = _collect(*statement.body)
+
+    if head.ast_type == ast.ASTType.Literal:
+        if head.sign == ast.Sign.NoSign and \
+                head.atom.ast_type == ast.ASTType.SymbolicAtom:
+            provides = _collect(head)
+            return Statement(text, provides, body, prerequisites, False)
+        return Statement(text, frozenset(), body | _collect(head),
+                         prerequisites, True)
+
+    if head.ast_type in (ast.ASTType.Aggregate, ast.ASTType.Disjunction):
+        provides = _collect(*(element.literal for element in head.elements))
+        conditions = _collect(*(
+            condition
+            for element in head.elements
+            for condition in element.condition
+        ))
+        return Statement(text, provides, body | conditions, prerequisites,
+                         False)
+
+    # Other heads (e.g., head aggregates, theory atoms) are kept as they are
+    keys = _collect(head)
+    return Statement(text, keys, body | keys, prerequisites, True)
+
+
+class _ModeSubstitution(ast.Transformer):
+    """
+    Transformer that replaces the mode variable by a given term.
+    """
+
+    def __init__(self, mode: str):
+        self.mode = parse_term(mode)
+
+    def visit_Variable(self, variable): # pylint: disable=invalid-name
+        """
+        Replaces the variable if it is the mode variable.
+        """
+        if variable.name != MODE_VARIABLE:
+            return variable
+        return ast.SymbolicTerm(variable.location, self.mode)
+
+
+def specialize_encoding(asp_code: str, modes: List[str]) -> str:
+    """
+    Returns the encoding of a deduction rule specialized to the given solving
+    strategies (e.g., strategy(s...,0)): every statement is repeated for each
+    of them, with the mode variable replaced by it. Statements that do not
+    use the mode variable are only included once.
+    """
+    substitutions = [_ModeSubstitution(mode) for mode in modes]
+    statements = {}
+    def add(statement):
+        if statement.ast_type in (ast.ASTType.Program, ast.ASTType.Comment):
+            return
+        for substitution in substitutions:
+            statements[str(substitution.visit(statement))] = None
+    ast.parse_string(asp_code, add)
+    return "".join(f"{text}\n" for text in statements)
+
+
+@lru_cache(maxsize=1024)
+def parse_statements(asp_code: str) -> Tuple[Statement, ...]:
+    """
+    Returns the analyses of the statements of an ASP encoding (leaving out
+    comments).
+    """
+    statements = []
+    def add(statement):
+        if statement.ast_type not in \
+                (ast.ASTType.Program, ast.ASTType.Comment):
+            statements.append(_analyze(statement))
+    ast.parse_string(asp_code, add)
+    return tuple(statements)
+
+
+def _matches(key: str, keys: Set[str]) -> bool:
+    """
+    Whether a key matches one of the given keys (taking into account that
+    keyed predicates with key * match any key of the same predicate).
+    """
+    if key in keys:
+        return True
+    if "(" not in key:
+        return False
+    predicate = key.split("(", 1)[0]
+    if key.endswith("(*)"):
+        return any(other.startswith(f"{predicate}(") for other in keys)
+    return f"{predicate}(*)" in keys
+
+
+def prune_blocks(blocks: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+    """
+    Returns the named blocks of an encoding (e.g., the encodings of the
+    deduction rules in a deduction constraint), with the statements that
+    occur in an earlier block left out, as well as the statements that can
+    never apply (because they require a predicate that is only defined in
+    the blocks and that can never be derived) and the statements whose heads
+    are not used anywhere (except for predicates in PUBLIC_PREDICATES).
+    """
+    # pylint: disable=too-many-locals
+
+    seen = set()
+    parsed = []
+    for name, asp_code in blocks:
+        statements = []
+        for statement in parse_statements(asp_code):
+            if statement.text not in seen:
+                seen.add(statement.text)
+                statements.append(statement)
+        parsed.append((name, statements))
+    statements = [
+        statement for _, block_statements in parsed
+        for statement in block_statements
+    ]
+
+    # Determine which statements can apply
+    internal = {
+        key for statement in statements for key in statement.provides
+        if key not in PUBLIC_PREDICATES
+    }
+    derivable = set(PUBLIC_PREDICATES)
+    applicable = set()
+    changed = True
+    while changed:
+        changed = False
+        for num, statement in enumerate(statements):
+            if num not in applicable and all(
+                    _matches(key, derivable) or not _matches(key, internal)
+                    for key in statement.prerequisites):
+                applicable.add(num)
+                derivable.update(statement.provides)
+                changed = True
+
+    # Determine which of these are used
+    used = set(PUBLIC_PREDICATES)
+    live = set()
+    changed = True
+    while changed:
+        changed = False
+        for num in applicable - live:
+            statement = statements[num]
+            if statement.root or \
+                    any(_matches(key, used) for key in statement.provides):
+                live.add(num)
+                used.update(statement.requires)
+                changed = True
+
+    pruned = []
+    num = 0
+    for name, block_statements in parsed:
+        asp_code = []
+        for statement in block_statements:
+            if num in live:
+                asp_code.append(f"{statement.text}\n")
+            num += 1
+        if asp_code:
+            pruned.append((name, "".join(asp_code)))
+    return pruned
@@ -3,68 +3,105 @@ Module with functionality to generate puzzles using ASP encodings
 """
 
 import itertools
-from typing import List
+import re
+from typing import Dict, List, Tuple
 import uuid
 
-from .deduction import SolvingStrategy, basic_deduction
+from .deduction import DeductionRule, SolvingStrategy, basic_deduction, \
+    prune_blocks, specialize_encoding
 from ..instances import Instance, SquareSudoku, RectangleBlockSudoku
 
 
+# Comment that starts every named block of an encoding (see join_blocks)
+BLOCK_MARKER = "%%% block: "
+BLOCK_PATTERN = re.compile(re.escape(BLOCK_MARKER) + r"([^\n]*)\n")
+
+
+def join_blocks(blocks: List[Tuple[str, str]]) -> str:
+    """
+    Returns an encoding that consists of named blocks (e.g., the deduction
+    rules that a deduction constraint pulls in), where every block starts
+    with a comment with its name, so that the blocks can be recovered and
+    analyzed separately (see split_blocks).
+    """
+    return "".join(
+        f"{BLOCK_MARKER}{name}\n{asp_code}"
+        for name, asp_code in blocks
+    )
+
+
+def split_blocks(asp_code: str) -> List[Tuple[str, str]]:
+    """
+    Returns the named blocks of an encoding that consists of blocks joined
+    by join_blocks (and possibly other encodings before or after them), or
+    an empty list if it has none. Code before the first block is returned
+    as a block with an empty name; code after the last block belongs to it.
+    """
+    parts = BLOCK_PATTERN.split(asp_code)
+    if len(parts) == 1:
+        return []
+
+    blocks = list(zip(parts[1::2], parts[2::2]))
+    if parts[0].strip():
+        blocks.insert(0, ("", parts[0]))
+    return blocks
+
+
 def generate_basic(instance: Instance) -> str:
     """
     Returns base encoding for generating a puzzle instance
     """
 
-    asp_code = ""
+    asp_code = []
 
     # Declare the cells
     for cell in instance.cells:
-        asp_code += f"cell({instance.cell_encoding(cell)}).\n"
+        asp_code.append(f"cell({instance.cell_encoding(cell)}).\n")
 
     # Declare the values
     for value in instance.values:
-        asp_code += f"value({instance.value_encoding(value)}).\n"
+        asp_code.append(f"value({instance.value_encoding(value)}).\n")
 
     # Declare the (full) groups and their member cells
     for group_num, (group_type, group) in enumerate(instance.groups):
-        asp_code += f"group({group_num}).\n"
-        asp_code += f"group_type({group_num},{group_type}).\n"
+        asp_code.append(f"group({group_num}).\n")
+        asp_code.append(f"group_type({group_num},{group_type}).\n")
         if len(group) == len(instance.values):
-            asp_code += f"full_group({group_num}).\n"
+            asp_code.append(f"full_group({group_num}).\n")
         for cell in group:
-            asp_code += \
+            asp_code.append(
                 f"in_group({instance.cell_encoding(cell)},{group_num}).\n"
+            )
+
+    # Declare the pairs of different cells that share a group
+    for cell, peers in instance.peers.items():
+        for peer in peers:
+            asp_code.append(
+                f"share_group({instance.cell_encoding(cell)},"
+                f"{instance.cell_encoding(peer)}).\n"
+            )
 
     # Declare predicate that captures when cells are different
-    asp_code += """
+    asp_code.append("""
         different_cells(C1,C2) :-
             cell(C1), cell(C2), C1 != C2.
-    """
-
-    # Declare predicate that captures when cells share a group
-    asp_code += """
-        share_group(C1,C2) :-
-            group(G),
-            cell(C1), in_group(C1,G),
-            cell(C2), in_group(C2,G),
-            different_cells(C1,C2).
-    """
+    """)
 
     # Declare predicate that captures when values are different
-    asp_code += """
+    asp_code.append("""
         different_values(V1,V2) :-
             value(V1), value(V2), V1 != V2.
-    """
+    """)
 
     # Define what a solution should look like
-    asp_code += """
+    asp_code.append("""
         1 { solution(C,V) : value(V) } 1 :- cell(C).
         :- share_group(C1,C2), solution(C1,V), solution(C2,V).
         { erase(C) } :- cell(C).
-    """
+    """)
 
     #
-    asp_code += """
+    asp_code.append("""
         different_cells_in_group_ordered(C1,C2,G) :-
             group(G), cell(C1), cell(C2),
             in_group(C1,G), in_group(C2,G), C1 < C2.
@@ -72,20 +109,20 @@ def generate_basic(instance: Instance) -> str:
             value(V1), value(V2), V1 < V2.
         value_in_pair(V2,V1,V2) :-
             value(V1), value(V2), V1 < V2.
-    """
+    """)
 
     # Use certainly_not_erased/1, to avoid warnings.
-    asp_code += """
+    asp_code.append("""
         certainly_not_erased(dummy).
-    """
+    """)
 
     # Declare what to show
-    asp_code += """
+    asp_code.append("""
         #show solution/2.
         #show erase/1.
-    """
+    """)
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def unique_solution() -> str:
@@ -162,6 +199,49 @@ def constrain_num_filled_cells(
         return f"{minimum_erase} {{ erase(C) : erase(C) }} {maximum_erase}.\n"
 
 
+def active_groups(
+        instance: Instance,
+        strategy: SolvingStrategy
+    ) -> List[int]:
+    """
+    Returns the numbers of the groups of the instance that a solving strategy
+    applies to (all groups, if the strategy does not restrict them).
+    """
+
+    if not strategy.groups:
+        return list(range(len(instance.groups)))
+    groups_by_type = instance.index.groups_by_type
+    return sorted(
+        groupnum
+        for groupname in set(strategy.groups)
+        for groupnum in groups_by_type.get(groupname, [])
+    )
+
+
+def rule_blocks(
+        strategy_names: List[str],
+        solving_strategies: List[SolvingStrategy]
+    ) -> List[Tuple[str, str]]:
+    """
+    Returns the encodings of the deduction rules used by the solving
+    strategies (with the given names), as named blocks. Each rule is
+    specialized to the strategies that use it, so that it is not grounded
+    for the other strategies; basic_deduction is used by all strategies.
+    """
+
+    modes: Dict[DeductionRule, List[str]] = {}
+    for strategy_name, strategy in zip(strategy_names, solving_strategies):
+        for rule in [basic_deduction] + strategy.rules:
+            rule_modes = modes.setdefault(rule, [])
+            if strategy_name not in rule_modes:
+                rule_modes.append(strategy_name)
+
+    return [
+        (rule.name, specialize_encoding(rule.encoding, modes[rule]))
+        for rule in sorted(modes, key=lambda rule: rule.name)
+    ]
+
+
 def deduction_constraint(
         instance: Instance,
         solving_strategies: List[SolvingStrategy]
@@ -174,8 +254,8 @@ def deduction_constraint(
     lead to (e.g., a fully solved solution, etc).
     """
 
-    asp_code = ""
-    all_rules = set([basic_deduction])
+    asp_code = []
+    strategy_names = []
 
     # Generate unique id to avoid collision with multiple (chained)
     # deduction constraints
@@ -184,20 +264,19 @@ def deduction_constraint(
     # Express each solving strategy in the asp code
     for strategy_num, strategy in enumerate(solving_strategies):
         strategy_name = f"strategy(s{strategy_uuid},{strategy_num})"
-        asp_code += f"deduction_mode({strategy_name}).\n"
-        all_rules.update(strategy.rules)
+        strategy_names.append(strategy_name)
+        asp_code.append(f"deduction_mode({strategy_name}).\n")
         for rule in strategy.rules:
-            asp_code += f"use_technique({strategy_name},{rule.name}).\n"
-        for groupnum, (groupname, _) in enumerate(instance.groups):
-            if ((strategy.groups and groupname in strategy.groups)
-                    or not strategy.groups):
-                asp_code += f"active_group({strategy_name},{groupnum}).\n"
+            asp_code.append(f"use_technique({strategy_name},{rule.name}).\n")
+        for groupnum in active_groups(instance, strategy):
+            asp_code.append(f"active_group({strategy_name},{groupnum}).\n")
 
-    # Add the encodings of the rules that were used
-    for rule in all_rules:
-        asp_code += rule.encoding
+    # Add the encodings of the rules that were used, leaving out duplicated
+    # definitions and parts that cannot contribute
+    blocks = [("strategies", "".join(asp_code))]
+    blocks += rule_blocks(strategy_names, solving_strategies)
 
-    return asp_code
+    return join_blocks(prune_blocks(blocks))
 
 
 def chained_deduction_constraint(
@@ -214,8 +293,8 @@ def chained_deduction_constraint(
     """
     # pylint: disable=too-many-locals
 
-    asp_code = ""
-    all_rules = set([basic_deduction])
+    asp_code = []
+    strategy_names = []
 
     # Generate unique id to avoid collision with multiple (chained)
     # deduction constraints
@@ -227,14 +306,12 @@ def chained_deduction_constraint(
     # Express each solving strategy in the asp code
     for strategy_num, strategy in enumerate(solving_strategies):
         strategy_name = construct_strategy_name(strategy_num)
-        asp_code += f"deduction_mode({strategy_name}).\n"
-        all_rules.update(strategy.rules)
+        strategy_names.append(strategy_name)
+        asp_code.append(f"deduction_mode({strategy_name}).\n")
         for rule in strategy.rules:
-            asp_code += f"use_technique({strategy_name},{rule.name}).\n"
-        for groupnum, (groupname, _) in enumerate(instance.groups):
-            if ((strategy.groups and groupname in strategy.groups)
-                    or not strategy.groups):
-                asp_code += f"active_group({strategy_name},{groupnum}).\n"
+            asp_code.append(f"use_technique({strategy_name},{rule.name}).\n")
+        for groupnum in active_groups(instance, strategy):
+            asp_code.append(f"active_group({strategy_name},{groupnum}).\n")
 
     # If no chaining pattern is given, use a simple subsequent pattern
     if not chaining_pattern:
@@ -248,7 +325,7 @@ def chained_deduction_constraint(
     for (cur_strategy_num, next_strategy_num) in chaining_pattern:
         cur_strategy_name = construct_strategy_name(cur_strategy_num)
         next_strategy_name = construct_strategy_name(next_strategy_num)
-        asp_code += f"""
+        asp_code.append(f"""
             derivable({next_strategy_name},strike(C,V)) :-
                 derivable({cur_strategy_name},strike(C,V)).
             derivable({next_strategy_name},strike(C,V)) :-
@@ -260,13 +337,14 @@ def chained_deduction_constraint(
 
             % To avoid spurious warnings
             derivable({cur_strategy_name},pre_strike(dummy,dummy)).
-        """
+        """)
 
-    # Add the encodings of the rules that were used
-    for rule in all_rules:
-        asp_code += rule.encoding
+    # Add the encodings of the rules that were used, leaving out duplicated
+    # definitions and parts that cannot contribute
+    blocks = [("strategies", "".join(asp_code))]
+    blocks += rule_blocks(strategy_names, solving_strategies)
 
-    return asp_code
+    return join_blocks(prune_blocks(blocks))
 
 
 def left_right_symmetry(
@@ -277,19 +355,19 @@ def left_right_symmetry(
     the (square) puzzle instance is left-right symmetric
     """
 
-    asp_code = ""
+    asp_code = []
     for col in range(1, int(instance.size/2)+1):
         for row in range(1, instance.size+1):
             cell1 = (col,row)
             cell2 = (instance.size+1-col,row)
-            asp_code += f"""
+            asp_code.append(f"""
                 erase({instance.cell_encoding(cell1)}) :-
                     erase({instance.cell_encoding(cell2)}).
                 erase({instance.cell_encoding(cell2)}) :-
                     erase({instance.cell_encoding(cell1)}).
-            """
+            """)
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def top_bottom_symmetry(
@@ -300,19 +378,19 @@ def top_bottom_symmetry(
     the (square) puzzle instance is top-bottom symmetric
     """
 
-    asp_code = ""
+    asp_code = []
     for col in range(1, instance.size+1):
         for row in range(1, int(instance.size/2)+1):
             cell1 = (col,row)
             cell2 = (col,instance.size+1-row)
-            asp_code += f"""
+            asp_code.append(f"""
                 erase({instance.cell_encoding(cell1)}) :-
                     erase({instance.cell_encoding(cell2)}).
                 erase({instance.cell_encoding(cell2)}) :-
                     erase({instance.cell_encoding(cell1)}).
-            """
+            """)
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def point_symmetry(
@@ -323,19 +401,19 @@ def point_symmetry(
     the (square) puzzle instance is point symmetric
     """
 
-    asp_code = ""
+    asp_code = []
     for col in range(1, instance.size+1):
         for row in range(1, int(instance.size/2)+2):
             cell1 = (col,row)
             cell2 = (instance.size+1-col,instance.size+1-row)
-            asp_code += f"""
+            asp_code.append(f"""
                 erase({instance.cell_encoding(cell1)}) :-
                     erase({instance.cell_encoding(cell2)}).
                 erase({instance.cell_encoding(cell2)}) :-
                     erase({instance.cell_encoding(cell1)}).
-            """
+            """)
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def forbid_values(
@@ -346,12 +424,12 @@ def forbid_values(
     non-empty cells in the puzzle
     """
 
-    asp_code = ""
+    asp_code = []
 
     for value in forbidden_values:
-        asp_code += f"erase(C) :- cell(C), solution(C,{value}).\n"
+        asp_code.append(f"erase(C) :- cell(C), solution(C,{value}).\n")
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def fill_cell(
@@ -394,15 +472,15 @@ def sym_breaking_top_row(
     solution of the puzzle contains the values in order (i.e., 1, 2, 3, ...).
     """
 
-    asp_code = ""
+    asp_code = []
     row = 1
     for col in range(1, instance.size+1):
         cell = (col,row)
-        asp_code += f"""
+        asp_code.append(f"""
             :- not solution({instance.cell_encoding(cell)},{col}).
-        """
+        """)
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def sym_breaking_row_col_ordering(
@@ -416,7 +494,7 @@ def sym_breaking_row_col_ordering(
     block_width = instance._block_width
     block_height = instance._block_height
 
-    asp_code = ""
+    asp_code = []
 
     def encoding_rows_ordered(row1, row2):
         return f"""
@@ -443,7 +521,7 @@ def sym_breaking_row_col_ordering(
                 basis = row_basis * block_height
                 row1 = basis + row1_basis
                 row2 = basis + row1_basis + row2_basis
-                asp_code += encoding_rows_ordered(row1, row2)
+                asp_code.append(encoding_rows_ordered(row1, row2))
 
     # Corresponding rows between blocks
     row_basis = 0
@@ -452,7 +530,7 @@ def sym_breaking_row_col_ordering(
             basis = row_basis
             row1 = basis + row1_basis * block_height + 1
             row2 = basis + (row1_basis + row2_basis) * block_height + 1
-            asp_code += encoding_rows_ordered(row1, row2)
+            asp_code.append(encoding_rows_ordered(row1, row2))
 
     # Cols inside blocks
     for col_basis in range(block_height):
@@ -461,7 +539,7 @@ def sym_breaking_row_col_ordering(
                 basis = col_basis * block_width
                 col1 = basis + col1_basis
                 col2 = basis + col1_basis + col2_basis
-                asp_code += encoding_cols_ordered(col1, col2)
+                asp_code.append(encoding_cols_ordered(col1, col2))
 
     # Corresponding cols between blocks
     col_basis = 0
@@ -470,9 +548,9 @@ def sym_breaking_row_col_ordering(
             basis = col_basis
             col1 = basis + col1_basis * block_width + 1
             col2 = basis + (col1_basis + col2_basis) * block_width + 1
-            asp_code += encoding_cols_ordered(col1, col2)
+            asp_code.append(encoding_cols_ordered(col1, col2))
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def sym_breaking_left_column(
@@ -487,7 +565,7 @@ def sym_breaking_left_column(
     block_width = instance._block_width
     block_height = instance._block_height
 
-    asp_code = ""
+    asp_code = []
 
     # Rows inside blocks
     for row_basis in range(block_width):
@@ -498,11 +576,11 @@ def sym_breaking_left_column(
                 row2 = basis + row1_basis + row2_basis
                 cell1 = (1,row1)
                 cell2 = (1,row2)
-                asp_code += f"""
+                asp_code.append(f"""
                     :- solution({instance.cell_encoding(cell1)},V1),
                         solution({instance.cell_encoding(cell2)},V2),
                         V2 < V1.
-                """
+                """)
 
     # Corresponding rows between blocks
     row_basis = 0
@@ -513,13 +591,13 @@ def sym_breaking_left_column(
             row2 = basis + (row1_basis + row2_basis) * block_height + 1
             cell1 = (1,row1)
             cell2 = (1,row2)
-            asp_code += f"""
+            asp_code.append(f"""
                 :- solution({instance.cell_encoding(cell1)},V1),
                     solution({instance.cell_encoding(cell2)},V2),
                     V2 < V1.
-            """
+            """)
 
-    return asp_code
+    return "".join(asp_code)
 
 
 def sym_breaking_at_most_one_hidden() -> str:
@@ -550,34 +628,80 @@ def use_mask(
     and a "?" indicates free choice for the cell.
     """
 
-    asp_code = ""
+    asp_code = []
     mask_pieces = [
         (j, i, mask[(i-1) * instance.size + j - 1])
         for (i, j) in itertools.product(range(1, instance.size+1), repeat=2)
     ]
     for (i, j, val) in mask_pieces:
         if val == "0":
-            asp_code += f"""
+            asp_code.append(f"""
                 :- not erase({instance.cell_encoding((i,j))}).
-            """
+            """)
         elif val == "*":
-            asp_code += f"""
+            asp_code.append(f"""
                 :- erase({instance.cell_encoding((i,j))}).
                 certainly_not_erased({instance.cell_encoding((i,j))}).
-            """
+            """)
         else:
             try:
                 val = int(val)
-                asp_code += f"""
+                asp_code.append(f"""
                     :- erase({instance.cell_encoding((i,j))}).
                     :- not solution({instance.cell_encoding((i,j))},{val}).
                     certainly_not_erased({instance.cell_encoding((i,j))}).
-                """
+                """)
             except ValueError:
                 pass
+    return "".join(asp_code)
+
+
+def use_mask_externals() -> str:
+    """
+    Returns the encoding that declares external atoms with which a mask can be
+    imposed on the puzzle without grounding additional constraints (see
+    use_mask_assignment).
+    """
+
+    asp_code = """
+        #external mask_open(C) : cell(C).
+        #external mask_filled(C) : cell(C).
+        #external mask_value(C,V) : cell(C), value(V).
+        :- mask_open(C), not erase(C).
+        :- mask_filled(C), erase(C).
+        :- mask_value(C,V), not solution(C,V).
+        certainly_not_erased(C) :- mask_filled(C).
+    """
     return asp_code
 
 
+def use_mask_assignment(
+        instance: SquareSudoku,
+        mask: str
+    ) -> Dict[str, bool]:
+    """
+    Returns the truth values that the external atoms of use_mask_externals
+    should get to impose the given mask (in the format of use_mask) on the
+    puzzle.
+    """
+
+    assignment = {}
+    mask_pieces = [
+        (j, i, mask[(i-1) * instance.size + j - 1])
+        for (i, j) in itertools.product(range(1, instance.size+1), repeat=2)
+    ]
+    for (i, j, val) in mask_pieces:
+        cell = instance.cell_encoding((i,j))
+        assignment[f"mask_open({cell})"] = val == "0"
+        assignment[f"mask_filled({cell})"] = \
+            val == "*" or (val.isdigit() and val != "0")
+        for value in instance.values:
+            value_term = instance.value_encoding(value)
+            assignment[f"mask_value({cell},{value_term})"] = \
+                val == str(value)
+    return assignment
+
+
 def arrangeable_left_right_symmetry(
         instance: SquareSudoku
     ) -> str:
@@ -590,19 +714,19 @@ def arrangeable_left_right_symmetry(
     if instance.size != 9:
         raise NotImplementedError()
 
-    asp_code = ""
+    asp_code = []
     for col in range(1, 10):
-        asp_code += f"column({col}).\n"
+        asp_code.append(f"column({col}).\n")
     for col_band in range(1, 4):
-        asp_code += f"column_band({col_band}).\n"
+        asp_code.append(f"column_band({col_band}).\n")
         for col_inside in range(1, 4):
             col = (col_band - 1) * 3 + col_inside
-            asp_code += f"column_in_band({col},{col_band}).\n"
+            asp_code.append(f"column_in_band({col},{col_band}).\n")
     for col1, col2 in itertools.combinations(range(1, 10), r=2):
         for row in range(1, 10):
             cell1 = instance.cell_encoding((col1, row))
             cell2 = instance.cell_encoding((col2, row))
-            asp_code += f"""
+            asp_code.append(f"""
                 cells_same_pattern({cell1},{cell2}) :-
                     columns_same_pattern({col1},{col2}).
                 columns_same_pattern({col1},{col2}) :-
@@ -611,14 +735,14 @@ def arrangeable_left_right_symmetry(
                     not erase({cell1}), erase({cell2}).
                 :- cells_same_pattern({cell1},{cell2}),
                     erase({cell1}), not erase({cell2}).
-            """
-    asp_code += """
+            """)
+    asp_code.append("""
         1 { middle_column_band(B) : column_band(B) } 1.
         1 { columns_same_pattern(C1,C2) :
             column_in_band(C1,B), column_in_band(C2,B), C1 < C2 } 1 :-
             middle_column_band(B).
-    """
-    asp_code += """
+    """)
+    asp_code.append("""
         1 { columns_same_pattern(C1,C2) :
             column(C2), column_in_band(C2,B2) } 1 :-
             column_band(B1), column_band(B2), B1 < B2,
@@ -629,6 +753,6 @@ def arrangeable_left_right_symmetry(
             column_band(B1), column_band(B2), B1 < B2,
             not middle_column_band(B1), not middle_column_band(B2),
             column_in_band(C2,B2).
-    """
+    """)
 
-    return asp_code
+    return "".join(asp_code)
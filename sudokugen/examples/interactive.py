@@ -4,7 +4,8 @@ Sudoku puzzles
 """
 # pylint: disable=too-many-lines
 
-from .. import instances, generate_puzzle, encodings, masks
+from .. import instances, generate_puzzle, encodings, masks, \
+    GenerationPipeline
 
 
 def initial_color_wrap(
@@ -2056,6 +2057,9 @@ def prepend_generic(
     """
     Function to take a Sudoku puzzle and from it construct another that
     requires some particular solving techniques to get to the given puzzle.
+
+    All steps use one GenerationPipeline. The (large) deduction steps are
+    added as final steps, so that clasp can still simplify them.
     """
     # pylint: disable=too-many-arguments,too-many-branches,too-many-locals
 
@@ -2075,6 +2079,11 @@ def prepend_generic(
             ]
 
         instance = instances.RegularSudoku(9)
+        pipeline = GenerationPipeline(
+            instance,
+            cl_arguments=["--parallel-mode=4"],
+            max_rules=1000000,
+        )
         constraints = [
             encodings.use_mask(
                 instance,
@@ -2094,8 +2103,7 @@ def prepend_generic(
         ]
 
         # Generate the puzzle
-        found_solution = generate_puzzle(
-            instance,
+        found_solution = pipeline.step(
             constraints,
             timeout=30,
             verbose=False,
@@ -2108,6 +2116,12 @@ def prepend_generic(
     puzzle = None
     if not instance:
         instance = instances.RegularSudoku(9)
+    if not use_strong_connection:
+        pipeline = GenerationPipeline(
+            instance,
+            cl_arguments=["--parallel-mode=4"],
+            max_rules=1000000,
+        )
 
     if not pre_rules:
         pre_rules = []
@@ -2205,12 +2219,11 @@ def prepend_generic(
             additional_constraints
 
         # Generate the puzzle
-        found_solution = generate_puzzle(
-            instance,
+        found_solution = pipeline.step(
             constraints,
             timeout=timeout,
             verbose=verbose,
-            cl_arguments=["--parallel-mode=4"],
+            final=True,
         )
 
         if found_solution:
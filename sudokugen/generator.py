@@ -2,12 +2,226 @@
 Module with functionality to generate puzzle instances
 """
 
+import asyncio
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
 from copy import deepcopy
-from typing import List, Optional
+from dataclasses import dataclass, field
+import hashlib
+import logging
+import multiprocessing
+import os
+import queue
+import random
+import time
+from typing import AsyncIterator, Callable, Dict, Iterator, List, \
+    Optional, Set, Tuple, Union
 import clingo
+from clingo import ast
+
+from . import masks
+from .cache import PuzzleCache, is_deterministic
+from .dedup import CanonicalIndex
+from .instances import Board, Instance
+from .solver import solve
+from .encodings import generate_basic, split_blocks, use_mask_externals, \
+    use_mask_assignment
+from .workers import initialize_worker, terminate_workers
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class BlockStatistics:
+    """
+    Data class to represent how much a block of the encoding (a constraint,
+    the custom encoding, or a deduction rule) contributes to grounding, i.e.,
+    the difference between grounding the full encoding and grounding the
+    encoding without the block.
+    """
+    name: str
+    ground_time: float
+    rules: int
+    atoms: int
+
+
+@dataclass
+class GenerationStatistics:
+    """
+    Data class to represent statistics about grounding and solving the
+    encoding for generating a puzzle.
+    """
+    ground_time: float = 0.0
+    rules: int = 0
+    atoms: int = 0
+    solve_time: float = 0.0
+    total_time: float = 0.0
+    choices: int = 0
+    conflicts: int = 0
+    blocks: List[BlockStatistics] = field(default_factory=list)
+    configuration: Optional[List[str]] = None
+
+    def repr_pretty(self) -> str:
+        """
+        Provides a pretty representation of the statistics.
+        """
+        output = f"Grounding took: {self.ground_time:.2f}s "
+        output += f"({self.rules} rules, {self.atoms} atoms)\n"
+        for block in sorted(self.blocks, key=lambda block: -block.rules):
+            output += f"  {block.name}: {block.ground_time:.2f}s "
+            output += f"({block.rules} rules, {block.atoms} atoms)\n"
+        output += f"Total time: {self.total_time:.2f}s\n"
+        output += f"Solving took: {self.solve_time:.2f}s"
+        if self.configuration:
+            output += f"\nConfiguration: {' '.join(self.configuration)}"
+        return output
+
+
+@dataclass
+class ModelSnapshot:
+    """
+    Data class to represent a model found while generating a puzzle: copies
+    of its puzzle and solution, its cost (for the optimization statements of
+    the encoding, if any), the time since solving started, and whether it is
+    known to be optimal.
+    """
+    puzzle: Union[Dict[Tuple, int], Board]
+    solution: Union[Dict[Tuple, int], Board]
+    cost: List[int]
+    elapsed: float
+    optimal: bool = False
+    outputs: Dict[str, List[str]] = field(default_factory=dict)
+
+    def to_instance(self, instance: Instance) -> Instance:
+        """
+        Returns a copy of an instance with the puzzle and solution of this
+        model.
+        """
+        new_instance = deepcopy(instance)
+        new_instance.puzzle = self.puzzle.copy()
+        new_instance.solution = self.solution.copy()
+        new_instance.outputs = deepcopy(self.outputs)
+        return new_instance
+
+
+class UniquenessPropagator:
+    """
+    Propagator that requires the puzzle to have a unique solution, as an
+    alternative to the saturation encoding of encodings.unique_solution().
+
+    Whenever clingo proposes a complete candidate (a solution and a puzzle),
+    the puzzle is solved in Python (see solver.solve). If it has another
+    solution, the smallest set of cells where the two solutions differ whose
+    values can be swapped on their own is an unavoidable set: every candidate
+    that has the same values on these cells and erases all of them is
+    ambiguous as well (the values can be swapped within every full group).
+    A nogood is added that rules out all these candidates. For
+    groups that are not full, the values of their other cells are part of
+    the nogood as well, as swapping is only safe if these are the same.
+    """
+
+    def __init__(self, instance: Instance):
+        self.instance = instance
+        self._solution_literals: List[Tuple[int, Tuple, int]] = []
+        self._solution_literal: Dict[Tuple[Tuple, int], int] = {}
+        self._erase_literals: Dict[Tuple, int] = {}
+        self._groups: Dict[Tuple, List[List[Tuple]]] = {}
+        self._partial_groups: Dict[Tuple, List[List[Tuple]]] = {}
+        for _, group in instance.groups:
+            for cell in group:
+                self._groups.setdefault(cell, []).append(group)
+                if len(group) < len(instance.values):
+                    self._partial_groups.setdefault(cell, []).append(group)
+
+    def init(self, init: clingo.PropagateInit):
+        """
+        Collects the solver literals of the solution/2 and erase/1 atoms.
+        """
+
+        cells = {
+            self.instance.cell_encoding(cell): cell
+            for cell in self.instance.cells
+        }
+        values = {
+            self.instance.value_encoding(value): value
+            for value in self.instance.values
+        }
+
+        self._solution_literals = []
+        for atom in init.symbolic_atoms.by_signature("solution", 2):
+            cell = cells.get(str(atom.symbol.arguments[0]))
+            value = values.get(str(atom.symbol.arguments[1]))
+            if cell is not None and value is not None:
+                self._solution_literals.append(
+                    (init.solver_literal(atom.literal), cell, value)
+                )
+        self._solution_literal = {
+            (cell, value): literal
+            for literal, cell, value in self._solution_literals
+        }
+        self._erase_literals = {}
+        for atom in init.symbolic_atoms.by_signature("erase", 1):
+            cell = cells.get(str(atom.symbol.arguments[0]))
+            if cell is not None:
+                self._erase_literals[cell] = init.solver_literal(atom.literal)
+
+        init.check_mode = clingo.PropagatorCheckMode.Total
+
+    def _unavoidable_set(self, solution: Dict, other_solution: Dict) -> Set:
+        """
+        Returns the smallest set of cells where the two solutions differ whose
+        values can be swapped on their own: if a cell is swapped, every cell
+        of the same group that has its new value must be swapped as well.
+        """
+        smallest = None
+        for start, value in solution.items():
+            if other_solution[start] == value:
+                continue
+            swapped = {start}
+            stack = [start]
+            while stack:
+                cell = stack.pop()
+                for group in self._groups[cell]:
+                    for other in group:
+                        if other not in swapped and \
+                                solution.get(other) == other_solution[cell]:
+                            swapped.add(other)
+                            stack.append(other)
+            if smallest is None or len(swapped) < len(smallest):
+                smallest = swapped
+        return smallest
+
+    def check(self, control: clingo.PropagateControl):
+        """
+        Checks whether the puzzle of a complete candidate has a unique
+        solution, and adds a nogood if it does not.
+        """
+
+        assignment = control.assignment
+        solution = {}
+        for literal, cell, value in self._solution_literals:
+            if assignment.is_true(literal):
+                solution[cell] = value
+        puzzle = {
+            cell: 0 if cell in self._erase_literals
+            and assignment.is_true(self._erase_literals[cell]) else value
+            for cell, value in solution.items()
+        }
+
+        for other_solution in solve(self.instance, puzzle, limit=2):
+            if other_solution == solution:
+                continue
+            swapped = self._unavoidable_set(solution, other_solution)
+            fixed = set(swapped)
+            for cell in swapped:
+                for group in self._partial_groups.get(cell, []):
+                    fixed.update(group)
+            nogood = [
+                self._solution_literal[(cell, solution[cell])]
+                for cell in fixed
+            ] + [self._erase_literals[cell] for cell in swapped]
+            if not control.add_nogood(nogood) or not control.propagate():
+                return
 
-from .instances import Instance
-from .encodings import generate_basic
 
 def generate_puzzle(
         instance: Instance,
@@ -15,12 +229,47 @@ def generate_puzzle(
         timeout: Optional[int] = None,
         verbose: Optional[bool] = None,
         cl_arguments: Optional[List[str]] = None,
-        custom_encoding: Optional[str] = None
+        custom_encoding: Optional[str] = None,
+        profile_grounding: Optional[bool] = None,
+        verify_uniqueness: Optional[bool] = None,
+        max_cost: Optional[Union[int, List[int]]] = None,
+        stall_time: Optional[float] = None,
+        stop_when: Optional[Callable[[ModelSnapshot], bool]] = None,
+        cache: Optional[PuzzleCache] = None
     ) -> Optional[Instance]:
     """
     Takes a Sudoku instance, and generates a solution and puzzle if possible.
+
+    Statistics about grounding and solving are stored in the statistics
+    member of the returned instance. If profile_grounding is set, these
+    include a breakdown per block of the encoding (each of the constraints,
+    the custom encoding, and each of the deduction rules in a deduction
+    constraint); this requires grounding the encoding once more, and once
+    more for every block.
+
+    If verify_uniqueness is set, the puzzle is required to have a unique
+    solution by means of a UniquenessPropagator; the constraints should then
+    not include encodings.unique_solution(). This is only faster for puzzles
+    with many clues; for puzzles with few clues, encodings.unique_solution()
+    is usually faster.
+
+    When optimizing, solving stops before the timeout (with the best model
+    so far) once a model has a cost of at most max_cost (compared
+    lexicographically; e.g., [-57] for at most 24 clues in a 9x9 puzzle
+    with encodings.minimize_num_filled_cells()), once no better model was
+    found for stall_time seconds, or once stop_when returns True for a
+    model.
+
+    If a cache is given (and no stop_when), generated instances are stored
+    in it, keyed by a fingerprint of the encoding, the clingo arguments and
+    the options that affect the result (including profile_grounding, as the
+    statistics are stored with the instances). For deterministic clingo
+    arguments (see cache.is_deterministic), a stored instance is returned
+    right away; otherwise, new instances are generated until the pool for
+    the fingerprint is full, and then a random one from the pool is
+    returned.
     """
-    # pylint: disable=too-many-arguments
+    # pylint: disable=too-many-arguments,too-many-locals
 
     new_instance = deepcopy(instance)
 
@@ -39,14 +288,399 @@ def generate_puzzle(
     # with open("encoding.lp", "w", encoding="utf-8") as file:
     #     file.write(asp_code)
 
+    # Look up the encoding in the cache, if any
+    fingerprint = None
+    if cache is not None and stop_when is None:
+        fingerprint = cache.fingerprint(
+            new_instance,
+            asp_code,
+            cl_arguments,
+            timeout,
+            bool(profile_grounding),
+            bool(verify_uniqueness),
+            max_cost,
+            stall_time
+        )
+        if is_deterministic(cl_arguments):
+            cached_instance = cache.get(fingerprint)
+        elif cache.pool(fingerprint) >= cache.pool_size:
+            cached_instance = cache.get(fingerprint, random.Random())
+        else:
+            cached_instance = None
+        if cached_instance is not None:
+            if verbose:
+                print("Found in cache")
+            return cached_instance
+
     # Call the ASP solver on the encoding,
     # and let the instance deal with answer sets
     if verbose:
         print("Grounding..")
-    control = clingo.Control(arguments=cl_arguments)
+    control, statistics = _ground(asp_code, cl_arguments)
+    if verify_uniqueness:
+        control.register_propagator(UniquenessPropagator(new_instance))
+    if profile_grounding:
+        statistics.blocks = _profile_grounding(
+            generate_basic(new_instance),
+            constraints,
+            custom_encoding,
+            cl_arguments
+        )
+    new_instance.statistics = statistics
+
+    found_instance = _solve_for_instance(
+        control,
+        new_instance,
+        timeout,
+        verbose,
+        max_cost=max_cost,
+        stall_time=stall_time,
+        stop_when=stop_when
+    )
+    if found_instance and fingerprint is not None:
+        cache.put(fingerprint, found_instance)
+    return found_instance
+
+
+def measure_generation(
+        instance: Instance,
+        constraints: List[str],
+        timeout: Optional[int] = None,
+        cl_arguments: Optional[List[str]] = None
+    ) -> Tuple[Optional[Instance], GenerationStatistics]:
+    """
+    Variant of generate_puzzle for benchmarking encodings: grounds and
+    solves the encoding (without printing anything), and returns the found
+    instance (None if no puzzle was found) together with the statistics
+    about grounding and solving, which are also returned if no puzzle was
+    found (e.g., because of the timeout).
+    """
+
+    new_instance = deepcopy(instance)
+    asp_code = generate_basic(new_instance) + "".join(constraints)
+
+    control, new_instance.statistics = _ground(
+        asp_code,
+        cl_arguments or [],
+        quiet=True
+    )
+    found_instance = _solve_for_instance(
+        control,
+        new_instance,
+        timeout,
+        False
+    )
+    return found_instance, new_instance.statistics
+
+
+async def generate_puzzle_async(
+        instance: Instance,
+        constraints: List[str],
+        timeout: Optional[int] = None,
+        cl_arguments: Optional[List[str]] = None,
+        custom_encoding: Optional[str] = None,
+        verify_uniqueness: Optional[bool] = None
+    ) -> AsyncIterator[Instance]:
+    """
+    Variant of generate_puzzle for use with asyncio: grounding runs in the
+    default executor, and solving in the background, so that the event loop
+    is never blocked. Yields an instance for every model found (i.e., for
+    every improvement when optimizing), of which the last one is the final
+    result (as returned by generate_puzzle).
+
+    Cancelling the task that iterates over this (or stopping the iteration
+    early) cancels the solve call, as does reaching the timeout.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+
+    loop = asyncio.get_running_loop()
+    if not cl_arguments:
+        cl_arguments = []
+
+    asp_code = generate_basic(instance)
+    asp_code += "".join(constraints)
+    if custom_encoding:
+        asp_code += custom_encoding
+
+    control, statistics = await loop.run_in_executor(
+        None, _ground, asp_code, cl_arguments
+    )
+    if verify_uniqueness:
+        control.register_propagator(UniquenessPropagator(instance))
+    control.configuration.solve.opt_mode = "optN" # pylint: disable=no-member
+    control.configuration.solve.models = 1 # pylint: disable=no-member
+
+    # The callbacks are called from the solving thread
+    found = asyncio.Queue()
+    finished = object()
+    start_time = time.perf_counter()
+
+    def on_model(model: clingo.Model):
+        new_instance = deepcopy(instance)
+        new_instance.extract_from_answer_set(model)
+        new_instance.statistics = deepcopy(statistics)
+        new_instance.statistics.solve_time = \
+            time.perf_counter() - start_time
+        new_instance.statistics.total_time = \
+            new_instance.statistics.ground_time + \
+            new_instance.statistics.solve_time
+        loop.call_soon_threadsafe(found.put_nowait, new_instance)
+
+    def on_finish(_):
+        loop.call_soon_threadsafe(found.put_nowait, finished)
+
+    with control.solve(
+            on_model=on_model,
+            on_finish=on_finish,
+            async_=True
+        ) as handle:
+        timer = None
+        if timeout:
+            timer = loop.call_later(timeout, handle.cancel)
+        try:
+            while True:
+                new_instance = await found.get()
+                if new_instance is finished:
+                    break
+                if new_instance.puzzle:
+                    yield new_instance
+        finally:
+            if timer:
+                timer.cancel()
+            # Cancelling waits for the solving thread to stop
+            await loop.run_in_executor(None, handle.cancel)
+
+
+def generate_puzzle_models(
+        instance: Instance,
+        constraints: List[str],
+        timeout: Optional[int] = None,
+        cl_arguments: Optional[List[str]] = None,
+        custom_encoding: Optional[str] = None,
+        verify_uniqueness: Optional[bool] = None
+    ) -> Iterator[ModelSnapshot]:
+    """
+    Variant of generate_puzzle that yields a ModelSnapshot for every model
+    found (i.e., for every improvement when optimizing), instead of only
+    returning the last one. Stopping the iteration early (e.g., once a model
+    is good enough) stops the solver, without waiting for the timeout or for
+    optimality to be proven.
+    """
+    # pylint: disable=too-many-arguments
+
+    new_instance = deepcopy(instance)
+    if not cl_arguments:
+        cl_arguments = []
+
+    asp_code = generate_basic(new_instance)
+    asp_code += "".join(constraints)
+    if custom_encoding:
+        asp_code += custom_encoding
+
+    control, _ = _ground(asp_code, cl_arguments)
+    if verify_uniqueness:
+        control.register_propagator(UniquenessPropagator(new_instance))
+    control.configuration.solve.opt_mode = "optN" # pylint: disable=no-member
+    control.configuration.solve.models = 1 # pylint: disable=no-member
+
+    start_time = time.perf_counter()
+    with control.solve(yield_=True, async_=True) as handle:
+        while True:
+            handle.resume()
+            if timeout:
+                remaining = timeout - (time.perf_counter() - start_time)
+                if remaining <= 0 or not handle.wait(remaining):
+                    handle.cancel()
+                    return
+            model = handle.model()
+            if model is None:
+                return
+            new_instance.extract_from_answer_set(model)
+            if not new_instance.puzzle:
+                continue
+            yield _snapshot(new_instance, model, start_time)
+
+
+def _snapshot(
+        instance: Instance,
+        model: clingo.Model,
+        start_time: float
+    ) -> ModelSnapshot:
+    """
+    Returns a ModelSnapshot of a model, whose puzzle and solution have been
+    extracted into the instance.
+    """
+    return ModelSnapshot(
+        puzzle=instance.puzzle.copy(),
+        solution=instance.solution.copy(),
+        cost=list(model.cost),
+        elapsed=time.perf_counter() - start_time,
+        optimal=model.optimality_proven,
+        outputs=deepcopy(instance.outputs),
+    )
+
+
+def _ground(
+        asp_code: str,
+        cl_arguments: List[str],
+        quiet: Optional[bool] = None
+    ) -> Tuple[clingo.Control, GenerationStatistics]:
+    """
+    Grounds an encoding, and returns the control object together with
+    statistics about the grounding.
+    """
+
+    if quiet:
+        control = clingo.Control(
+            arguments=cl_arguments,
+            logger=lambda code, message: None
+        )
+    else:
+        control = clingo.Control(arguments=cl_arguments)
     control.add("base", [], asp_code)
+    start_time = time.perf_counter()
     control.ground([("base", [])])
 
+    statistics = GenerationStatistics()
+    statistics.ground_time = time.perf_counter() - start_time
+    statistics.atoms = len(control.symbolic_atoms)
+
+    return control, statistics
+
+
+def _read_statistics(
+        control: clingo.Control,
+        statistics: GenerationStatistics
+    ):
+    """
+    Reads the number of ground rules and the solving statistics (if any) of
+    the last solve call into statistics.
+
+    This must only be done after solving (or for control objects that are
+    never solved): clingo keeps the statistics object of a solve call once
+    it is accessed, so reading it before solving would leave the statistics
+    of the solve call at those from before solving.
+    """
+    # pylint: disable=E1136
+    try:
+        clingo_statistics = control.statistics
+        # Before solving, only the statistics of the current step are set
+        problem = clingo_statistics['problem']
+        statistics.rules = int(
+            problem['lp']['rules'] or problem['lpStep']['rules']
+        )
+        solvers = clingo_statistics['solving']['solvers']
+        statistics.choices = int(solvers['choices'])
+        statistics.conflicts = int(solvers['conflicts'])
+    except (KeyError, RuntimeError):
+        pass
+
+
+def _profile_grounding(
+        basic_encoding: str,
+        constraints: List[str],
+        custom_encoding: Optional[str],
+        cl_arguments: List[str]
+    ) -> List[BlockStatistics]:
+    """
+    Determines for each block of the encoding how much it contributes to
+    grounding, by grounding the encoding without this block (and comparing
+    to grounding the full encoding in a separate control object, whose
+    statistics can be read without affecting those of solving).
+    """
+
+    if not custom_encoding:
+        custom_encoding = ""
+
+    control, statistics = _ground(
+        basic_encoding + "".join(constraints) + custom_encoding,
+        cl_arguments,
+        quiet=True
+    )
+    _read_statistics(control, statistics)
+
+    # Collect the encodings that leave out one of the blocks
+    reduced_encodings = []
+    for index, constraint in enumerate(constraints):
+        before = "".join(constraints[:index])
+        after = "".join(constraints[index+1:]) + custom_encoding
+        reduced_encodings.append((
+            f"constraints[{index}]",
+            basic_encoding + before + after
+        ))
+        blocks = split_blocks(constraint)
+        for block_index, (block_name, _) in enumerate(blocks):
+            if not block_name:
+                continue
+            reduced_constraint = "".join(
+                code for other_index, (_, code) in enumerate(blocks)
+                if other_index != block_index
+            )
+            reduced_encodings.append((
+                f"constraints[{index}]: {block_name}",
+                basic_encoding + before + reduced_constraint + after
+            ))
+    if custom_encoding:
+        reduced_encodings.append((
+            "custom_encoding",
+            basic_encoding + "".join(constraints)
+        ))
+
+    block_statistics = []
+    for name, asp_code in reduced_encodings:
+        reduced_control, reduced_statistics = _ground(
+            asp_code,
+            cl_arguments,
+            quiet=True
+        )
+        _read_statistics(reduced_control, reduced_statistics)
+        block_statistics.append(BlockStatistics(
+            name=name,
+            ground_time=max(
+                0.0,
+                statistics.ground_time - reduced_statistics.ground_time
+            ),
+            rules=statistics.rules - reduced_statistics.rules,
+            atoms=statistics.atoms - reduced_statistics.atoms,
+        ))
+
+    return block_statistics
+
+
+def _solve_for_instance(
+        control: clingo.Control,
+        instance: Instance,
+        timeout: Optional[int],
+        verbose: Optional[bool],
+        on_model: Optional[Callable[[clingo.Model], None]] = None,
+        max_cost: Optional[Union[int, List[int]]] = None,
+        stall_time: Optional[float] = None,
+        stop_when: Optional[Callable[[ModelSnapshot], bool]] = None
+    ) -> Optional[Instance]:
+    """
+    Solves a grounded program, letting the instance (or on_model, if given)
+    deal with answer sets, and returns the instance if a puzzle was found.
+    For the stopping conditions, see generate_puzzle.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+
+    if on_model is None:
+        on_model = instance.extract_from_answer_set
+    if isinstance(max_cost, int):
+        max_cost = [max_cost]
+    last_model_time = None
+
+    def handle_model(model: clingo.Model) -> bool:
+        nonlocal last_model_time
+        on_model(model)
+        last_model_time = time.perf_counter()
+        if max_cost is not None and list(model.cost) <= max_cost:
+            return False
+        if stop_when is not None and instance.puzzle and \
+                stop_when(_snapshot(instance, model, start_time)):
+            return False
+        return True
+
     control.configuration.solve.opt_mode = "optN" # pylint: disable=no-member
     control.configuration.solve.models = 1 # pylint: disable=no-member
 
@@ -56,24 +690,809 @@ def generate_puzzle(
         else:
             print(f"Solving (with timeout {timeout}s)..")
 
-    handle = control.solve(on_model=new_instance.extract_from_answer_set,
-                           async_=True)
-    if timeout:
-        handle.wait(timeout)
-    else:
-        handle.wait()
+    start_time = time.perf_counter()
+    with control.solve(on_model=handle_model, async_=True) as handle:
+        if not stall_time:
+            if timeout:
+                handle.wait(timeout)
+            else:
+                handle.wait()
+        else:
+            # Wake up whenever the stall time may have passed
+            while True:
+                now = time.perf_counter()
+                wait_until = (last_model_time or now) + stall_time
+                if timeout:
+                    wait_until = min(wait_until, start_time + timeout)
+                if handle.wait(max(wait_until - now, 0)):
+                    break
+                now = time.perf_counter()
+                if timeout and now >= start_time + timeout:
+                    break
+                if last_model_time and now >= last_model_time + stall_time:
+                    break
+        handle.cancel()
+
+    if instance.statistics is None:
+        instance.statistics = GenerationStatistics()
+    instance.statistics.solve_time = time.perf_counter() - start_time
+    instance.statistics.total_time = \
+        instance.statistics.ground_time + instance.statistics.solve_time
+    _read_statistics(control, instance.statistics)
 
     if verbose:
-        # pylint: disable=E1136
-        try:
-            total_time = control.statistics['summary']['times']['total']
-            print(f"Total time: {total_time:.2f}s")
-            solving_time = control.statistics['summary']['times']['solve']
-            print(f"Solving took: {solving_time:.2f}s")
-        except RuntimeError:
-            pass
-
-    if new_instance.puzzle: # pylint: disable=R1705
-        return new_instance
+        print(instance.statistics.repr_pretty())
+
+    if instance.puzzle: # pylint: disable=R1705
+        return instance
     else:
         return None
+
+
+# Solver configurations that generate_puzzle_portfolio races by default
+DEFAULT_PORTFOLIO = [
+    ["--configuration=auto"],
+    ["--configuration=crafty"],
+    ["--configuration=trendy"],
+    ["--configuration=frumpy", "--opt-strategy=usc"],
+    ["--configuration=jumpy", "--heuristic=Vsids"],
+    ["--configuration=tweety", "--heuristic=Berkmin"],
+    ["--configuration=handy", "--opt-strategy=usc"],
+    ["--configuration=auto", "--heuristic=Vmtf", "--sign-def=rnd"],
+]
+
+
+@dataclass
+class PortfolioRecord:
+    """
+    Data class to record which solver configurations won the races of
+    generate_puzzle_portfolio, per instance type and constraint signature.
+    """
+    wins: Dict[Tuple[str, str], Dict[str, int]] = field(default_factory=dict)
+
+    @staticmethod
+    def signature(
+            instance: Instance,
+            constraints: List[str]
+        ) -> Tuple[str, str]:
+        """
+        Returns the key under which races are recorded: the name of the type
+        of the instance, and a hash of the constraints (where constraints
+        that consist of named blocks, like deduction constraints, are
+        identified by the names of their blocks, as their code contains
+        unique identifiers).
+        """
+        parts = []
+        for constraint in constraints:
+            blocks = split_blocks(constraint)
+            if blocks:
+                parts.append(",".join(sorted(name for name, _ in blocks)))
+            else:
+                parts.append(constraint)
+        digest = hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()
+        return (type(instance).__name__, digest[:16])
+
+    def record(
+            self,
+            instance: Instance,
+            constraints: List[str],
+            configuration: List[str]
+        ):
+        """
+        Records that a configuration won a race.
+        """
+        wins = self.wins.setdefault(self.signature(instance, constraints), {})
+        name = " ".join(
+            argument for argument in configuration
+            if not argument.startswith("--seed")
+        )
+        wins[name] = wins.get(name, 0) + 1
+
+    def best(
+            self,
+            instance: Instance,
+            constraints: List[str]
+        ) -> Optional[List[str]]:
+        """
+        Returns the configuration that won most often for the instance type
+        and constraints, if any race was recorded for them.
+        """
+        wins = self.wins.get(self.signature(instance, constraints))
+        if not wins:
+            return None
+        return max(wins, key=wins.get).split()
+
+
+def _race_worker(
+        results: multiprocessing.Queue,
+        index: int,
+        instance: Instance,
+        constraints: List[str],
+        timeout: Optional[int],
+        cl_arguments: List[str],
+        custom_encoding: Optional[str],
+        verify_uniqueness: Optional[bool]
+    ):
+    """
+    Generates a puzzle with one configuration of a portfolio race (to be run
+    in a separate process), and reports the result.
+    """
+    # pylint: disable=too-many-arguments
+
+    results.put((index, generate_puzzle(
+        instance,
+        constraints,
+        timeout=timeout,
+        verbose=False,
+        cl_arguments=cl_arguments,
+        custom_encoding=custom_encoding,
+        verify_uniqueness=verify_uniqueness,
+    )))
+
+
+def generate_puzzle_portfolio(
+        instance: Instance,
+        constraints: List[str],
+        configurations: Optional[List[List[str]]] = None,
+        timeout: Optional[int] = None,
+        verbose: Optional[bool] = None,
+        cl_arguments: Optional[List[str]] = None,
+        custom_encoding: Optional[str] = None,
+        verify_uniqueness: Optional[bool] = None,
+        record: Optional[PortfolioRecord] = None
+    ) -> Optional[Instance]:
+    """
+    Generates a solution and puzzle like generate_puzzle, but races several
+    solver configurations (DEFAULT_PORTFOLIO, if none are given) against each
+    other, each in its own process, and returns the first instance found.
+    The processes of the other configurations are then terminated.
+
+    The cl_arguments are used for every configuration; unless they fix a
+    --seed, every configuration gets its own random seed. The winning
+    configuration is stored in the statistics of the returned instance, and
+    recorded in record (if given).
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+
+    if not configurations:
+        configurations = DEFAULT_PORTFOLIO
+    if not cl_arguments:
+        cl_arguments = []
+    configurations = [
+        cl_arguments + configuration
+        if any(argument.startswith("--seed")
+               for argument in cl_arguments + configuration)
+        else cl_arguments + configuration + [
+            f"--seed={random.randrange(2**31)}"
+        ]
+        for configuration in configurations
+    ]
+
+    if verbose:
+        print(f"Racing {len(configurations)} configurations..")
+
+    context = multiprocessing.get_context()
+    results = context.Queue()
+    processes = [
+        context.Process(
+            target=_race_worker,
+            args=(results, index, instance, constraints, timeout,
+                  configuration, custom_encoding, verify_uniqueness),
+            daemon=True,
+        )
+        for index, configuration in enumerate(configurations)
+    ]
+
+    found_instance = None
+    try:
+        for process in processes:
+            process.start()
+        num_reported = 0
+        while num_reported < len(processes):
+            try:
+                index, result = results.get(timeout=1)
+            except queue.Empty:
+                # Stop waiting if processes have failed without reporting
+                if not any(process.is_alive() for process in processes) \
+                        and results.empty():
+                    break
+                continue
+            num_reported += 1
+            if result:
+                found_instance = result
+                found_instance.statistics.configuration = \
+                    configurations[index]
+                if record is not None:
+                    record.record(instance, constraints, configurations[index])
+                break
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        for process in processes:
+            process.join()
+
+    if verbose and found_instance:
+        print(found_instance.statistics.repr_pretty())
+
+    return found_instance
+
+
+class GenerationSession:
+    """
+    Class to generate many variations of puzzles for one instance, where the
+    basic encoding and the constraints that all variations share are grounded
+    only once.
+
+    The variations are given as masks (in the format of
+    encodings.use_mask), that are passed to the solver by means of external
+    atoms, rather than by adding and grounding additional constraints.
+    If verify_uniqueness is set, uniqueness is enforced as in
+    generate_puzzle.
+    """
+
+    def __init__(
+            self,
+            instance: Instance,
+            constraints: Optional[List[str]] = None,
+            verbose: Optional[bool] = None,
+            cl_arguments: Optional[List[str]] = None,
+            custom_encoding: Optional[str] = None,
+            verify_uniqueness: Optional[bool] = None
+        ):
+        # pylint: disable=too-many-arguments
+
+        self.instance = instance
+        self.verbose = verbose
+
+        if not constraints:
+            constraints = []
+        if not cl_arguments:
+            cl_arguments = []
+
+        # Put together the basic encoding, the shared constraints, and the
+        # external atoms through which masks are imposed
+        asp_code = generate_basic(instance)
+        asp_code += "".join(constraints)
+        asp_code += use_mask_externals()
+        if custom_encoding:
+            asp_code += custom_encoding
+
+        if verbose:
+            print("Grounding..")
+        self.control, self.statistics = _ground(asp_code, cl_arguments)
+        if verify_uniqueness:
+            self.control.register_propagator(UniquenessPropagator(instance))
+
+        self._externals = {
+            atom: clingo.parse_term(atom)
+            for atom in use_mask_assignment(
+                instance,
+                masks.generate_uniformly(instance, "?")
+            )
+        }
+
+    def generate(
+            self,
+            mask: Optional[str] = None,
+            timeout: Optional[int] = None
+        ) -> Optional[Instance]:
+        """
+        Generates a solution and puzzle that agree with the given mask
+        (if any), if possible.
+        """
+
+        if not mask:
+            mask = masks.generate_uniformly(self.instance, "?")
+
+        for atom, truth_value in use_mask_assignment(
+                self.instance,
+                mask
+            ).items():
+            self.control.assign_external(self._externals[atom], truth_value)
+
+        new_instance = deepcopy(self.instance)
+        new_instance.statistics = deepcopy(self.statistics)
+        return _solve_for_instance(
+            self.control,
+            new_instance,
+            timeout,
+            self.verbose
+        )
+
+
+_CHOICE_PREDICATES = {"solution": ("C", "V"), "erase": ("C",)}
+
+
+class _StepTransformer(ast.Transformer):
+    """
+    Transformer that renames the predicates of a step that are not in the
+    given signatures (those of the basic encoding) by prefixing them with the
+    name of the program part, so that different steps (also with the same
+    constraints) never define the same atoms.
+    """
+
+    def __init__(self, part: str, signatures):
+        self.part = part
+        self.signatures = set(signatures)
+
+    def _rename(self, name: str, arity: int) -> str:
+        if (name, arity) in self.signatures:
+            return name
+        return f"{self.part}__{name}"
+
+    def visit_SymbolicAtom(self, atom):
+        # pylint: disable=invalid-name,missing-function-docstring
+        term = atom.symbol
+        if term.ast_type == ast.ASTType.UnaryOperation:
+            return atom.update(symbol=term.update(
+                argument=self._rename_term(term.argument)
+            ))
+        return atom.update(symbol=self._rename_term(term))
+
+    def _rename_term(self, term):
+        if term.ast_type == ast.ASTType.Function:
+            return term.update(
+                name=self._rename(term.name, len(term.arguments))
+            )
+        if term.ast_type == ast.ASTType.SymbolicTerm and \
+                term.symbol.type == clingo.SymbolType.Function:
+            symbol = term.symbol
+            return term.update(symbol=clingo.Function(
+                self._rename(symbol.name, len(symbol.arguments)),
+                symbol.arguments,
+                symbol.positive
+            ))
+        return term
+
+    def visit_Defined(self, defined):
+        # pylint: disable=invalid-name,missing-function-docstring
+        return defined.update(
+            name=self._rename(defined.name, defined.arity)
+        )
+
+    def visit_ShowSignature(self, show):
+        # pylint: disable=invalid-name,missing-function-docstring
+        return show.update(name=self._rename(show.name, show.arity))
+
+
+def _is_guarded(statement, part: str) -> bool:
+    """
+    Whether a (renamed) statement of a step can restrict (or extend) the
+    solutions, or derive atoms outside the step, and should be switched off
+    with the step: integrity constraints, rules with a choice or disjunctive
+    head, weak constraints, heuristic directives, and rules (and facts)
+    whose head is a predicate of the basic encoding. Other rules only derive
+    the (renamed) atoms of the step.
+    """
+    if statement.ast_type in (ast.ASTType.Minimize, ast.ASTType.Heuristic):
+        return True
+    if statement.ast_type != ast.ASTType.Rule:
+        return False
+    head = statement.head
+    if head.ast_type != ast.ASTType.Literal:
+        return True
+    if head.atom.ast_type == ast.ASTType.BooleanConstant or \
+            head.sign != ast.Sign.NoSign:
+        return True
+    term = head.atom.symbol
+    if term.ast_type == ast.ASTType.UnaryOperation:
+        term = term.argument
+    if term.ast_type == ast.ASTType.SymbolicTerm:
+        term = term.symbol
+    name = getattr(term, "name", None)
+    return name is None or not name.startswith(f"{part}__")
+
+
+def _add_guarded_part(
+        control: clingo.Control,
+        part: str,
+        asp_code: str,
+        guard: Optional[clingo.Symbol],
+        signatures
+    ):
+    """
+    Adds an encoding to a control object as a separate program part, where
+    the predicates not in signatures are renamed (see _StepTransformer), and
+    the statements that can restrict the solutions or derive atoms of the
+    basic encoding (see _is_guarded) are conditioned on the (external) guard
+    atom, if one is given.
+
+    Atoms over solution/2 and erase/1 are already defined (by choice rules)
+    in the basic encoding, and may not be defined again (e.g., by the facts
+    of stable_state_mask_derived). So these are renamed as well, and the
+    renamed predicate is tied to the original one: it contains the original
+    atoms, and (while the guard holds) no others. This way, facts over them
+    still simplify the grounding of the step.
+    """
+    # pylint: disable=too-many-arguments
+
+    location = ast.Location(
+        ast.Position(f"<{part}>", 1, 1),
+        ast.Position(f"<{part}>", 1, 1)
+    )
+    guard_literals = []
+    if guard is not None:
+        guard_atom = ast.SymbolicAtom(ast.SymbolicTerm(location, guard))
+        guard_literals.append(
+            ast.Literal(location, ast.Sign.NoSign, guard_atom)
+        )
+    signatures = [
+        (name, arity) for name, arity in signatures
+        if len(_CHOICE_PREDICATES.get(name, ())) != arity
+    ]
+    transformer = _StepTransformer(part, signatures)
+
+    with ast.ProgramBuilder(control) as builder:
+        builder.add(ast.Program(location, part, []))
+        if guard is not None:
+            builder.add(ast.External(
+                location,
+                guard_atom,
+                [],
+                ast.SymbolicTerm(location, clingo.Function("false"))
+            ))
+
+        def add_statement(statement):
+            if statement.ast_type == ast.ASTType.Program:
+                return
+            statement = transformer(statement)
+            if _is_guarded(statement, part):
+                statement = statement.update(
+                    body=list(statement.body) + guard_literals
+                )
+            builder.add(statement)
+
+        ast.parse_string(asp_code, add_statement)
+
+        link_code = ""
+        for name, variables in _CHOICE_PREDICATES.items():
+            atom = f"{name}({','.join(variables)})"
+            step_atom = f"{part}__{atom}"
+            link_code += f"{step_atom} :- {atom}.\n"
+            link_code += f":- {step_atom}, not {atom}"
+            link_code += f", {guard}.\n" if guard is not None else ".\n"
+        ast.parse_string(
+            link_code,
+            lambda statement:
+                statement.ast_type == ast.ASTType.Program or
+                builder.add(statement)
+        )
+
+
+class GenerationPipeline:
+    """
+    Class to generate puzzles for one instance in a sequence of steps (e.g.,
+    where the outputs of one step are used in the constraints of the next),
+    with a single clingo.Control, so that the basic encoding is grounded only
+    once.
+
+    The constraints of every step are added and grounded as a separate
+    program part, whose constraints (and rules that derive atoms of the
+    basic encoding) are conditioned on an external atom (see
+    _add_guarded_part). Once a step is no longer needed, this atom is
+    released, which switches off the effects of the step for all later
+    steps.
+
+    The ground rules of released steps stay in the control object. If
+    max_rules is given, and the control object holds more rules than that
+    when a new step is added (and no step is kept), the basic encoding is
+    grounded again in a new control object first.
+
+    The external atom keeps clasp from simplifying the constraints of a step
+    away, which for large steps costs a lot of memory. A step can therefore
+    also be added as final, without the external atom: it cannot be
+    released, and the basic encoding is grounded again before the next step.
+    """
+
+    def __init__(
+            self,
+            instance: Instance,
+            cl_arguments: Optional[List[str]] = None,
+            max_rules: Optional[int] = None
+        ):
+
+        self.instance = instance
+        if not cl_arguments:
+            cl_arguments = []
+        self.cl_arguments = cl_arguments
+        self.max_rules = max_rules
+        self._num_steps = 0
+        self._active_steps = set()
+        self._needs_reset = False
+        self.reset()
+
+    def reset(self):
+        """
+        Grounds the basic encoding in a new control object, dropping all
+        steps.
+        """
+        self.control, self.statistics = _ground(
+            generate_basic(self.instance),
+            self.cl_arguments
+        )
+        self._signatures = [
+            (name, arity)
+            for name, arity, _ in self.control.symbolic_atoms.signatures
+        ]
+        self._active_steps = set()
+        self._needs_reset = False
+
+    @property
+    def num_rules(self) -> int:
+        """
+        The number of ground rules in the control object (as of the last
+        solve call; see _read_statistics).
+        """
+        return self.statistics.rules
+
+    def step(
+            self,
+            constraints: List[str],
+            timeout: Optional[int] = None,
+            verbose: Optional[bool] = None,
+            custom_encoding: Optional[str] = None,
+            keep: Optional[bool] = None,
+            final: Optional[bool] = None
+        ) -> Optional[Instance]:
+        """
+        Adds the constraints (and custom encoding, if any) as a new step,
+        and generates a solution and puzzle for them if possible. Unless keep
+        or final is set, the step is released afterwards (see release).
+        """
+        # pylint: disable=too-many-arguments
+
+        if self._needs_reset or (
+                self.max_rules is not None and not self._active_steps and
+                self.num_rules > self.max_rules
+            ):
+            self.reset()
+
+        step_num = self._num_steps
+        self._num_steps += 1
+        part = f"step_{step_num}"
+        guard = None if final else self._guard(step_num)
+
+        asp_code = "".join(constraints)
+        if custom_encoding:
+            asp_code += custom_encoding
+
+        if verbose:
+            print(f"Grounding step {step_num}..")
+        start_time = time.perf_counter()
+        _add_guarded_part(
+            self.control,
+            part,
+            asp_code,
+            guard,
+            self._signatures
+        )
+        self.control.ground([(part, [])])
+        if final:
+            self._needs_reset = True
+        else:
+            self.control.assign_external(guard, True)
+            self._active_steps.add(step_num)
+
+        new_instance = deepcopy(self.instance)
+        new_instance.statistics = GenerationStatistics(
+            ground_time=time.perf_counter() - start_time,
+            atoms=len(self.control.symbolic_atoms)
+        )
+
+        def on_model(model: clingo.Model):
+            # The outputs of the step are renamed (see _StepTransformer)
+            new_instance.extract_from_answer_set(model)
+            for atom in model.symbols(atoms=True):
+                if atom.name == f"{part}__output":
+                    new_instance.outputs.setdefault(
+                        str(atom.arguments[0]), []
+                    ).append(str(atom.arguments[1]))
+
+        found_instance = _solve_for_instance(
+            self.control,
+            new_instance,
+            timeout,
+            verbose,
+            on_model
+        )
+        self.statistics.rules = new_instance.statistics.rules
+
+        if not keep:
+            self.release(step_num)
+        return found_instance
+
+    def release(self, step_num: int):
+        """
+        Switches off the rules of a step for all later steps.
+        """
+        if step_num in self._active_steps:
+            self.control.release_external(self._guard(step_num))
+            self._active_steps.discard(step_num)
+
+    @staticmethod
+    def _guard(step_num: int) -> clingo.Symbol:
+        return clingo.Function("step_active", [clingo.Number(step_num)])
+
+
+def _generate_puzzle_in_worker(
+        instance_factory: Callable[[], Instance],
+        constraints_factory: Callable[[Instance], List[str]],
+        timeout: Optional[int],
+        deadline: Optional[float],
+        cl_arguments: Optional[List[str]],
+        custom_encoding: Optional[str],
+        verify_uniqueness: Optional[bool]
+    ) -> Optional[Instance]:
+    """
+    Builds an instance and its constraints, and generates a puzzle for it
+    (to be run in a worker process of generate_puzzles).
+    """
+    # pylint: disable=too-many-arguments
+
+    # Respect the global deadline, if there is one
+    if deadline:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            return None
+        if not timeout or remaining < timeout:
+            timeout = remaining
+
+    # Vary the solver's choices between attempts, unless a seed is given
+    if not cl_arguments:
+        cl_arguments = []
+    if not any(argument.startswith("--seed") for argument in cl_arguments):
+        cl_arguments = cl_arguments + [
+            f"--seed={random.randrange(2**31)}",
+            "--sign-def=rnd",
+        ]
+
+    instance = instance_factory()
+    constraints = constraints_factory(instance)
+
+    return generate_puzzle(
+        instance,
+        constraints,
+        timeout=timeout,
+        verbose=False,
+        cl_arguments=cl_arguments,
+        custom_encoding=custom_encoding,
+        verify_uniqueness=verify_uniqueness,
+    )
+
+
+def generate_puzzles(
+        instance_factory: Callable[[], Instance],
+        constraints_factory: Callable[[Instance], List[str]],
+        count: int,
+        workers: Optional[int] = None,
+        timeout: Optional[int] = None,
+        deadline: Optional[float] = None,
+        max_num_repeat: int = 4,
+        cl_arguments: Optional[List[str]] = None,
+        custom_encoding: Optional[str] = None,
+        verify_uniqueness: Optional[bool] = None,
+        index: Optional[CanonicalIndex] = None
+    ) -> Iterator[Instance]:
+    """
+    Generates up to count puzzles in parallel, using a pool of worker
+    processes that each call generate_puzzle (with their own clingo.Control),
+    and yields the instances as soon as they are found.
+
+    For every attempt, instance_factory() is called to create a fresh
+    instance, and constraints_factory(instance) to create the constraints for
+    it; both must be picklable (e.g., module-level functions). Each puzzle
+    that is asked for may be attempted at most max_num_repeat times. The
+    timeout applies to every single attempt, and the deadline (in seconds from
+    the moment of calling) to the generation of all puzzles together.
+    Attempts that are still running at the deadline, or when the caller
+    stops iterating, are terminated. Attempts that raise an exception are
+    logged and count as failed attempts.
+    Unless cl_arguments fixes a --seed, every attempt uses a random seed for
+    clingo, so that attempts do not all find the same puzzle.
+    The verify_uniqueness option is passed on to generate_puzzle.
+
+    If an index is given, puzzles that are equivalent to a puzzle in the
+    index are skipped (like failed attempts), and the others are added to it.
+    """
+    # pylint: disable=too-many-arguments
+
+    if not workers:
+        workers = os.cpu_count() or 1
+
+    # Fix the deadline now, rather than when the caller starts iterating
+    absolute_deadline = None
+    if deadline is not None:
+        absolute_deadline = time.time() + deadline
+
+    return _generate_puzzles(
+        instance_factory,
+        constraints_factory,
+        count,
+        workers,
+        timeout,
+        absolute_deadline,
+        max_num_repeat,
+        cl_arguments,
+        custom_encoding,
+        verify_uniqueness,
+        index,
+    )
+
+
+def _generate_puzzles(
+        instance_factory: Callable[[], Instance],
+        constraints_factory: Callable[[Instance], List[str]],
+        count: int,
+        workers: int,
+        timeout: Optional[int],
+        absolute_deadline: Optional[float],
+        max_num_repeat: int,
+        cl_arguments: Optional[List[str]],
+        custom_encoding: Optional[str],
+        verify_uniqueness: Optional[bool],
+        index: Optional[CanonicalIndex]
+    ) -> Iterator[Instance]:
+    """
+    Generates the puzzles for generate_puzzles, until the absolute deadline
+    (as a time.time() value) if there is one.
+    """
+    # pylint: disable=too-many-arguments,too-many-locals
+
+    max_num_attempts = count * max_num_repeat
+    num_attempts = 0
+    num_found = 0
+    pending = set()
+
+    executor = ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=initialize_worker
+    )
+    try:
+        while num_found < count:
+
+            # Once the deadline has passed, stop (terminating the attempts
+            # that are still running)
+            if absolute_deadline and time.time() >= absolute_deadline:
+                break
+
+            # Keep as many attempts running as are still useful
+            while (len(pending) < min(workers, count - num_found)
+                   and num_attempts < max_num_attempts):
+                num_attempts += 1
+                pending.add(executor.submit(
+                    _generate_puzzle_in_worker,
+                    instance_factory,
+                    constraints_factory,
+                    timeout,
+                    absolute_deadline,
+                    cl_arguments,
+                    custom_encoding,
+                    verify_uniqueness,
+                ))
+
+            if not pending:
+                break
+
+            remaining = None
+            if absolute_deadline:
+                remaining = max(0, absolute_deadline - time.time())
+            done, pending = wait(
+                pending,
+                timeout=remaining,
+                return_when=FIRST_COMPLETED
+            )
+            for future in done:
+                try:
+                    found_instance = future.result()
+                except Exception: # pylint: disable=broad-except
+                    logger.exception("Generating a puzzle failed")
+                    continue
+                if found_instance and index is not None \
+                        and not index.add(found_instance):
+                    continue
+                if found_instance and num_found < count:
+                    num_found += 1
+                    yield found_instance
+    finally:
+        terminate_workers(executor)
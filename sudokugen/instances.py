@@ -4,9 +4,161 @@ puzzles
 """
 
 from abc import abstractmethod
+from collections.abc import MutableMapping
+from functools import lru_cache
 import itertools
 import math
 import random
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, \
+    Tuple
+
+
+class Board(MutableMapping):
+    """
+    Class to represent the values in the cells of a square puzzle (0 for
+    empty cells) compactly, as a bytearray with one byte per cell (in
+    row-major order), with the same mapping interface as a dictionary from
+    (col, row) tuples to values.
+
+    Permutations of the cells and of the values are carried out on the
+    bytearray as a whole (see gather and translate).
+    """
+
+    __slots__ = ("size", "data")
+
+    def __init__(
+            self,
+            size: int,
+            values: Optional[Dict[Tuple[int, int], int]] = None
+        ):
+        self.size = size
+        self.data = bytearray(size * size)
+        if values:
+            for cell, value in values.items():
+                self[cell] = value
+
+    def index(self, cell: Tuple[int, int]) -> int:
+        """
+        Returns the position of a cell in the bytearray.
+        """
+        col, row = cell
+        if not (1 <= col <= self.size and 1 <= row <= self.size):
+            raise KeyError(cell)
+        return (row - 1) * self.size + col - 1
+
+    def __getitem__(self, cell: Tuple[int, int]) -> int:
+        return self.data[self.index(cell)]
+
+    def __setitem__(self, cell: Tuple[int, int], value: int):
+        self.data[self.index(cell)] = value
+
+    def __delitem__(self, cell: Tuple[int, int]):
+        raise TypeError("cells cannot be removed from a board")
+
+    def __iter__(self) -> Iterator[Tuple[int, int]]:
+        return itertools.product(range(1, self.size+1), repeat=2)
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+    def __contains__(self, cell) -> bool:
+        try:
+            self.index(cell)
+        except (KeyError, TypeError, ValueError):
+            return False
+        return True
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Board):
+            return self.size == other.size and self.data == other.data
+        return super().__eq__(other)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return f"Board({self.size}, {dict(self.items())})"
+
+    def copy(self) -> "Board":
+        """
+        Returns a copy of the board.
+        """
+        board = Board(self.size)
+        board.data = bytearray(self.data)
+        return board
+
+    def gather(self, indices: Iterable[int]) -> "Board":
+        """
+        Returns the board whose i-th position holds the value at position
+        indices[i] of this board.
+        """
+        board = Board(self.size)
+        board.data = bytearray(map(self.data.__getitem__, indices))
+        return board
+
+    def translate(self, table: bytes) -> "Board":
+        """
+        Returns the board where every value v is replaced by table[v].
+        """
+        board = Board(self.size)
+        board.data = self.data.translate(table)
+        return board
+
+
+class StructureIndex:
+    """
+    Class to represent lookup tables for the structure of an instance: an
+    integer id for every cell, the (numbers of the) groups that every cell is
+    in, the peers of every cell (the other cells that it shares a group with)
+    as bitsets over the ids and as sets, and the (numbers of the) groups of
+    every type.
+    """
+    # pylint: disable=too-few-public-methods
+
+    def __init__(self, cells: List, groups: List[Tuple[str, List]]):
+
+        self.cells = list(cells)
+        self.cell_ids = {cell: num for num, cell in enumerate(self.cells)}
+        self.cell_groups: Dict[Tuple, List[int]] = {
+            cell: [] for cell in self.cells
+        }
+        self.groups_by_type: Dict[str, List[int]] = {}
+        self.peer_bits: Dict[Tuple, int] = dict.fromkeys(self.cells, 0)
+
+        for group_num, (group_type, group) in enumerate(groups):
+            self.groups_by_type.setdefault(group_type, []).append(group_num)
+            members = list(dict.fromkeys(group))
+            group_bits = 0
+            for cell in members:
+                self.cell_groups[cell].append(group_num)
+                group_bits |= 1 << self.cell_ids[cell]
+            for cell in members:
+                self.peer_bits[cell] |= group_bits
+
+        self.peers: Dict[Tuple, set] = {}
+        for cell, num in self.cell_ids.items():
+            bits = self.peer_bits[cell] & ~(1 << num)
+            self.peer_bits[cell] = bits
+            self.peers[cell] = set(self.cells_of(bits))
+
+    def cells_of(self, bits: int) -> Iterator[Tuple]:
+        """
+        Yields the cells whose ids are in a bitset.
+        """
+        while bits:
+            lowest = bits & -bits
+            yield self.cells[lowest.bit_length() - 1]
+            bits ^= lowest
+
+
+@lru_cache(maxsize=64)
+def _shared_index(key: Tuple) -> StructureIndex:
+    """
+    Returns the structure index for the given cells and groups (as tuples),
+    shared between all instances (and copies of instances) with them.
+    """
+    cells, groups = key
+    return StructureIndex(cells, groups)
+
 
 class Instance:
     """
@@ -23,10 +175,67 @@ class Instance:
 
         self.outputs = {}
 
+        self.statistics = None
+
+        self._index = None
+
     @property
     def num_cells(self):
         return len(self.cells)
 
+    @property
+    def index(self) -> "StructureIndex":
+        """
+        Lookup tables for the cells and groups of the instance (see
+        StructureIndex), shared between instances with the same cells and
+        groups. Looked up again whenever the list of cells or a group has
+        been replaced by a different one, or has changed in length (but
+        replacing a cell of a group in place is not noticed).
+        """
+        cached = getattr(self, "_index", None)
+        if cached is None or not self._index_is_current(cached[0]):
+            key = (
+                tuple(self.cells),
+                tuple(
+                    (group_type, tuple(group))
+                    for group_type, group in self.groups
+                ),
+            )
+            groups = [group for _, group in self.groups]
+            snapshot = (
+                self.cells,
+                len(self.cells),
+                groups,
+                list(map(len, groups)),
+            )
+            cached = (snapshot, _shared_index(key))
+            self._index = cached
+        return cached[1]
+
+    def _index_is_current(self, snapshot: Tuple) -> bool:
+        """
+        Whether the cells and groups are (still) the same lists, of the same
+        lengths, as when the structure index was looked up.
+        """
+        cells, num_cells, groups, lengths = snapshot
+        current = [group for _, group in self.groups]
+        return cells is self.cells and num_cells == len(cells) and \
+            current == groups and list(map(len, current)) == lengths
+
+    def __getstate__(self) -> Dict:
+        # The structure index is looked up again after copying or unpickling
+        state = self.__dict__.copy()
+        state["_index"] = None
+        return state
+
+    @property
+    def peers(self) -> Dict:
+        """
+        Maps every cell to the set of other cells that it shares a group
+        with.
+        """
+        return self.index.peers
+
     def repr_basic(self) -> str:
         """
         Provides a basic string representation of the instance.
@@ -73,19 +282,20 @@ class Instance:
                     self.outputs[key] = []
                 self.outputs[key] = self.outputs[key] + [value]
 
-    def swap_values(self, value1, value2):
+    def permute_values(self, val_permutation: Callable[[int], int]):
         """
-        Swaps two values in the puzzle and solution.
+        Applies a function on values to every cell of the puzzle and solution
+        (as a single translation, for compact boards).
         """
 
-        def val_permutation(value):
-            if value == value1:
-                return value2
-            if value == value2:
-                return value1
-            return value
+        if isinstance(self.puzzle, Board):
+            table = bytearray(range(256))
+            for value in [0] + list(self.values):
+                table[value] = val_permutation(value)
+            self.puzzle = self.puzzle.translate(table)
+            self.solution = self.solution.translate(table)
+            return
 
-        # Apply permutation
         new_puzzle = {
             (i,j): val_permutation(self.puzzle[(i,j)])
             for (i,j) in self.puzzle
@@ -97,6 +307,21 @@ class Instance:
         }
         self.solution = new_solution
 
+    def swap_values(self, value1, value2):
+        """
+        Swaps two values in the puzzle and solution.
+        """
+
+        def val_permutation(value):
+            if value == value1:
+                return value2
+            if value == value2:
+                return value1
+            return value
+
+        # Apply permutation
+        self.permute_values(val_permutation)
+
 
 class SquareSudoku(Instance):
     """
@@ -108,6 +333,7 @@ class SquareSudoku(Instance):
         self.size = size
         self.cells = list(itertools.product(range(1, size+1), repeat=2))
         self.values = list(range(1, size+1))
+        self.compact_boards = False
         rows = [("row", [(c, r) for c in range(1, size+1)])
                 for r in range(1, size+1)]
         self.groups.extend(rows)
@@ -149,6 +375,48 @@ class SquareSudoku(Instance):
             else:
                 self.puzzle[cell] = self.solution[cell]
 
+        if self.compact_boards:
+            self.compact()
+
+    def compact(self):
+        """
+        Switches to the compact representation (see Board) for the puzzle and
+        solution of the instance, also for puzzles that are generated later.
+        """
+
+        self.compact_boards = True
+        if self.puzzle is not None and not isinstance(self.puzzle, Board):
+            self.puzzle = Board(self.size, self.puzzle)
+        if self.solution is not None and not isinstance(self.solution, Board):
+            self.solution = Board(self.size, self.solution)
+
+    def permute_cells(self, source: Callable[[Tuple], Tuple]):
+        """
+        Moves the value of cell source(cell) to cell, for every cell of the
+        puzzle and solution (as a single gather, for compact boards).
+        """
+
+        if isinstance(self.puzzle, Board):
+            indices = [
+                self.puzzle.index(source((col, row)))
+                for row in range(1, self.size+1)
+                for col in range(1, self.size+1)
+            ]
+            self.puzzle = self.puzzle.gather(indices)
+            self.solution = self.solution.gather(indices)
+            return
+
+        new_puzzle = {
+            cell: self.puzzle[source(cell)]
+            for cell in self.puzzle
+        }
+        self.puzzle = new_puzzle
+        new_solution = {
+            cell: self.solution[source(cell)]
+            for cell in self.solution
+        }
+        self.solution = new_solution
+
     def repr_pretty(self):
         """
         Provides a pretty representation of the puzzle of the instance.
@@ -172,6 +440,12 @@ class SquareSudoku(Instance):
         if not self.puzzle:
             return None
 
+        if isinstance(self.puzzle, Board):
+            return [
+                list(self.puzzle.data[row*self.size:(row+1)*self.size])
+                for row in range(self.size)
+            ]
+
         output_list = []
         for row in range(1, self.size+1):
             row_list = []
@@ -188,12 +462,28 @@ class SquareSudoku(Instance):
         if not self.puzzle:
             return "[Not yet generated]"
 
+        if isinstance(self.puzzle, Board):
+            return "".join(map(str, self.puzzle.data))
+
         output = ""
         for row in range(1, self.size + 1):
             for col in range(1, self.size + 1):
                 output += f"{self.puzzle[(col, row)]}"
         return output
 
+    def parse_short(self, puzzle: str) -> dict:
+        """
+        Turns a short representation of a puzzle (as given by repr_short)
+        into a dictionary from cells to values (0 for empty cells).
+        """
+
+        if len(puzzle) != self.size * self.size:
+            raise ValueError("puzzle does not match the size of the instance")
+        return {
+            (col, row): int(puzzle[(row - 1) * self.size + col - 1])
+            for (col, row) in self.cells
+        }
+
 
 class RectangleBlockSudoku(SquareSudoku):
     """
@@ -220,6 +510,14 @@ class RectangleBlockSudoku(SquareSudoku):
                 )
             ]))
 
+    @property
+    def block_width(self) -> int:
+        return self._block_width
+
+    @property
+    def block_height(self) -> int:
+        return self._block_height
+
     def repr_pretty(self):
         """
         Provides a pretty representation of the puzzle of the instance.
@@ -239,6 +537,81 @@ class RectangleBlockSudoku(SquareSudoku):
                 output += "\n"
         return output[:-2]
 
+    def canonical_form(self) -> str:
+        """
+        Provides a representation of the puzzle of the instance that is the
+        same for all puzzles that can be turned into each other by shuffle
+        (permuting rows within bands, bands, columns within stacks, stacks
+        and values, and transposing if the blocks are squares): the minimal
+        short representation over all these symmetries.
+
+        Values are relabeled in order of first appearance, and written as
+        the characters of CANONICAL_DIGITS.
+        """
+
+        if not self.puzzle:
+            raise ValueError("instance has no puzzle")
+        if any(group_type not in ("row", "column", "block")
+               for group_type, _ in self.groups):
+            raise ValueError(
+                "canonical form is only defined for row, column and block "
+                "groups"
+            )
+
+        grid = [
+            [self.puzzle[(col, row)] for col in range(1, self.size + 1)]
+            for row in range(1, self.size + 1)
+        ]
+        grids = [grid]
+        if self._block_width == self._block_height:
+            grids.append([list(line) for line in zip(*grid)])
+
+        # Candidates for the prefix of the minimal form: a grid, the rows of
+        # it used so far, the columns of it used so far (which are chosen
+        # while filling in the first row), and the relabeling of the values.
+        # The prefix is extended one cell at a time, keeping only the
+        # candidates that give the smallest value for the cell
+        candidates = [(grid, (), (), {}) for grid in grids]
+        prefix = []
+        for depth in range(self.size):
+            for position in range(self.size):
+                best = None
+                next_candidates = []
+                for grid, used, col_order, labels in candidates:
+                    if position == 0:
+                        rows = _next_rows(
+                            used, depth, self._block_width, self._block_height
+                        )
+                    else:
+                        rows = (used[-1],)
+                    if position < len(col_order):
+                        cols = (col_order[position],)
+                    else:
+                        cols = _next_rows(
+                            col_order, position,
+                            self._block_height, self._block_width
+                        )
+                    for row, col in itertools.product(rows, cols):
+                        value = grid[row][col]
+                        label = labels.get(value, len(labels) + 1) \
+                            if value else 0
+                        if best is None or label < best:
+                            best = label
+                            next_candidates = []
+                        if label == best:
+                            next_candidates.append((
+                                grid,
+                                used + (row,) if position == 0 else used,
+                                col_order if position < len(col_order)
+                                else col_order + (col,),
+                                labels if not value or value in labels
+                                else {**labels, value: label},
+                            ))
+                prefix.append(best)
+                candidates = next_candidates
+
+        return "".join(CANONICAL_DIGITS[value] for value in prefix)
+
     def shuffle(self):
         """
         Randomly permutes the rows, columns and values of the instance,
@@ -287,20 +660,9 @@ class RectangleBlockSudoku(SquareSudoku):
             return (i,j)
 
         # Apply permutations
-        new_puzzle = {
-            (i,j): self.puzzle[flip_if_transposed(
-                        col_permutation(i),
-                        row_permutation(j))]
-            for (i,j) in self.puzzle
-        }
-        self.puzzle = new_puzzle
-        new_solution = {
-            (i,j): self.solution[flip_if_transposed(
-                        col_permutation(i),
-                        row_permutation(j))]
-            for (i,j) in self.solution
-        }
-        self.solution = new_solution
+        self.permute_cells(lambda cell: flip_if_transposed(
+            col_permutation(cell[0]),
+            row_permutation(cell[1])))
 
     def shuffle_values(self):
         """
@@ -324,16 +686,53 @@ class RectangleBlockSudoku(SquareSudoku):
             return value_list[value-1]
 
         # Apply permutation
-        new_puzzle = {
-            (i,j): val_permutation(self.puzzle[(i,j)])
-            for (i,j) in self.puzzle
-        }
-        self.puzzle = new_puzzle
-        new_solution = {
-            (i,j): val_permutation(self.solution[(i,j)])
-            for (i,j) in self.solution
-        }
-        self.solution = new_solution
+        self.permute_values(val_permutation)
+
+
+CANONICAL_DIGITS = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+
+
+def _line_orders(num_bands: int, band_size: int):
+    """
+    Returns all orders of the (0-based) lines of a grid that are obtained by
+    permuting the bands and the lines within each band.
+    """
+    bands = [
+        [
+            tuple(band * band_size + line for line in order)
+            for order in itertools.permutations(range(band_size))
+        ]
+        for band in range(num_bands)
+    ]
+    orders = []
+    for band_order in itertools.permutations(range(num_bands)):
+        for line_orders in itertools.product(
+                *(bands[band] for band in band_order)
+            ):
+            orders.append(sum(line_orders, ()))
+    return orders
+
+
+def _next_rows(
+        used: Tuple[int, ...],
+        depth: int,
+        num_bands: int,
+        band_size: int
+    ) -> Iterator[int]:
+    """
+    Yields the (0-based) rows that can be placed at the given depth, after
+    the rows in used, when bands and rows within bands may be permuted.
+    """
+    if depth % band_size == 0:
+        used_bands = {row // band_size for row in used}
+        for band in range(num_bands):
+            if band not in used_bands:
+                yield from range(band * band_size, (band + 1) * band_size)
+    else:
+        band = used[-1] // band_size
+        for row in range(band * band_size, (band + 1) * band_size):
+            if row not in used:
+                yield row
 
 
 class RegularSudoku(RectangleBlockSudoku):
@@ -551,6 +950,7 @@ class BombSudoku(SquareSudoku):
         super().__init__(*args, **kwargs)
 
         # Add small groups for the neighboring constraints
+        cell_ids = self.index.cell_ids
         for (col, row) in self.cells:
             neighbors = [
                 (col, row+1),
@@ -559,7 +959,7 @@ class BombSudoku(SquareSudoku):
                 (col+1, row-1)
             ]
             for neighbor in neighbors:
-                if neighbor in self.cells:
+                if neighbor in cell_ids:
                     self.groups.append(("bomb", [(col, row), neighbor]))
 
 
@@ -590,6 +990,7 @@ class KnightSudoku(SquareSudoku):
         super().__init__(*args, **kwargs)
 
         # Add small groups for the knight constraints
+        cell_ids = self.index.cell_ids
         for (col, row) in self.cells:
             neighbors = [
                 (col+1, row-2),
@@ -598,7 +999,7 @@ class KnightSudoku(SquareSudoku):
                 (col+1, row+2)
             ]
             for neighbor in neighbors:
-                if neighbor in self.cells:
+                if neighbor in cell_ids:
                     self.groups.append(("knight", [(col, row), neighbor]))
 
 
@@ -711,20 +1112,9 @@ class BasicInterfaceSudoku(RegularSudoku):
             return (col, row)
 
         # Apply permutations
-        new_puzzle = {
-            (i, j): self.puzzle[flip_if_transposed(
-                        col_permutation(i),
-                        row_permutation(j))]
-            for (i, j) in self.puzzle
-        }
-        self.puzzle = new_puzzle
-        new_solution = {
-            (i, j): self.solution[flip_if_transposed(
-                        col_permutation(i),
-                        row_permutation(j))]
-            for (i, j) in self.solution
-        }
-        self.solution = new_solution
+        self.permute_cells(lambda cell: flip_if_transposed(
+            col_permutation(cell[0]),
+            row_permutation(cell[1])))
 
         if self.input_cell:
             (i, j) = flip_if_transposed(*self.input_cell)
@@ -755,16 +1145,7 @@ class BasicInterfaceSudoku(RegularSudoku):
         #     return value_list.index(value)+1
 
         # Apply permutation
-        new_puzzle = {
-            (i, j): val_permutation(self.puzzle[(i, j)])
-            for (i, j) in self.puzzle
-        }
-        self.puzzle = new_puzzle
-        new_solution = {
-            (i, j): val_permutation(self.solution[(i, j)])
-            for (i, j) in self.solution
-        }
-        self.solution = new_solution
+        self.permute_values(val_permutation)
         if self.input_decoy_value:
             self.input_decoy_value = val_permutation(
                 self.input_decoy_value
@@ -787,16 +1168,7 @@ class BasicInterfaceSudoku(RegularSudoku):
             return value
 
         # Apply permutation
-        new_puzzle = {
-            (i,j): val_permutation(self.puzzle[(i,j)])
-            for (i,j) in self.puzzle
-        }
-        self.puzzle = new_puzzle
-        new_solution = {
-            (i,j): val_permutation(self.solution[(i,j)])
-            for (i,j) in self.solution
-        }
-        self.solution = new_solution
+        self.permute_values(val_permutation)
         if self.input_decoy_value:
             self.input_decoy_value = val_permutation(
                 self.input_decoy_value
@@ -0,0 +1,223 @@
+"""
+Module with functionality to keep a stock of pre-generated puzzles per
+category, that is refilled in the background by worker processes
+"""
+
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Union
+
+from .workers import initialize_worker, terminate_workers
+
+logger = logging.getLogger(__name__)
+
+
+class PuzzlePool:
+    """
+    Class to represent a stock of puzzles per category, stored in an SQLite
+    database (in WAL mode, so that the stock survives crashes).
+
+    For every category, generators[category]() is called to generate a new
+    puzzle (or None if that failed); the generators must be picklable (e.g.,
+    functools.partial(initial_from_preset, "hidden pairs", verbose=False)
+    from examples.interactive). Once started, a background thread keeps the
+    stock of every category at its target (an int for all categories, or a
+    dict per category), using a pool of worker processes.
+
+    Exceptions raised by the generators are logged. After max_failures of
+    them in a row for a category, its stock is no longer refilled (see
+    failures and reset_failures).
+    """
+
+    def __init__(
+            self,
+            filename: str,
+            generators: Dict[str, Callable[[], Any]],
+            targets: Union[int, Dict[str, int]] = 10,
+            workers: Optional[int] = None,
+            max_failures: int = 3
+        ):
+
+        self.filename = filename
+        self.generators = generators
+        if isinstance(targets, int):
+            targets = {category: targets for category in generators}
+        self.targets = targets
+        self.workers = workers or os.cpu_count() or 1
+        self.max_failures = max_failures
+
+        self._failures = {category: 0 for category in generators}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._drain = False
+        self._thread = None
+        self._connection = sqlite3.connect(filename, check_same_thread=False)
+        with self._lock, self._connection:
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""
+                CREATE TABLE IF NOT EXISTS stock (
+                    id INTEGER PRIMARY KEY,
+                    category TEXT NOT NULL,
+                    data BLOB NOT NULL,
+                    created REAL NOT NULL
+                )
+            """)
+            self._connection.execute("""
+                CREATE INDEX IF NOT EXISTS stock_category
+                ON stock (category, id)
+            """)
+
+    def stock(self, category: str) -> int:
+        """
+        Returns the number of puzzles in stock for a category.
+        """
+        with self._lock:
+            (count,) = self._connection.execute(
+                "SELECT COUNT(*) FROM stock WHERE category = ?",
+                (category,)
+            ).fetchone()
+        return count
+
+    def failures(self, category: str) -> int:
+        """
+        Returns the number of times in a row that generating a puzzle for a
+        category raised an exception.
+        """
+        return self._failures[category]
+
+    def reset_failures(self, category: str):
+        """
+        Resumes refilling the stock of a category after it failed
+        max_failures times in a row.
+        """
+        self._failures[category] = 0
+
+    def put(self, category: str, puzzle: Any):
+        """
+        Adds a puzzle to the stock of a category.
+        """
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT INTO stock (category, data, created) VALUES (?, ?, ?)",
+                (category, pickle.dumps(puzzle), time.time())
+            )
+
+    def take(self, category: str) -> Optional[Any]:
+        """
+        Removes the oldest puzzle from the stock of a category and returns
+        it, or returns None if the stock is empty (this never waits for a
+        puzzle to be generated).
+        """
+        with self._lock, self._connection:
+            row = self._connection.execute(
+                "SELECT id, data FROM stock WHERE category = ? "
+                "ORDER BY id LIMIT 1",
+                (category,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._connection.execute(
+                "DELETE FROM stock WHERE id = ?",
+                (row[0],)
+            )
+        return pickle.loads(row[1])
+
+    def start(self):
+        """
+        Starts refilling the stock in the background.
+        """
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._refill, daemon=True)
+        self._thread.start()
+
+    def stop(self, wait_for_workers: bool = False):
+        """
+        Stops refilling the stock (puzzles that are still being generated
+        are only added if wait_for_workers is set).
+        """
+        self._drain = wait_for_workers
+        self._stop.set()
+        if self._thread and wait_for_workers:
+            self._thread.join()
+
+    def close(self):
+        """
+        Stops refilling the stock and closes the database connection.
+        """
+        self.stop(wait_for_workers=True)
+        with self._lock:
+            self._connection.close()
+
+    def _refill(self):
+        """
+        Keeps the stock of every category at its target, until stopped.
+        """
+        pending = {}
+        executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=initialize_worker
+        )
+        try:
+            while not self._stop.is_set() or (pending and self._drain):
+
+                # Start generating the puzzles that are missing, taking turns
+                # between the categories (that have not failed too often)
+                missing = {
+                    category: target - self.stock(category) -
+                        sum(1 for pending_category in pending.values()
+                            if pending_category == category)
+                    for category, target in self.targets.items()
+                    if self._failures[category] < self.max_failures
+                }
+                while not self._stop.is_set() and \
+                        len(pending) < self.workers and \
+                        any(count > 0 for count in missing.values()):
+                    category = max(missing, key=missing.get)
+                    missing[category] -= 1
+                    future = executor.submit(self.generators[category])
+                    pending[future] = category
+
+                if not pending:
+                    self._stop.wait(1)
+                    continue
+
+                done, _ = wait(
+                    pending,
+                    timeout=1,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    category = pending.pop(future)
+                    exception = future.exception()
+                    if exception is not None:
+                        self._record_failure(category, exception)
+                        continue
+                    self._failures[category] = 0
+                    if future.result() is not None:
+                        self.put(category, future.result())
+        finally:
+            terminate_workers(executor)
+
+    def _record_failure(self, category: str, exception: BaseException):
+        """
+        Logs an exception raised while generating a puzzle for a category,
+        and counts it towards the failures of the category.
+        """
+        self._failures[category] += 1
+        logger.error(
+            "Generating a puzzle for %s failed (%d time(s) in a row)",
+            category, self._failures[category],
+            exc_info=exception
+        )
+        if self._failures[category] == self.max_failures:
+            logger.error(
+                "Stopped refilling the stock of %s after %d failures",
+                category, self.max_failures
+            )
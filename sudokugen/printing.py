@@ -103,15 +103,14 @@ def repr_latex(
         for col in range(1, 10):
             pencil[(col, row)] = list(range(1, 10))
 
-    for _, group in instance.groups:
-        for cell1 in group:
-            value = instance.puzzle[cell1]
-            if value != 0:
-                for cell2 in group:
-                    try:
-                        pencil[cell2].remove(value)
-                    except ValueError:
-                        pass
+    for cell1, peers in instance.peers.items():
+        value = instance.puzzle[cell1]
+        if value != 0:
+            for cell2 in peers:
+                try:
+                    pencil[cell2].remove(value)
+                except ValueError:
+                    pass
 
     cell_fill = {}
     for row in range(1, 10):
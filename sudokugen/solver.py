@@ -1,5 +1,201 @@
 """
-Module with functionality to solve puzzle instances
-
-(To be implemented)
+Module with functionality to solve puzzle instances, by reducing them to an
+exact cover problem that is solved with (a dictionary-based variant of)
+Knuth's Dancing Links algorithm
 """
+
+from typing import Dict, Hashable, Iterator, List, Optional, Set, Tuple, \
+    Union
+
+from .instances import Instance
+
+
+class ExactCover:
+    """
+    Class to represent the exact cover problem corresponding to an instance:
+    for each combination of a cell and a value there is a row, that covers
+    the column of the cell and the columns of the value in each group that
+    the cell is in.
+
+    The columns of cells and of full groups (with as many cells as there are
+    values) are primary columns, that must be covered exactly once. The
+    columns of the other groups are secondary columns, that must be covered
+    at most once.
+    """
+
+    def __init__(self, instance: Instance):
+
+        self.instance = instance
+        self.primary: Set[Hashable] = set()
+        self.rows: Dict[Tuple, List[Hashable]] = {}
+
+        for cell in instance.cells:
+            self.primary.add(("cell", cell))
+        for group_num, (_, group) in enumerate(instance.groups):
+            if len(set(group)) == len(instance.values):
+                for value in instance.values:
+                    self.primary.add(("group", group_num, value))
+        cell_groups = instance.index.cell_groups
+
+        for cell in instance.cells:
+            for value in instance.values:
+                self.rows[(cell, value)] = [("cell", cell)] + [
+                    ("group", group_num, value)
+                    for group_num in cell_groups[cell]
+                ]
+
+    def columns(self) -> Dict[Hashable, Set[Tuple]]:
+        """
+        Returns a fresh mapping from each column to the rows that cover it.
+        """
+        columns = {}
+        for row, row_columns in self.rows.items():
+            for column in row_columns:
+                columns.setdefault(column, set()).add(row)
+        for column in self.primary:
+            columns.setdefault(column, set())
+        return columns
+
+    def select(
+            self,
+            columns: Dict[Hashable, Set[Tuple]],
+            row: Tuple
+        ) -> List[Set[Tuple]]:
+        """
+        Adds a row to the partial cover: removes the columns that it covers,
+        and the rows that conflict with it. Returns what is needed to undo
+        this with deselect.
+        """
+        removed = []
+        for column in self.rows[row]:
+            for other_row in columns[column]:
+                for other_column in self.rows[other_row]:
+                    if other_column != column:
+                        columns[other_column].discard(other_row)
+            removed.append(columns.pop(column))
+        return removed
+
+    def deselect(
+            self,
+            columns: Dict[Hashable, Set[Tuple]],
+            row: Tuple,
+            removed: List[Set[Tuple]]
+        ):
+        """
+        Undoes select, given what it returned.
+        """
+        for column in reversed(self.rows[row]):
+            columns[column] = removed.pop()
+            for other_row in columns[column]:
+                for other_column in self.rows[other_row]:
+                    if other_column != column:
+                        columns[other_column].add(other_row)
+
+    def search(
+            self,
+            columns: Dict[Hashable, Set[Tuple]],
+            partial: List[Tuple]
+        ) -> Iterator[List[Tuple]]:
+        """
+        Enumerates the ways of extending a partial cover to a full cover,
+        branching on the primary column that is covered by the fewest rows.
+        """
+        best_column = None
+        best_size = None
+        for column, rows in columns.items():
+            if column in self.primary and \
+                    (best_size is None or len(rows) < best_size):
+                best_column = column
+                best_size = len(rows)
+                if best_size <= 1:
+                    break
+        if best_column is None:
+            yield list(partial)
+            return
+
+        for row in list(columns[best_column]):
+            partial.append(row)
+            removed = self.select(columns, row)
+            yield from self.search(columns, partial)
+            self.deselect(columns, row, removed)
+            partial.pop()
+
+
+def solutions(
+        instance: Instance,
+        puzzle: Optional[Union[Dict[Tuple, int], str]] = None
+    ) -> Iterator[Dict[Tuple, int]]:
+    """
+    Enumerates the solutions of a puzzle, given as a dictionary from cells to
+    values (0 for empty cells) or as a short representation (see
+    SquareSudoku.repr_short). If no puzzle is given, the puzzle of the
+    instance is used.
+    """
+
+    if puzzle is None:
+        puzzle = instance.puzzle
+    if isinstance(puzzle, str):
+        puzzle = instance.parse_short(puzzle)
+
+    cover = ExactCover(instance)
+    columns = cover.columns()
+
+    # Fill in the clues of the puzzle
+    clues = []
+    for cell, value in (puzzle or {}).items():
+        if not value:
+            continue
+        if (cell, value) not in cover.rows:
+            raise ValueError(f"Invalid clue: {value} in cell {cell}")
+        if any(column not in columns for column in cover.rows[(cell, value)]):
+            return
+        cover.select(columns, (cell, value))
+        clues.append((cell, value))
+
+    for rows in cover.search(columns, clues):
+        yield dict(sorted(rows))
+
+
+def solve(
+        instance: Instance,
+        puzzle: Optional[Union[Dict[Tuple, int], str]] = None,
+        limit: Optional[int] = None
+    ) -> List[Dict[Tuple, int]]:
+    """
+    Returns the solutions of a puzzle (see solutions), or at most limit of
+    them if limit is given.
+    """
+
+    found = []
+    if limit is not None and limit <= 0:
+        return found
+    for solution in solutions(instance, puzzle):
+        found.append(solution)
+        if limit is not None and len(found) >= limit:
+            break
+    return found
+
+
+def count_solutions(
+        instance: Instance,
+        puzzle: Optional[Union[Dict[Tuple, int], str]] = None,
+        limit: Optional[int] = 2
+    ) -> int:
+    """
+    Counts the solutions of a puzzle (see solutions), stopping as soon as
+    limit solutions have been found. With the default limit of 2, this
+    checks whether the puzzle has a unique solution.
+    """
+
+    return len(solve(instance, puzzle, limit=limit))
+
+
+def has_unique_solution(
+        instance: Instance,
+        puzzle: Optional[Union[Dict[Tuple, int], str]] = None
+    ) -> bool:
+    """
+    Whether a puzzle has exactly one solution.
+    """
+
+    return count_solutions(instance, puzzle, limit=2) == 1
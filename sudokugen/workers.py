@@ -0,0 +1,33 @@
+"""
+Module with functionality shared by the pools of worker processes that
+generate puzzles in parallel (see generator.generate_puzzles and
+pool.PuzzlePool)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import random
+
+
+def initialize_worker():
+    """
+    Reseeds the random number generator in a worker process, so that forked
+    workers do not all produce the same random masks. To be passed as the
+    initializer of a ProcessPoolExecutor.
+    """
+    random.seed()
+
+
+def terminate_workers(executor: ProcessPoolExecutor):
+    """
+    Shuts down a ProcessPoolExecutor without waiting for the tasks that are
+    still running: tasks that have not started are cancelled, and the
+    worker processes are terminated.
+    """
+    # The executor forgets its processes when it is shut down
+    processes = list((getattr(executor, "_processes", None) or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
@@ -0,0 +1,60 @@
+"""
+Tests for turning a puzzle into many isomorphic puzzles at once
+"""
+
+import pytest
+
+from sudokugen import instances
+from sudokugen.augment import generate_isomorphs
+from sudokugen.solver import solve
+
+np = pytest.importorskip("numpy")
+
+PUZZLE = "000079038910002000060000000501080700000300400030000090" \
+    "785000200000090000000800607"
+
+
+def _short(row):
+    return "".join(str(value) for value in row)
+
+
+def test_isomorphs_are_equivalent():
+    """
+    The isomorphs have the canonical form of the original puzzle, are
+    distinct if asked for, and come with their own solutions.
+    """
+    instance = instances.RegularSudoku(9)
+    instance.puzzle = instance.parse_short(PUZZLE)
+    instance.solution = solve(instance, PUZZLE, limit=1)[0]
+    canonical_form = instance.canonical_form()
+
+    puzzles, solutions = generate_isomorphs(
+        instance, 20, unique=True, with_solutions=True, seed=1
+    )
+    assert puzzles.shape == (20, 81)
+    assert puzzles.dtype == np.uint8
+    assert len({_short(row) for row in puzzles}) == 20
+
+    for puzzle, solution in zip(puzzles, solutions):
+        isomorph = instances.RegularSudoku(9)
+        isomorph.puzzle = isomorph.parse_short(_short(puzzle))
+        assert isomorph.canonical_form() == canonical_form
+        assert solve(isomorph) == [isomorph.parse_short(_short(solution))]
+
+
+def test_isomorphs_are_reproducible():
+    """
+    The same seed gives the same isomorphs.
+    """
+    instance = instances.RegularSudoku(9)
+    instance.puzzle = instance.parse_short(PUZZLE)
+    first = generate_isomorphs(instance, 5, seed=2)
+    assert (first == generate_isomorphs(instance, 5, seed=2)).all()
+
+
+def test_isomorphs_without_puzzle():
+    """
+    An instance without a puzzle is rejected.
+    """
+    with pytest.raises(ValueError):
+        generate_isomorphs(instances.RegularSudoku(9), 5)
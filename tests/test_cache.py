@@ -0,0 +1,121 @@
+"""
+Tests for the persistent cache of generated puzzles
+"""
+
+from sudokugen import encodings, instances
+from sudokugen.cache import PuzzleCache, is_deterministic
+from sudokugen.generator import generate_puzzle
+
+
+def _constraints(instance):
+    return [
+        encodings.unique_solution(),
+        encodings.constrain_num_filled_cells(instance, 0, 32),
+    ]
+
+
+def test_round_trip(tmp_path):
+    """
+    A generated instance is stored in the cache, and returned from it for
+    the same request.
+    """
+    instance = instances.RegularSudoku(9)
+    cache = PuzzleCache(str(tmp_path / "cache.db"))
+
+    found = generate_puzzle(
+        instance,
+        _constraints(instance),
+        cl_arguments=["--seed=1"],
+        cache=cache,
+    )
+    assert found is not None
+    assert len(cache) == 1
+
+    cached = generate_puzzle(
+        instance,
+        _constraints(instance),
+        cl_arguments=["--seed=1"],
+        cache=cache,
+    )
+    assert cached.puzzle == found.puzzle
+    assert cached.solution == found.solution
+    assert len(cache) == 1
+    cache.close()
+
+
+def test_profile_grounding_in_fingerprint(tmp_path):
+    """
+    A cached instance without a grounding profile is not returned when a
+    profile is asked for.
+    """
+    instance = instances.RegularSudoku(9)
+    cache = PuzzleCache(str(tmp_path / "cache.db"))
+
+    generate_puzzle(
+        instance,
+        _constraints(instance),
+        cl_arguments=["--seed=1"],
+        cache=cache,
+    )
+    profiled = generate_puzzle(
+        instance,
+        _constraints(instance),
+        cl_arguments=["--seed=1"],
+        profile_grounding=True,
+        cache=cache,
+    )
+    assert profiled.statistics.blocks
+    assert len(cache) == 2
+    cache.close()
+
+
+def test_fingerprint_ignores_strategy_identifiers():
+    """
+    Deduction constraints with different random strategy identifiers have
+    the same fingerprint.
+    """
+    instance = instances.RegularSudoku(9)
+    strategies = [
+        encodings.SolvingStrategy(rules=[encodings.naked_singles])
+    ]
+    fingerprints = {
+        PuzzleCache.fingerprint(
+            instance,
+            encodings.deduction_constraint(instance, strategies),
+            []
+        )
+        for _ in range(2)
+    }
+    assert len(fingerprints) == 1
+
+
+def test_fingerprint_ignores_rule_identifiers():
+    """
+    Deduction constraints that forbid the same conclusions, with rules that
+    have different random identifiers, have the same fingerprint.
+    """
+    instance = instances.RegularSudoku(9)
+    fingerprints = set()
+    for _ in range(2):
+        strategies = [
+            encodings.SolvingStrategy(rules=[
+                encodings.naked_singles,
+                encodings.forbid_strings_derivable(["strike(c(1,1),1)"]),
+            ])
+        ]
+        fingerprints.add(PuzzleCache.fingerprint(
+            instance,
+            encodings.deduction_constraint(instance, strategies),
+            []
+        ))
+    assert len(fingerprints) == 1
+
+
+def test_is_deterministic():
+    """
+    Only solving with a single thread is deterministic.
+    """
+    assert is_deterministic([])
+    assert is_deterministic(["--seed=1", "-t1"])
+    assert not is_deterministic(["--parallel-mode=4"])
+    assert not is_deterministic(["-t4"])
@@ -0,0 +1,100 @@
+"""
+Tests for applying deduction rules directly to concrete puzzles
+"""
+
+import pytest
+
+from sudokugen import encodings, instances
+from sudokugen.deduce import (
+    deduce, grade, ratings, requires_technique, supports
+)
+from sudokugen.solver import solve
+
+# Puzzles with a unique solution, for which grading uses (among others) the
+# given technique
+PUZZLES = {
+    "locked_candidates_pointing": "000010006900002070300080200000000003"
+                                  "704100000000006500001700302008003000"
+                                  "405000089",
+    "naked_pairs": "050000006003000240100008000900000000000076094040800030"
+                   "000000010007040500000510800",
+    "hidden_pairs": "000900050085600040900000806010300700604150000000000030"
+                    "000520680100040300050000000",
+    "x_wing": "070040009001600000000050000060000000480010050125000830"
+              "000000090600085040007200003",
+    "naked_triples": "090017000500000060400508007109000000057000004340009700"
+                     "000300000800000236000200805",
+    "hidden_triples": "000000001106009240504720800000000000080375000000800002"
+                      "007060014050004000000000020",
+    "xy_wing": "000000350008070000030008420024000000100003000300290000"
+               "000009070000001536070060002",
+    "xyz_wing": "080609000002050100000000003003090601007401500500000020"
+                "060000000001000060708310400",
+    "color_trap": "000009000000106907020800046409701008002003000000000300"
+                  "007000080050002000300000709",
+    "color_wrap": "840050002000391000000800006000080700400000360009000000"
+                  "500014000600970805300000074",
+}
+
+
+@pytest.mark.parametrize("technique", list(PUZZLES))
+def test_deduction_is_sound(technique):
+    """
+    Deduction never removes the value of the solution from a cell, and the
+    technique is used when grading the puzzle.
+    """
+    instance = instances.RegularSudoku(9)
+    puzzle = PUZZLES[technique]
+    [solution] = solve(instance, puzzle, limit=2)
+
+    result = grade(instance, puzzle).result
+    assert technique in result.steps
+    assert not result.contradiction
+    for cell, value in solution.items():
+        assert value in result.candidates[cell]
+        assert result.solution[cell] in (0, value)
+    for derivation in result.trace:
+        if derivation.conclusion == "strike":
+            assert derivation.value != solution[derivation.cell]
+        else:
+            assert derivation.value == solution[derivation.cell]
+
+
+def test_requires_technique():
+    """
+    A puzzle that singles do not solve, but singles and hidden pairs do,
+    requires hidden pairs.
+    """
+    instance = instances.RegularSudoku(9)
+    puzzle = "000000000904607000076804100309701080" \
+        "008000300050308702007502610000403208000000000"
+    rules = [
+        encodings.naked_singles,
+        encodings.hidden_singles,
+        encodings.hidden_pairs,
+    ]
+    assert requires_technique(instance, puzzle, "hidden_pairs", rules)
+    assert not requires_technique(instance, puzzle, "naked_singles", rules)
+    assert grade(instance, puzzle, rules).technique == "hidden_pairs"
+
+
+def test_unsupported_rules_are_rejected():
+    """
+    Rules that only exist as ASP encodings are rejected, rather than
+    grading without them.
+    """
+    instance = instances.RegularSudoku(9)
+    puzzle = PUZZLES["naked_pairs"]
+    assert all(supports(name) for name in ratings)
+    assert supports(encodings.stable_state_solved)
+    assert not supports(encodings.skyscraper)
+
+    with pytest.raises(ValueError, match="skyscraper, w_wing"):
+        grade(
+            instance, puzzle,
+            [encodings.naked_singles, encodings.skyscraper, encodings.w_wing]
+        )
+    with pytest.raises(ValueError, match="x_chain"):
+        requires_technique(instance, puzzle, "x_chain")
+    with pytest.raises(ValueError, match="snyder_basic"):
+        deduce(instance, puzzle, [encodings.snyder_basic])
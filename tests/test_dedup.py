@@ -0,0 +1,92 @@
+"""
+Tests for recognizing equivalent puzzles by their canonical forms
+"""
+
+from copy import deepcopy
+import random
+
+import pytest
+
+from sudokugen import instances
+from sudokugen.dedup import CanonicalIndex
+from sudokugen.solver import solve
+
+PUZZLE = "000079038910002000060000000501080700000300400030000090" \
+    "785000200000090000000800607"
+OTHER_PUZZLE = "650000030000900804070000095400010700000000001061305200" \
+    "003000080005002000000000300"
+
+
+def _instance(instance, puzzle):
+    instance.puzzle = instance.parse_short(puzzle)
+    instance.solution = solve(instance, puzzle, limit=1)[0]
+    return instance
+
+
+def _rokudoku():
+    instance = instances.RokuDoku()
+    solution = solve(instance, {}, limit=1)[0]
+    instance.solution = solution
+    instance.puzzle = {
+        cell: value if (cell[0] * 7 + cell[1] * 3) % 4 else 0
+        for cell, value in solution.items()
+    }
+    return instance
+
+
+@pytest.mark.parametrize("make_instance", [
+    lambda: _instance(instances.RegularSudoku(9), PUZZLE),
+    _rokudoku,
+])
+def test_canonical_form_under_shuffle(make_instance):
+    """
+    The canonical form of a puzzle does not change when it is shuffled, but
+    does when a clue is removed.
+    """
+    random.seed(1)
+    instance = make_instance()
+    canonical_form = instance.canonical_form()
+    for _ in range(10):
+        shuffled = deepcopy(instance)
+        shuffled.shuffle()
+        assert shuffled.canonical_form() == canonical_form
+
+    cell = next(cell for cell, value in instance.puzzle.items() if value)
+    instance.puzzle[cell] = 0
+    assert instance.canonical_form() != canonical_form
+
+
+def test_canonical_index(tmp_path):
+    """
+    A shuffled copy of a puzzle in the index is not new, and the index is
+    read back from its file.
+    """
+    random.seed(1)
+    filename = str(tmp_path / "index.txt")
+    index = CanonicalIndex(filename)
+    instance = _instance(instances.RegularSudoku(9), PUZZLE)
+    assert index.add(instance)
+
+    shuffled = deepcopy(instance)
+    shuffled.shuffle()
+    assert shuffled in index
+    assert not index.add(shuffled)
+    assert len(index) == 1
+
+    other = _instance(instances.RegularSudoku(9), OTHER_PUZZLE)
+    assert other not in index
+    assert index.add(other)
+
+    reloaded = CanonicalIndex(filename)
+    assert len(reloaded) == 2
+    assert shuffled in reloaded
+
+
+def test_canonical_form_of_other_groups():
+    """
+    The canonical form is not defined for instances with groups other than
+    rows, columns and blocks.
+    """
+    instance = _instance(instances.XSudoku(9), "0" * 81)
+    with pytest.raises(ValueError):
+        instance.canonical_form()
@@ -0,0 +1,205 @@
+"""
+Tests for the analysis of the ASP encodings of deduction rules, by comparing
+what the deduction constraints of the presets of the interactive examples
+derive for a fixed puzzle with and without this analysis
+"""
+
+import re
+
+import clingo
+from clingo import ast
+import pytest
+
+from sudokugen import encodings, instances
+from sudokugen.encodings import generate
+from sudokugen.generator import generate_puzzle
+from sudokugen.solver import solve
+
+# Puzzle that singles do not solve, but singles and hidden pairs do
+PUZZLE = "000000000904607000076804100309701080" \
+    "008000300050308702007502610000403208000000000"
+
+# Rules before and at the chain point of some presets (see
+# examples.interactive.initial_from_preset)
+PRESETS = {
+    "hidden pairs only": (
+        [
+            encodings.closed_under_naked_singles,
+            encodings.closed_under_hidden_singles,
+            encodings.naked_pairs_not_applicable_chained,
+            encodings.locked_candidates_not_applicable_chained,
+        ],
+        [encodings.hidden_pairs],
+    ),
+    "locked candidates pointing only": (
+        [
+            encodings.naked_pairs,
+            encodings.hidden_pairs,
+            encodings.closed_under_naked_singles,
+            encodings.closed_under_hidden_singles,
+            encodings.locked_candidates_claiming_not_applicable_chained,
+        ],
+        [encodings.locked_candidates_pointing],
+    ),
+    "snyder locked": (
+        [
+            encodings.closed_under_naked_singles,
+            encodings.closed_under_hidden_singles,
+            encodings.snyder_basic,
+            encodings.snyder_hidden_pairs,
+            encodings.snyder_basic_locked,
+        ],
+        [encodings.snyder_locked_candidates],
+    ),
+}
+
+
+def preset_constraint(instance, preset):
+    """
+    Returns the chained deduction constraint of a preset (see
+    examples.interactive.initial_generic).
+    """
+    pre_rules, chain_point_rules = PRESETS[preset]
+    return encodings.chained_deduction_constraint(
+        instance,
+        [
+            encodings.SolvingStrategy(
+                rules=[
+                    encodings.basic_deduction,
+                    encodings.naked_singles,
+                    encodings.hidden_singles,
+                    encodings.stable_state_unsolved,
+                ] + pre_rules
+            ),
+            encodings.SolvingStrategy(rules=chain_point_rules),
+            encodings.SolvingStrategy(
+                rules=[
+                    encodings.naked_singles,
+                    encodings.hidden_singles,
+                    encodings.stable_state_solved,
+                ]
+            ),
+        ],
+        [(0, 1), (1, 2)]
+    )
+
+
+def without_constraints(asp_code):
+    """
+    Returns an encoding without its integrity constraints, so that what it
+    derives can be compared also for puzzles that violate them.
+    """
+    statements = []
+    def add(statement):
+        if statement.ast_type == ast.ASTType.Rule and \
+                statement.head.ast_type == ast.ASTType.Literal and \
+                statement.head.atom.ast_type == \
+                ast.ASTType.BooleanConstant:
+            return
+        if statement.ast_type not in \
+                (ast.ASTType.Program, ast.ASTType.Comment):
+            statements.append(f"{statement}\n")
+    ast.parse_string(asp_code, add)
+    return "".join(statements)
+
+
+def derivable(instance, constraint):
+    """
+    Returns the brave and cautious consequences among the derivable
+    solutions and strikes of a deduction constraint for PUZZLE (with the
+    random identifiers of the solving strategies left out).
+    """
+    # Fix the solution and the erased cells with facts instead of choices
+    asp_code = [
+        encodings.generate_basic(instance)
+        .replace("1 { solution(C,V) : value(V) } 1 :- cell(C).", "")
+        .replace("{ erase(C) } :- cell(C).", ""),
+        without_constraints(constraint),
+        "#show derivable/2.\n",
+    ]
+    for (col, row), value in solve(instance, PUZZLE, limit=1)[0].items():
+        cell = instance.cell_encoding((col, row))
+        asp_code.append(f"solution({cell},{value}).\n")
+        if PUZZLE[(row-1) * instance.size + col-1] == "0":
+            asp_code.append(f"erase({cell}).\n")
+
+    # pylint: disable=no-member
+    control = clingo.Control(["0"])
+    control.add("base", [], "".join(asp_code))
+    control.ground([("base", [])])
+
+    consequences = []
+    for enum_mode in ("brave", "cautious"):
+        control.configuration.solve.enum_mode = enum_mode
+        models = []
+        control.solve(on_model=lambda model: models.append({
+            re.sub(r"strategy\(s[0-9a-f]+,", "strategy(s,", str(symbol))
+            for symbol in model.symbols(shown=True)
+            if symbol.match("derivable", 2) and
+            symbol.arguments[1].name in ("solution", "strike")
+        }))
+        consequences.append(models[-1])
+    return consequences
+
+
+@pytest.mark.parametrize("preset", list(PRESETS))
+def test_pruning_keeps_derivable(monkeypatch, preset):
+    """
+    Leaving out duplicated and unused statements does not change what a
+    deduction constraint derives.
+    """
+    instance = instances.RegularSudoku(9)
+    pruned = derivable(instance, preset_constraint(instance, preset))
+    assert pruned[1]
+
+    monkeypatch.setattr(generate, "prune_blocks", lambda blocks: blocks)
+    assert derivable(instance, preset_constraint(instance, preset)) == pruned
+
+
+@pytest.mark.parametrize("preset", list(PRESETS))
+def test_specialization_keeps_derivable(monkeypatch, preset):
+    """
+    Specializing the deduction rules to the solving strategies that use
+    them (and pruning them) does not change what a deduction constraint
+    derives, compared to using the encodings of the rules as they are.
+    """
+    instance = instances.RegularSudoku(9)
+    specialized = derivable(instance, preset_constraint(instance, preset))
+
+    def unspecialized_blocks(_, solving_strategies):
+        rules = {encodings.basic_deduction}
+        for strategy in solving_strategies:
+            rules.update(strategy.rules)
+        return [(rule.name, rule.encoding) for rule in rules]
+    monkeypatch.setattr(generate, "rule_blocks", unspecialized_blocks)
+    monkeypatch.setattr(generate, "prune_blocks", lambda blocks: blocks)
+    assert derivable(instance, preset_constraint(instance, preset)) == \
+        specialized
+
+
+def test_pruning_keeps_highlight_output():
+    """
+    Heads that are only read by encodings outside the deduction constraint
+    (here highlight_strike/2, by output_highlight_strikes) are kept.
+    """
+    instance = instances.RegularSudoku(9)
+    solution = solve(instance, PUZZLE, limit=1)[0]
+    mask = "".join(
+        str(solution[(col, row)])
+        for row in range(1, 10) for col in range(1, 10)
+    )[:54] + "0" * 27
+    constraints = [
+        encodings.use_mask(instance, mask),
+        encodings.deduction_constraint(instance, [
+            encodings.SolvingStrategy(rules=[
+                encodings.basic_deduction,
+                encodings.naked_singles,
+                encodings.hidden_singles,
+                encodings.select_non_derivable_strikes_as_highlight,
+            ]),
+        ]),
+        encodings.output_highlight_strikes(),
+    ]
+    found = generate_puzzle(instance, constraints, timeout=60)
+    assert found is not None
+    assert found.outputs["highlight_strike"]
@@ -0,0 +1,41 @@
+"""
+Tests for the ASP encodings used to generate puzzles
+"""
+
+from sudokugen import encodings, instances
+
+
+def test_basic_encoding_is_text():
+    """
+    The base encoding is plain text, that can be concatenated with other
+    encodings on either side.
+    """
+    instance = instances.RegularSudoku(9)
+    asp_code = encodings.generate_basic(instance)
+    assert isinstance(asp_code, str)
+    assert "cell(cell(1,1)).\n" in asp_code
+    assert (encodings.unique_solution() + asp_code).endswith(asp_code)
+
+
+def test_blocks_survive_concatenation():
+    """
+    The named blocks of a deduction constraint can be recovered from it,
+    also after concatenating it with other encodings.
+    """
+    instance = instances.RegularSudoku(9)
+    constraint = encodings.deduction_constraint(
+        instance,
+        [encodings.SolvingStrategy(rules=[encodings.naked_singles])]
+    )
+    blocks = encodings.split_blocks(constraint)
+    assert [name for name, _ in blocks] == \
+        ["strategies", "basic_deduction", "naked_singles"]
+    assert encodings.join_blocks(blocks) == constraint
+
+    combined = encodings.unique_solution() + constraint + "#show erase/1.\n"
+    combined_blocks = encodings.split_blocks(combined)
+    assert combined_blocks[0] == ("", encodings.unique_solution())
+    assert combined_blocks[1:-1] == blocks[:-1]
+    assert combined_blocks[-1][1].endswith("#show erase/1.\n")
+
+    assert not encodings.split_blocks(encodings.unique_solution())
@@ -0,0 +1,412 @@
+"""
+Tests for the generation of puzzles with clingo
+"""
+
+import asyncio
+import multiprocessing
+import time
+
+from sudokugen import encodings, instances
+from sudokugen.generator import GenerationPipeline, GenerationSession, \
+    PortfolioRecord, generate_puzzle, generate_puzzle_async, \
+    generate_puzzle_models, generate_puzzle_portfolio, generate_puzzles, \
+    measure_generation
+from sudokugen.solver import count_solutions
+
+
+def _slow_instance():
+    time.sleep(60)
+    return instances.RegularSudoku(9)
+
+
+def _failing_instance():
+    raise RuntimeError("instance failed")
+
+
+def _no_constraints(_):
+    return []
+
+
+def test_statistics_after_solving():
+    """
+    The solving statistics are read after solving, so they are not stuck at
+    those from before solving.
+    """
+    instance = instances.RegularSudoku(9)
+    constraints = [
+        encodings.unique_solution(),
+        encodings.constrain_num_filled_cells(instance, 0, 32),
+    ]
+
+    found = generate_puzzle(
+        instance,
+        constraints,
+        timeout=60,
+        cl_arguments=["--seed=1"],
+    )
+    assert found is not None
+    assert found.statistics.rules > 0
+    assert found.statistics.choices > 0
+    assert found.statistics.conflicts > 0
+
+
+def test_statistics_with_profile_grounding():
+    """
+    Profiling the grounding does not affect the solving statistics.
+    """
+    instance = instances.RegularSudoku(9)
+    constraints = [
+        encodings.unique_solution(),
+        encodings.constrain_num_filled_cells(instance, 0, 32),
+    ]
+
+    found = generate_puzzle(
+        instance,
+        constraints,
+        timeout=60,
+        cl_arguments=["--seed=1"],
+        profile_grounding=True,
+    )
+    assert found is not None
+    assert found.statistics.choices > 0
+    assert [block.name for block in found.statistics.blocks] == \
+        ["constraints[0]", "constraints[1]"]
+    assert found.statistics.blocks[0].rules > 0
+
+
+def test_measure_generation_without_puzzle():
+    """
+    The statistics of benchmarking an encoding are also returned if no
+    puzzle is found.
+    """
+    instance = instances.RegularSudoku(9)
+    found, statistics = measure_generation(
+        instance,
+        [encodings.constrain_num_filled_cells(instance, 82, 90)],
+        timeout=60,
+        cl_arguments=["--seed=1"],
+    )
+    assert found is None
+    assert statistics.rules > 0
+    assert statistics.total_time > 0
+
+
+def test_verify_uniqueness():
+    """
+    A puzzle generated with the uniqueness propagator instead of the
+    saturation encoding has a unique solution.
+    """
+    instance = instances.RegularSudoku(9)
+    constraints = [encodings.constrain_num_filled_cells(instance, 0, 30)]
+
+    found = generate_puzzle(
+        instance,
+        constraints,
+        timeout=60,
+        cl_arguments=["--seed=1"],
+        verify_uniqueness=True,
+    )
+    assert found is not None
+    assert count_solutions(instance, found.puzzle, limit=2) == 1
+
+
+def test_profile_grounding_of_deduction_rules():
+    """
+    Profiling the grounding gives a breakdown per deduction rule for
+    deduction constraints.
+    """
+    instance = instances.RegularSudoku(9)
+    rules = [
+        encodings.basic_deduction,
+        encodings.naked_singles,
+        encodings.hidden_singles,
+        encodings.stable_state_solved,
+    ]
+    constraints = [
+        encodings.deduction_constraint(
+            instance,
+            [encodings.SolvingStrategy(rules=rules)]
+        ),
+        encodings.constrain_num_filled_cells(instance, 0, 40),
+    ]
+
+    found = generate_puzzle(
+        instance,
+        constraints,
+        timeout=60,
+        cl_arguments=["--seed=1"],
+        profile_grounding=True,
+    )
+    assert found is not None
+    names = {block.name for block in found.statistics.blocks}
+    for rule in rules:
+        assert f"constraints[0]: {rule.name}" in names
+
+
+def test_session_with_masks():
+    """
+    A session generates a puzzle per mask, each agreeing with its own mask
+    only, and with the shared constraints.
+    """
+    instance = instances.RegularSudoku(4)
+    session = GenerationSession(
+        instance,
+        [encodings.unique_solution()],
+        cl_arguments=["--seed=1"],
+    )
+
+    for value in (1, 0, 3):
+        found = session.generate(str(value) + "?" * 15, timeout=60)
+        assert found is not None
+        assert found.puzzle[(1, 1)] == value
+        if value:
+            assert found.solution[(1, 1)] == value
+        assert count_solutions(instance, found.puzzle, limit=2) == 1
+        assert found.statistics.rules > 0
+
+
+def test_portfolio_records_winner():
+    """
+    A portfolio race returns a puzzle found by one of the configurations,
+    records it as the winner, and terminates the other processes.
+    """
+    instance = instances.RegularSudoku(4)
+    constraints = [encodings.unique_solution()]
+    configurations = [["--configuration=crafty"], ["--configuration=trendy"]]
+    record = PortfolioRecord()
+
+    found = generate_puzzle_portfolio(
+        instance,
+        constraints,
+        configurations,
+        timeout=60,
+        record=record,
+    )
+    assert found is not None
+    assert count_solutions(instance, found.puzzle, limit=2) == 1
+    winner = found.statistics.configuration
+    assert winner[0] in ("--configuration=crafty", "--configuration=trendy")
+    assert winner[1].startswith("--seed=")
+    assert record.best(instance, constraints) == winner[:1]
+    assert not multiprocessing.active_children()
+
+
+def test_generate_puzzle_async():
+    """
+    Generating asynchronously yields every improvement, up to the optimal
+    puzzle, and can be stopped after the first one.
+    """
+    instance = instances.RegularSudoku(4)
+    constraints = [
+        encodings.unique_solution(),
+        encodings.minimize_num_filled_cells(),
+    ]
+
+    async def generate():
+        found = [
+            new_instance async for new_instance in generate_puzzle_async(
+                instance, constraints, timeout=60, cl_arguments=["--seed=1"]
+            )
+        ]
+        puzzles = generate_puzzle_async(instance, constraints, timeout=60)
+        first = await puzzles.__anext__()
+        await puzzles.aclose()
+        return found, first
+
+    found, first = asyncio.run(generate())
+    num_filled = [
+        sum(1 for value in new_instance.puzzle.values() if value)
+        for new_instance in found
+    ]
+    assert len(found) > 1
+    assert num_filled == sorted(num_filled, reverse=True)
+    assert num_filled[-1] == 4
+    assert count_solutions(instance, found[-1].puzzle, limit=2) == 1
+    assert found[-1].statistics.total_time > 0
+    assert count_solutions(instance, first.puzzle, limit=2) == 1
+
+
+def test_generate_puzzle_models():
+    """
+    Every improvement is yielded as a snapshot, the last of which is optimal,
+    and stopping early leaves the snapshots so far intact.
+    """
+    instance = instances.RegularSudoku(4)
+    constraints = [
+        encodings.unique_solution(),
+        encodings.minimize_num_filled_cells(),
+    ]
+
+    snapshots = list(generate_puzzle_models(
+        instance, constraints, timeout=60, cl_arguments=["--seed=1"]
+    ))
+    costs = [snapshot.cost for snapshot in snapshots]
+    assert len(snapshots) > 1
+    assert costs == sorted(costs, reverse=True)
+    assert snapshots[-1].optimal
+    assert not any(snapshot.optimal for snapshot in snapshots[:-1])
+    found = snapshots[-1].to_instance(instance)
+    assert found.puzzle is not snapshots[-1].puzzle
+    assert count_solutions(instance, found.puzzle, limit=2) == 1
+
+    early = []
+    for snapshot in generate_puzzle_models(instance, constraints, timeout=60):
+        early.append(snapshot)
+        if len(early) == 2:
+            break
+    assert early[0].puzzle != early[1].puzzle
+    assert early[0].cost > early[1].cost
+
+
+def test_stopping_criteria():
+    """
+    Minimizing stops before the timeout (with a unique puzzle) once a model
+    is cheap enough, once stop_when accepts a model, or once no better model
+    was found for stall_time seconds.
+    """
+    instance = instances.RegularSudoku(9)
+    constraints = [
+        encodings.unique_solution(),
+        encodings.minimize_num_filled_cells(),
+    ]
+
+    def num_filled(found):
+        return sum(1 for value in found.puzzle.values() if value)
+
+    found = generate_puzzle(
+        instance, constraints, timeout=60, max_cost=[-50],
+        cl_arguments=["--seed=1"]
+    )
+    assert found is not None and num_filled(found) <= 31
+    assert count_solutions(instance, found.puzzle, limit=2) == 1
+
+    costs = []
+    def stop_when(snapshot):
+        costs.append(snapshot.cost)
+        return len(costs) == 10
+    found = generate_puzzle(
+        instance, constraints, timeout=60, stop_when=stop_when,
+        cl_arguments=["--seed=1"]
+    )
+    assert found is not None and len(costs) == 10
+    assert num_filled(found) == 81 + costs[-1][0]
+    assert count_solutions(instance, found.puzzle, limit=2) == 1
+
+    start = time.time()
+    found = generate_puzzle(
+        instance, constraints, timeout=60, stall_time=0.5,
+        cl_arguments=["--seed=1"]
+    )
+    assert time.time() - start < 30
+    assert found is not None
+    assert count_solutions(instance, found.puzzle, limit=2) == 1
+
+
+def test_generate_puzzles_stops_at_deadline():
+    """
+    Generating puzzles in parallel stops at the deadline, and terminates the
+    attempts that are still running.
+    """
+    start = time.time()
+    found = list(generate_puzzles(
+        _slow_instance, _no_constraints, 2, workers=2, deadline=2
+    ))
+    assert not found
+    assert time.time() - start < 30
+    assert not multiprocessing.active_children()
+
+
+def test_generate_puzzles_deadline_starts_at_call():
+    """
+    The deadline counts from calling generate_puzzles, not from the first
+    time the puzzles are iterated.
+    """
+    puzzles = generate_puzzles(
+        _slow_instance, _no_constraints, 1, workers=1, deadline=1
+    )
+    time.sleep(2)
+    start = time.time()
+    assert not list(puzzles)
+    assert time.time() - start < 1
+
+
+def test_generate_puzzles_with_failing_attempts(caplog):
+    """
+    Attempts that raise an exception are logged and count as failed
+    attempts, instead of aborting the generation of the other puzzles.
+    """
+    found = list(generate_puzzles(
+        _failing_instance, _no_constraints, 1, workers=1, max_num_repeat=2
+    ))
+    assert not found
+    assert caplog.text.count("Generating a puzzle failed") == 2
+    assert "instance failed" in caplog.text
+
+
+def test_pipeline_releases_steps():
+    """
+    Once a step of a pipeline is released, nothing that it derived (also
+    over predicates of the basic encoding) is left in later steps.
+    """
+    instance = instances.RegularSudoku(4)
+    pipeline = GenerationPipeline(instance, cl_arguments=["--seed=1"])
+
+    first = pipeline.step(
+        [encodings.use_mask(instance, "3" + "?" * 15)],
+        timeout=60
+    )
+    assert first is not None
+    assert first.puzzle[(1, 1)] == 3
+
+    second = pipeline.step(
+        [
+            encodings.use_mask(instance, "0" + "?" * 15),
+            ":- certainly_not_erased(cell(1,1)).\n",
+        ],
+        timeout=60
+    )
+    assert second is not None
+    assert second.puzzle[(1, 1)] == 0
+    assert not any(
+        atom.symbol.name == "certainly_not_erased" and
+        atom.symbol.arguments[0].name == "cell"
+        for atom in pipeline.control.symbolic_atoms
+    )
+
+
+def test_pipeline_keeps_and_finalizes_steps():
+    """
+    A kept step constrains the later steps until it is released, and the
+    pipeline carries on after a final step.
+    """
+    instance = instances.RegularSudoku(4)
+    pipeline = GenerationPipeline(instance, cl_arguments=["--seed=1"])
+
+    kept = pipeline.step(
+        [encodings.use_mask(instance, "3" + "?" * 15)],
+        timeout=60,
+        keep=True,
+    )
+    assert kept is not None and kept.puzzle[(1, 1)] == 3
+
+    unique = pipeline.step([encodings.unique_solution()], timeout=60)
+    assert unique is not None and unique.puzzle[(1, 1)] == 3
+    assert count_solutions(instance, unique.puzzle, limit=2) == 1
+    pipeline.release(0)
+
+    final = pipeline.step(
+        [
+            encodings.unique_solution(),
+            encodings.use_mask(instance, "0" + "?" * 15),
+        ],
+        timeout=60,
+        final=True,
+    )
+    assert final is not None and final.puzzle[(1, 1)] == 0
+    assert count_solutions(instance, final.puzzle, limit=2) == 1
+
+    after = pipeline.step(
+        [encodings.use_mask(instance, "2" + "?" * 15)],
+        timeout=60
+    )
+    assert after is not None and after.puzzle[(1, 1)] == 2
@@ -0,0 +1,97 @@
+"""
+Tests for the puzzle instances
+"""
+
+from copy import deepcopy
+import pickle
+import random
+
+from sudokugen import encodings, instances
+from sudokugen.generator import generate_puzzle
+from sudokugen.solver import count_solutions
+
+
+def test_peers():
+    """
+    Every cell of a 9x9 sudoku has 20 peers.
+    """
+    instance = instances.RegularSudoku(9)
+    assert all(len(peers) == 20 for peers in instance.peers.values())
+    assert (2, 1) in instance.peers[(1, 1)]
+    assert (1, 1) not in instance.peers[(1, 1)]
+
+
+def test_index_notices_replaced_group():
+    """
+    The structure index is rebuilt if a group is replaced by another one,
+    even if the number of groups stays the same.
+    """
+    instance = instances.RegularSudoku(9)
+    assert (9, 9) not in instance.peers[(1, 1)]
+
+    group_type, _ = instance.groups[0]
+    instance.groups[0] = (group_type, [(1, 1), (9, 9)])
+    assert (9, 9) in instance.peers[(1, 1)]
+
+
+def test_index_notices_changed_group():
+    """
+    The structure index is rebuilt if a group is changed in place.
+    """
+    instance = instances.RegularSudoku(9)
+    assert (9, 9) not in instance.peers[(1, 1)]
+
+    instance.groups[0][1].append((9, 9))
+    assert (9, 9) in instance.peers[(1, 1)]
+
+
+def test_index_is_shared_and_not_copied():
+    """
+    The structure index is shared between instances with the same structure,
+    and copies and pickles of an instance do not carry it along.
+    """
+    instance = instances.RegularSudoku(9)
+    index = instance.index
+    assert instances.RegularSudoku(9).index is index
+
+    size = len(pickle.dumps(instances.RegularSudoku(9)))
+    assert len(pickle.dumps(instance)) == size
+    copied = deepcopy(instance)
+    assert copied.index is index
+    assert pickle.loads(pickle.dumps(instance)).index is index
+
+
+def test_compact_boards():
+    """
+    A generated puzzle with compact boards has the same cells and values,
+    and is shuffled the same way, as with dictionaries, while its pickle is
+    smaller.
+    """
+    instance = instances.RegularSudoku(9)
+    instance.compact()
+    found = generate_puzzle(
+        instance,
+        [encodings.unique_solution()],
+        timeout=60,
+        cl_arguments=["--seed=1"],
+    )
+    assert found is not None
+    assert isinstance(found.puzzle, instances.Board)
+    assert isinstance(found.solution, instances.Board)
+    assert count_solutions(found, found.puzzle, limit=2) == 1
+
+    plain = deepcopy(found)
+    plain.compact_boards = False
+    plain.puzzle = dict(found.puzzle)
+    plain.solution = dict(found.solution)
+    assert len(pickle.dumps(found)) < len(pickle.dumps(plain))
+
+    random.seed(1)
+    found.shuffle()
+    random.seed(1)
+    plain.shuffle()
+    assert isinstance(found.puzzle, instances.Board)
+    assert dict(found.puzzle) == plain.puzzle
+    assert dict(found.solution) == plain.solution
+    assert found.repr_short() == plain.repr_short()
+    assert count_solutions(found, found.puzzle, limit=2) == 1
@@ -0,0 +1,95 @@
+"""
+Tests for the stock of pre-generated puzzles
+"""
+
+import logging
+import multiprocessing
+import time
+
+from sudokugen.pool import PuzzlePool
+
+
+def _generate_constant():
+    return "puzzle"
+
+
+def _generate_slowly():
+    time.sleep(600)
+    return "puzzle"
+
+
+def _generate_failing():
+    raise RuntimeError("generator failed")
+
+
+def _wait_until(condition, timeout=60):
+    end = time.time() + timeout
+    while not condition() and time.time() < end:
+        time.sleep(0.1)
+    return condition()
+
+
+def test_refill_and_take(tmp_path):
+    """
+    The stock is refilled up to its target, and puzzles are taken from it in
+    order.
+    """
+    pool = PuzzlePool(
+        str(tmp_path / "pool.db"),
+        {"constant": _generate_constant},
+        targets=2,
+        workers=1,
+    )
+    pool.start()
+    assert _wait_until(lambda: pool.stock("constant") == 2)
+    pool.close()
+
+    pool = PuzzlePool(str(tmp_path / "pool.db"), {"constant": None})
+    assert pool.stock("constant") == 2
+    assert pool.take("constant") == "puzzle"
+    assert pool.stock("constant") == 1
+    pool.close()
+
+
+def test_failing_generator_is_capped(tmp_path, caplog):
+    """
+    Exceptions of a generator are logged, and a category whose generator
+    keeps failing is no longer refilled, while the other categories are.
+    """
+    pool = PuzzlePool(
+        str(tmp_path / "pool.db"),
+        {"failing": _generate_failing, "constant": _generate_constant},
+        targets=2,
+        workers=1,
+        max_failures=2,
+    )
+    with caplog.at_level(logging.ERROR, logger="sudokugen.pool"):
+        pool.start()
+        assert _wait_until(lambda: pool.stock("constant") == 2 and
+                           pool.failures("failing") == 2)
+        time.sleep(1)
+        pool.close()
+
+    assert pool.failures("failing") == 2
+    assert pool.failures("constant") == 0
+    assert "generator failed" in caplog.text
+    assert "Stopped refilling the stock of failing" in caplog.text
+
+
+def test_stop_terminates_running_workers(tmp_path):
+    """
+    Stopping the pool without waiting terminates the workers that are still
+    generating a puzzle.
+    """
+    pool = PuzzlePool(
+        str(tmp_path / "pool.db"),
+        {"slow": _generate_slowly},
+        targets=1,
+        workers=1,
+    )
+    pool.start()
+    assert _wait_until(lambda: multiprocessing.active_children())
+    pool.stop()
+    assert _wait_until(lambda: not multiprocessing.active_children())
+    assert pool.stock("slow") == 0
+    pool.close()
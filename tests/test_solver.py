@@ -0,0 +1,57 @@
+"""
+Tests for solving puzzles with the exact-cover solver
+"""
+
+import pytest
+
+from sudokugen import instances
+from sudokugen.solver import count_solutions, has_unique_solution, solve
+
+PUZZLE = "000079038910002000060000000501080700000300400030000090" \
+    "785000200000090000000800607"
+
+
+def test_count_4x4_grids():
+    """
+    There are 288 filled-in 4x4 sudokus, and a quarter of them have a given
+    value in a given cell.
+    """
+    instance = instances.RegularSudoku(4)
+    assert count_solutions(instance, {}, limit=None) == 288
+    assert count_solutions(instance, {(1, 1): 1}, limit=None) == 72
+
+
+def test_unique_solution():
+    """
+    The solution of a puzzle with a unique solution fits its clues and its
+    groups.
+    """
+    instance = instances.RegularSudoku(9)
+    assert has_unique_solution(instance, PUZZLE)
+
+    [solution] = solve(instance, PUZZLE)
+    for cell, value in instance.parse_short(PUZZLE).items():
+        assert value in (0, solution[cell])
+    for _, group in instance.groups:
+        assert sorted(solution[cell] for cell in group) == instance.values
+
+
+def test_multiple_and_no_solutions():
+    """
+    Solutions are counted up to the limit, and clues that contradict each
+    other leave no solution.
+    """
+    instance = instances.RegularSudoku(9)
+    assert count_solutions(instance, {}, limit=5) == 5
+    assert count_solutions(instance, {(1, 1): 1, (2, 1): 1}) == 0
+    assert not has_unique_solution(instance, "0" * 81)
+    assert solve(instance, PUZZLE, limit=0) == []
+
+
+def test_invalid_clue():
+    """
+    A clue that is not a value of the instance is rejected.
+    """
+    instance = instances.RegularSudoku(4)
+    with pytest.raises(ValueError):
+        solve(instance, {(1, 1): 5})
@@ -0,0 +1,143 @@
+"""
+Tests for the database of the two-player project (an append-only log that
+is compacted into a JSON file), and for compiling its LaTeX
+"""
+
+import json
+import os
+import stat
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "projects", "twoplayer"
+))
+
+# pylint: disable=wrong-import-position,protected-access
+import twoplayer
+
+
+def _instance(puzzle):
+    return SimpleNamespace(
+        repr_short=lambda: puzzle,
+        solution={(1, 1): 5, (9, 9): 7},
+        input_cell=(1, 1),
+        input_decoy_value=3,
+        output_cell=(9, 9),
+        output_decoy_value=4,
+    )
+
+
+# Stand-in for pdflatex: it inputs the files named in the source (from the
+# current directory or TEXINPUTS), writes a log, and writes a PDF if all
+# of them were found
+FAKE_LATEX = """
+import os, re, sys
+name = sys.argv[1][:-len(".tex")]
+with open(sys.argv[1], encoding="utf-8") as file:
+    inputs = re.findall(r"\\\\input{(.*?)}", file.read())
+paths = ["."] + os.environ.get("TEXINPUTS", "").split(os.pathsep)
+missing = [
+    filename for filename in inputs
+    if not any(os.path.exists(os.path.join(path or ".", filename))
+               for path in paths)
+]
+with open(name + ".log", "w", encoding="utf-8") as file:
+    for filename in missing:
+        file.write(f"File `{filename}' not found.\\n")
+if not missing:
+    with open(name + ".pdf", "w", encoding="utf-8") as file:
+        file.write("%PDF")
+"""
+
+
+def _fake_latex(directory):
+    path = directory / "fake-pdflatex"
+    path.write_text(f"#!{sys.executable}\n{FAKE_LATEX}", encoding="utf-8")
+    path.chmod(path.stat().st_mode | stat.S_IEXEC)
+    return str(path)
+
+
+def _ids(database, category):
+    return [instance_dict["id"] for instance_dict in database[category]]
+
+
+def test_log_and_compaction(tmp_path):
+    """
+    Stored instances get consecutive ids per category, and are loaded the
+    same before and after compacting the log into the JSON file.
+    """
+    db_filename = str(tmp_path / "db.json")
+    log_filename, ids_filename, _ = twoplayer._db_filenames(db_filename)
+
+    twoplayer.store_instance_in_db(_instance("1" * 81), "easy", db_filename)
+    twoplayer.store_instance_in_db(_instance("2" * 81), "easy", db_filename)
+    twoplayer.store_instance_in_db(
+        _instance("3" * 81), "hard", db_filename,
+        additional_data={"level": 2}
+    )
+    database = twoplayer.load_db(db_filename)
+    assert _ids(database, "easy") == [1, 2]
+    assert _ids(database, "hard") == [1]
+    assert database["hard"][0]["level"] == 2
+    assert database["easy"][1]["puzzle"] == "2" * 81
+    assert database["easy"][0]["input_cell_solution"] == 5
+
+    twoplayer.compact_db(db_filename)
+    assert not os.path.exists(log_filename)
+    assert twoplayer.load_db(db_filename) == database
+    with open(db_filename, "r", encoding="utf-8") as db_file:
+        assert json.load(db_file) == database
+
+    # Ids continue after compacting, also without the index of highest ids
+    os.remove(ids_filename)
+    twoplayer.store_instance_in_db(_instance("4" * 81), "easy", db_filename)
+    database = twoplayer.load_db(db_filename)
+    assert _ids(database, "easy") == [1, 2, 3]
+    assert twoplayer.select_instance_dict_from_db(
+        database, "easy", 3
+    )["puzzle"] == "4" * 81
+
+
+def test_log_survives_interruptions(tmp_path):
+    """
+    A line of the log that was not completely written is skipped, and so are
+    instances that are already in the JSON file (when compacting was
+    interrupted before the log was emptied).
+    """
+    db_filename = str(tmp_path / "db.json")
+    log_filename, _, _ = twoplayer._db_filenames(db_filename)
+
+    twoplayer.store_instance_in_db(_instance("1" * 81), "easy", db_filename)
+    with open(log_filename, "r", encoding="utf-8") as log_file:
+        log_content = log_file.read()
+    twoplayer.compact_db(db_filename)
+
+    with open(log_filename, "w", encoding="utf-8") as log_file:
+        log_file.write(log_content + '{"category": "easy", "inst')
+    assert _ids(twoplayer.load_db(db_filename), "easy") == [1]
+
+
+def test_compile_latex(tmp_path):
+    """
+    Files that the LaTeX source inputs are found in the output directory,
+    and the log is kept there, also when no PDF is produced.
+    """
+    executable = _fake_latex(tmp_path)
+    output = tmp_path / "output"
+    output.mkdir()
+    (output / "asset.tex").write_text("asset", encoding="utf-8")
+
+    pdf_filepath = twoplayer.compile_latex(
+        "found", "\\input{asset.tex}", str(output), executable
+    )
+    assert pdf_filepath == str(output / "found.pdf")
+    assert os.path.exists(pdf_filepath)
+    assert (output / "found.log").exists()
+
+    assert twoplayer.compile_latex(
+        "missing", "\\input{other.tex}", str(output), executable
+    ) is None
+    assert not (output / "missing.pdf").exists()
+    assert "other.tex" in (output / "missing.log").read_text(encoding="utf-8")